@@ -12,13 +12,14 @@ st.set_page_config(
 
 # Initialize session state
 if "uploaded_files" not in st.session_state:
-    st.session_state.uploaded_files = []
+    # Stored path of each uploaded file, with the name it was uploaded under
+    st.session_state.uploaded_files = {}
 if "vector_store_params" not in st.session_state:
     st.session_state.vector_store_params = {
         "embedding_model": "text-embedding-3-small",
-        "chunk_size": 500,
+        "chunk_size": 300,
         "chunk_overlap": 30,
-        "separators": ["\n\n", "\n", " ", ""]
+        "semantic_merge": False
     }
 
 def main():
@@ -0,0 +1,270 @@
+"""
+Offline model backends for evaluations: deterministic embeddings and a
+scripted chat client with the same interface as the OpenAI client, and a
+local HTTP server speaking the OpenAI API with both of them, for load tests
+that go through the real client and network stack.
+"""
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from openai.types import CompletionUsage
+from openai.types.chat import ParsedChatCompletion, ParsedChatCompletionMessage, ParsedChoice
+from openai.types.completion_usage import CompletionTokensDetails
+
+from src.utils.models import AgentOutput, GetContextParameters
+from src.utils.prompts import FAST_MODE_NUDGE, FORCE_ANSWER_PROMPT
+from src.utils.tokens import count_tokens
+
+HASHING_EMBEDDING_MODEL = "hashing"
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace, for lenient matching."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(text.lower().split())
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings (feature hashing of words and
+    word bigrams). No network and no model files: retrieval quality is
+    lexical, which is enough to compare chunking and retrieval settings.
+    """
+    def __init__(self, dimension: int = 512):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        words = re.findall(r"\w+", normalize_text(text))
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class ScriptedChatClient:
+    """
+    Stand-in for `openai.OpenAI` that follows a fixed ReAct script: a
+    thought, one retrieval with the user question on the given store, and
+    an answer made of the retrieved text. Token usage is measured on the
+    real messages, so prompt overhead of different settings is comparable.
+    """
+    def __init__(self, vector_store_name: str, latency: float = 0.0, fast_mode: bool = False):
+        self.vector_store_name = vector_store_name
+        self.latency = latency
+        # Like a model following the fast mode prompt: no thought before the action
+        self.fast_mode = fast_mode
+        self.calls = 0
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    def next_output(self, messages: List[Dict]) -> AgentOutput:
+        """Next step of the script for the messages of a request."""
+        # Messages the agent loop adds as the user are not questions
+        last_user = max(i for i, message in enumerate(messages)
+                        if message["role"] == "user" and message["content"] not in (FAST_MODE_NUDGE, FORCE_ANSWER_PROMPT))
+        question = messages[last_user]["content"]
+        turn_messages = [message["content"] for message in messages[last_user + 1:]]
+        observations = [content for content in turn_messages if content.startswith("Observation:")]
+        if FORCE_ANSWER_PROMPT in turn_messages:
+            observations = observations or ["Observation: "]
+
+        if not turn_messages and not self.fast_mode:
+            return AgentOutput(type="thought", content=f"I will search '{self.vector_store_name}' for: {question}",
+                               function_name=None, parameters=None)
+        if not observations:
+            return AgentOutput(type="action", content=None, function_name="get_context_from_vector_store",
+                               parameters=GetContextParameters(question=question,
+                                                               vector_store_name=self.vector_store_name,
+                                                               cursor=None))
+        observation = observations[-1][len("Observation:"):].strip()
+        return AgentOutput(type="answer", content=observation or "No information found.",
+                           function_name=None, parameters=None)
+
+    def parse(self, model: str, messages: List[Dict], response_format=AgentOutput, **kwargs) -> ParsedChatCompletion:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        output = self.next_output(messages)
+        content = output.model_dump_json(exclude_none=True)
+        prompt_tokens = sum(count_tokens(message["content"]) + 4 for message in messages)
+        completion_tokens = count_tokens(content)
+        return ParsedChatCompletion[AgentOutput](
+            id=f"scripted-{uuid.uuid4().hex}",
+            object="chat.completion",
+            created=int(time.time()),
+            model=model,
+            choices=[ParsedChoice[AgentOutput](
+                index=0,
+                finish_reason="stop",
+                message=ParsedChatCompletionMessage[AgentOutput](role="assistant", content=content, parsed=output),
+            )],
+            usage=CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+                completion_tokens_details=CompletionTokensDetails(reasoning_tokens=0),
+            ),
+        )
+
+
+class FakeOpenAIServer:
+    """
+    Local server for the chat completions and embeddings endpoints of the
+    OpenAI API, answering like ScriptedChatClient and HashingEmbeddings.
+
+    Every request waits a configurable latency (with uniform jitter) and a
+    fraction of them fail with an injected HTTP error, so clients see the
+    delays, retries and failures of a real provider. `max_concurrency`
+    bounds the requests served at the same time, like a provider quota.
+
+    Args:
+        vector_store_name: Store the scripted agent searches
+        chat_latency: Seconds per chat completion
+        embedding_latency: Seconds per embeddings request
+        jitter: Fraction of the latency added or removed at random
+        error_rate: Fraction of requests failing with `error_status`
+        error_status: HTTP status of injected errors (429 and 5xx are retried by the client)
+        max_concurrency: Requests served at the same time, 0 for no limit
+        fast_mode: Script of the fast mode prompt (no thought turns)
+    """
+    def __init__(self,
+                 vector_store_name: str,
+                 chat_latency: float = 0.0,
+                 embedding_latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_status: int = 500,
+                 max_concurrency: int = 0,
+                 fast_mode: bool = False,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        self.script = ScriptedChatClient(vector_store_name, fast_mode=fast_mode)
+        self.embeddings = HashingEmbeddings()
+        self.latency = {"chat": chat_latency, "embeddings": embedding_latency}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+        self.stats = {"chat": 0, "embeddings": 0, "errors": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _chat(self, request: Dict) -> Dict:
+        output = self.script.next_output(request["messages"])
+        content = output.model_dump_json()
+        prompt_tokens = sum(count_tokens(message.get("content") or "") + 4 for message in request["messages"])
+        completion_tokens = count_tokens(content)
+        return {
+            "id": f"fake-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", ""),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _embed(self, request: Dict) -> Dict:
+        inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        # Token arrays (sent by clients that tokenize first) are embedded as their text form
+        texts = [text if isinstance(text, str) else " ".join(map(str, text)) for text in inputs]
+        data = []
+        for i, vector in enumerate(self.embeddings.embed_documents(texts)):
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(count_tokens(text) for text in texts)
+        return {"object": "list", "data": data, "model": request.get("model", ""),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: Dict) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.endswith("/chat/completions"):
+                    kind, answer = "chat", server._chat
+                elif self.path.endswith("/embeddings"):
+                    kind, answer = "embeddings", server._embed
+                else:
+                    self._reply(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "not_found"}})
+                    return
+
+                if server._slots:
+                    server._slots.acquire()
+                try:
+                    with server._lock:
+                        server.stats[kind] += 1
+                        failed = server._random.random() < server.error_rate
+                        delay = server.latency[kind] * (1 + server.jitter * (2 * server._random.random() - 1))
+                    time.sleep(max(delay, 0.0))
+                    if failed:
+                        with server._lock:
+                            server.stats["errors"] += 1
+                        self._reply(server.error_status, {"error": {"message": "Injected error", "type": "server_error"}})
+                        return
+                    self._reply(200, answer(request))
+                finally:
+                    if server._slots:
+                        server._slots.release()
+
+        return Handler
@@ -0,0 +1,287 @@
+"""
+Offline RAG evaluation harness.
+
+Builds a vector store from the documents of a suite for each configuration,
+runs every question through `AgentAI.run` and reports retrieval recall@k,
+answer keyword match, agent turns, tokens and wall-clock per answer, with
+the configurations side by side:
+
+    python -m src.evaluation.harness --configs configs.json --output report.json
+
+`configs.json` holds a list of overrides of DEFAULT_EVAL_CONFIG, e.g.
+`[{"name": "chunks-300"}, {"name": "chunks-150", "chunk_size": 150}]`.
+With the default scripted LLM and hashing embeddings nothing goes to the
+network; set `"llm": "openai"` with `"llm_cache_mode": "replay"` to replay
+recorded agent runs instead.
+
+The stores and their metadata are built in a temporary directory (or
+`--vector-store-dir`), never among the stores of the app.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.evaluation.backends import HASHING_EMBEDDING_MODEL, HashingEmbeddings, ScriptedChatClient, normalize_text
+from src.utils.agent import AgentAI
+from src.utils.config import DEFAULT_MODEL
+from src.utils.embeddings import get_embeddings
+from src.utils.namespaces import qualify, user_namespace
+from src.utils.response_cache import ResponseCache
+from src.utils.retrieval import AdaptiveRetriever
+from src.utils.store_versions import store_cache_for
+from src.utils.vector_store_creator import VectorStoreCreator
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+logger = logging.getLogger(__name__)
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_SUITE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "suites", "synthetic_cvs.json")
+EVALUATION_USER = "evaluation"
+
+DEFAULT_EVAL_CONFIG = {
+    "name": "baseline",
+    "llm": "scripted",  # scripted (offline) or openai
+    "model": DEFAULT_MODEL,
+    "llm_cache_mode": "off",  # for the openai llm: off, record, replay or auto
+    "embedding_model": HASHING_EMBEDDING_MODEL,  # hashing (offline) or an OpenAI embedding model
+    "chunk_size": 300,
+    "chunk_overlap": 30,
+    "semantic_merge": False,
+    "shards": 1,  # index shards of the store
+    "k": 5,  # recall@k cut-off
+    "retrieval": {},  # overrides of RETRIEVAL_CONFIG
+    "max_turns": 15,
+    "fast_mode": False,
+    "speculative": None,  # prefetch the raw question during the first turn; None follows AGENT_SPECULATIVE_RETRIEVAL
+    "model_tiers": {},  # overrides of MODEL_TIERS, e.g. {"planning": "gpt-4.1-mini-2025-04-14"} for a cheaper planner
+    "scripted_latency": 0.0,  # seconds added to each scripted LLM call
+}
+
+SUMMARY_METRICS = [
+    ("recall_at_k", "Retrieval recall@k", "{:.2f}"),
+    ("answer_match", "Answer keyword match", "{:.2f}"),
+    ("turns", "Agent turns", "{:.1f}"),
+    ("tokens", "Tokens per answer", "{:.0f}"),
+    ("observation_tokens_saved", "Observation tokens saved", "{:.0f}"),
+    ("quality_per_1k_tokens", "Answer match per 1k tokens", "{:.3f}"),
+    ("seconds", "Seconds per answer", "{:.2f}"),
+    ("seconds_p95", "Seconds per answer (p95)", "{:.2f}"),
+    ("speculative_hit_rate", "Speculative retrieval hit rate", "{:.2f}"),
+    ("build_seconds", "Store build seconds", "{:.1f}"),
+    ("chunks", "Chunks", "{:.0f}"),
+]
+
+
+def load_suite(path: str = DEFAULT_SUITE) -> Dict:
+    """Load a question suite; document paths are relative to the repository root."""
+    with open(path, "r", encoding="utf-8") as f:
+        suite = json.load(f)
+    suite["documents"] = [doc if os.path.isabs(doc) else os.path.join(REPOSITORY_ROOT, doc)
+                          for doc in suite["documents"]]
+    return suite
+
+
+def make_embeddings(embedding_model: str) -> Embeddings:
+    """Embeddings for an embedding model name, offline for the hashing model."""
+    if embedding_model == HASHING_EMBEDDING_MODEL:
+        return HashingEmbeddings()
+    return get_embeddings(embedding_model)
+
+
+def fraction_found(expected: List[str], text: str) -> float:
+    """Fraction of the expected snippets contained in a text, ignoring case and accents."""
+    if not expected:
+        return 1.0
+    text = normalize_text(text)
+    return sum(normalize_text(snippet) in text for snippet in expected) / len(expected)
+
+
+class EvaluationHarness:
+    """Runs a question suite over one or several configurations."""
+    def __init__(self, suite: Dict, keep_stores: bool = False, vector_store_dir: Optional[str] = None):
+        self.suite = suite
+        self.keep_stores = keep_stores
+        # Removed after the run unless the stores are kept
+        self.temporary_dir = vector_store_dir is None
+        self.vector_store_dir = vector_store_dir or tempfile.mkdtemp(prefix="rag_evaluation_")
+        self.metadata = VectorStoreMetadata(self.vector_store_dir)
+
+    def _store_id(self, config: Dict) -> str:
+        name = re.sub(r'[^a-zA-Z0-9_.-]+', '_', f"{self.suite['name']}_{config['name']}")
+        return qualify(user_namespace(EVALUATION_USER), name)
+
+    def build_store(self, config: Dict, embeddings: Embeddings):
+        """
+        Create the store of a configuration from the suite documents, from scratch.
+
+        Returns:
+            Tuple[str, FAISS, float]: Store id, the store and the build time in seconds
+        """
+        store_id = self._store_id(config)
+        creator = VectorStoreCreator(embedding_model=config["embedding_model"], embeddings=embeddings,
+                                     shards=config["shards"], vector_store_dir=self.vector_store_dir)
+        creator.delete_vector_store(store_id)
+        store_cache_for(self.vector_store_dir).invalidate(store_id)
+
+        started = time.perf_counter()
+        vectorstore = creator.process_files(
+            self.suite["documents"],
+            name=store_id,
+            chunk_size=config["chunk_size"],
+            chunk_overlap=config["chunk_overlap"],
+            semantic_merge=config["semantic_merge"],
+        )
+        build_seconds = time.perf_counter() - started
+        if vectorstore is None:
+            raise RuntimeError(f"Could not build the store of configuration '{config['name']}'")
+        self.metadata.add_vector_store(store_id, self.suite.get("description", self.suite["name"]),
+                                       config["embedding_model"])
+        return store_id, vectorstore, build_seconds
+
+    def _remove_store(self, store_id: str, embeddings: Embeddings) -> None:
+        VectorStoreCreator(embedding_model=HASHING_EMBEDDING_MODEL, embeddings=embeddings,
+                           vector_store_dir=self.vector_store_dir).delete_vector_store(store_id)
+        self.metadata.delete_vector_store(store_id)
+        store_cache_for(self.vector_store_dir).invalidate(store_id)
+
+    def run_config(self, overrides: Optional[Dict] = None) -> Dict:
+        """
+        Evaluate one configuration.
+
+        Args:
+            overrides: Values replacing DEFAULT_EVAL_CONFIG
+
+        Returns:
+            Dict: The configuration, per-question results and the summary
+        """
+        config = {**DEFAULT_EVAL_CONFIG, **(overrides or {})}
+        if config["embedding_model"] == HASHING_EMBEDDING_MODEL:
+            # Lexical similarities are much lower than those of trained embeddings
+            config["retrieval"] = {"score_threshold": 0.0, **config["retrieval"]}
+        embeddings = make_embeddings(config["embedding_model"])
+        store_id, vectorstore, build_seconds = self.build_store(config, embeddings)
+
+        results = []
+        try:
+            for item in self.suite["questions"]:
+                # Retrieval alone, independent of what the agent decides to search
+                ranking = AdaptiveRetriever(config["retrieval"]).rank(vectorstore, store_id, item["question"])
+                top_k = " ".join(doc.page_content for doc, _ in ranking[:config["k"]])
+
+                if config["llm"] == "scripted":
+                    client = ScriptedChatClient(store_id, latency=config["scripted_latency"], fast_mode=config["fast_mode"])
+                    cache = ResponseCache(mode="off")
+                else:
+                    client = None
+                    cache = ResponseCache(mode=config["llm_cache_mode"])
+                agent = AgentAI(user_id=EVALUATION_USER, response_cache=cache, client=client,
+                                embeddings_factory=lambda model: embeddings, fast_mode=config["fast_mode"],
+                                model_tiers=config["model_tiers"], speculative=config["speculative"],
+                                vector_store_dir=self.vector_store_dir)
+                agent.retriever = AdaptiveRetriever(config["retrieval"])
+
+                chat_history = [{"role": "assistant", "content": "Hello!"},
+                                {"role": "user", "content": item["question"]}]
+                started = time.perf_counter()
+                answer = agent.run(chat_history, config["model"], max_turns=config["max_turns"]) or ""
+                seconds = time.perf_counter() - started
+
+                usage = agent.token_count
+                tokens = sum(usage[part][kind] for part in ("user_interaction", "agent_interaction")
+                             for kind in ("prompt_tokens", "completion_tokens"))
+                results.append({
+                    "id": item["id"],
+                    "question": item["question"],
+                    "answer": answer,
+                    "recall_at_k": fraction_found(item["evidence"], top_k),
+                    "answer_match": fraction_found(item["answer_keywords"], answer),
+                    "turns": agent.turns,
+                    "termination": agent.telemetry.get("termination"),
+                    "speculative_hit": agent.telemetry.get("speculation", {}).get("hit"),
+                    "observation_tokens_saved": agent.telemetry.get("observations", {}).get("saved_tokens", 0),
+                    "tier_tokens": {tier: stats["total_tokens"] for tier, stats in usage.get("tiers", {}).items()},
+                    "tokens": tokens,
+                    "seconds": seconds,
+                })
+                logger.info(f"[{config['name']}] {item['id']}: recall@{config['k']}="
+                            f"{results[-1]['recall_at_k']:.2f} turns={agent.turns} tokens={tokens}")
+        finally:
+            if not self.keep_stores:
+                self._remove_store(store_id, embeddings)
+
+        summary = summarize(results)
+        summary["build_seconds"] = build_seconds
+        summary["chunks"] = vectorstore.index.ntotal
+        return {"config": config, "results": results, "summary": summary}
+
+    def run(self, configs: List[Dict]) -> List[Dict]:
+        """Evaluate several configurations over the same suite."""
+        try:
+            return [self.run_config(config) for config in configs]
+        finally:
+            if self.keep_stores:
+                logger.info(f"Evaluation stores kept in {self.vector_store_dir}")
+            elif self.temporary_dir:
+                shutil.rmtree(self.vector_store_dir, ignore_errors=True)
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Average the per-question metrics of a run."""
+    if not results:
+        return {}
+    summary = {key: float(np.mean([result[key] for result in results]))
+               for key in ("recall_at_k", "answer_match", "turns", "tokens", "seconds", "observation_tokens_saved")}
+    summary["seconds_p95"] = float(np.percentile([result["seconds"] for result in results], 95))
+    speculated = [result["speculative_hit"] for result in results if result.get("speculative_hit") is not None]
+    summary["speculative_hit_rate"] = float(np.mean(speculated)) if speculated else float("nan")
+    summary["quality_per_1k_tokens"] = summary["answer_match"] / summary["tokens"] * 1000 if summary["tokens"] else 0.0
+    return summary
+
+
+def format_comparison(reports: List[Dict]) -> str:
+    """Table with one column per configuration and one row per metric."""
+    names = [report["config"]["name"] for report in reports]
+    label_width = max(len(label) for _, label, _ in SUMMARY_METRICS)
+    widths = [max(len(name), 10) for name in names]
+    lines = [" " * label_width + " | " + " | ".join(name.rjust(width) for name, width in zip(names, widths))]
+    lines.append("-" * len(lines[0]))
+    for key, label, fmt in SUMMARY_METRICS:
+        values = [fmt.format(report["summary"].get(key, float("nan"))) for report in reports]
+        lines.append(label.ljust(label_width) + " | " + " | ".join(value.rjust(width) for value, width in zip(values, widths)))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate RAG configurations over a question suite.")
+    parser.add_argument("--suite", default=DEFAULT_SUITE, help="Path of the question suite JSON")
+    parser.add_argument("--configs", help="JSON file with a list of configuration overrides")
+    parser.add_argument("--output", help="Write the full report (per-question results) to this JSON file")
+    parser.add_argument("--keep-stores", action="store_true", help="Keep the evaluation vector stores")
+    parser.add_argument("--vector-store-dir", help="Directory of the evaluation stores, a temporary one by default")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    configs = [{}]
+    if args.configs:
+        with open(args.configs, "r") as f:
+            configs = json.load(f)
+
+    reports = EvaluationHarness(load_suite(args.suite), keep_stores=args.keep_stores,
+                                vector_store_dir=args.vector_store_dir).run(configs)
+    print(format_comparison(reports))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
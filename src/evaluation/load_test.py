@@ -0,0 +1,416 @@
+"""
+Load and soak tests of concurrent chat sessions.
+
+Simulated users run the steps of the chat page (`AgentAI` per rerun,
+chat session and trace persistence) and, for a fraction of them, the upload
+flow (`VectorStoreCreator.process_files` into their own store). Every
+session is a thread of this process, like Streamlit sessions in one
+deployment. Models are served by a local FakeOpenAIServer through the real
+OpenAI client, with configurable latency and injected errors, so nothing
+goes to the network. The stores, their metadata and the chat sessions
+live in temporary directories, never among those of the app.
+
+Concurrency is stepped through levels; each level reports throughput,
+p50/p95/p99 latency, errors and memory per session, and the saturation
+point is the first level that no longer adds throughput or breaks the
+latency objective:
+
+    python -m src.evaluation.load_test --levels 1,2,4,8,16,32 --chat-latency 0.5 --error-rate 0.01
+
+A soak test keeps a number of sessions busy for a while and reports the
+memory trend and how latency drifts:
+
+    python -m src.evaluation.load_test --soak 600 --sessions 8
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import openai
+from langchain_openai import OpenAIEmbeddings
+
+from src.evaluation.backends import HASHING_EMBEDDING_MODEL, FakeOpenAIServer
+from src.evaluation.harness import DEFAULT_SUITE, load_suite
+from src.utils.agent import AgentAI
+from src.utils.chat_store import ChatSessionStore
+from src.utils.config import DEFAULT_MODEL
+from src.utils.namespaces import SHARED_NAMESPACE, qualify, user_namespace
+from src.utils.response_cache import ResponseCache
+from src.utils.store_versions import store_cache_for
+from src.utils.trace_store import TraceStore
+from src.utils.vector_store_creator import VectorStoreCreator
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOAD_CONFIG = {
+    "levels": [1, 2, 4, 8, 16],  # concurrent sessions of each step
+    "questions_per_session": 5,
+    "think_time": 1.0,  # mean seconds between the questions of a session (exponential)
+    "ramp_seconds": 1.0,  # sessions of a level start spread over this time
+    "upload_ratio": 0.0,  # fraction of sessions that upload a document before chatting
+    "chat_latency": 0.5,  # seconds per chat completion of the fake server
+    "embedding_latency": 0.05,  # seconds per embeddings request of the fake server
+    "jitter": 0.2,
+    "error_rate": 0.0,
+    "error_status": 500,
+    "server_concurrency": 0,  # requests the fake server serves at the same time, 0 for no limit
+    "client_retries": 2,  # retries of the OpenAI client, its default
+    "fast_mode": False,
+    "model": DEFAULT_MODEL,
+    "latency_slo": 0.0,  # p95 seconds per question above which a level is saturated, 0 to ignore
+    "min_scaling": 1.1,  # throughput a level must add over the previous one to still be scaling
+    "max_error_rate": 0.05,  # fraction of failed questions above which a level is saturated
+}
+
+
+def rss_mb() -> float:
+    """Resident memory of this process in MB."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        # Peak rather than current memory, in KB on Linux
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _MemorySampler:
+    """Samples the resident memory in a background thread while a level runs."""
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.samples: List[tuple] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            self.samples.append((time.perf_counter() - started, rss_mb()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "_MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def peak(self) -> float:
+        return max(mb for _, mb in self.samples) if self.samples else rss_mb()
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+    return {f"p{p}": float(np.percentile(values, p)) for p in (50, 95, 99)}
+
+
+class LoadTest:
+    """Drives simulated chat sessions against one shared store and the fake OpenAI server."""
+    def __init__(self, suite: Dict, config: Optional[Dict] = None):
+        self.suite = suite
+        self.config = {**DEFAULT_LOAD_CONFIG, **(config or {})}
+        self.store_id = qualify(SHARED_NAMESPACE, f"load_test_{suite['name']}")
+        self.vector_store_dir = tempfile.mkdtemp(prefix="load_test_stores_")
+        self.metadata = VectorStoreMetadata(self.vector_store_dir)
+        self.chat_dir = tempfile.mkdtemp(prefix="load_test_chats_")
+        self.chat_store = ChatSessionStore(self.chat_dir)
+        self.server = FakeOpenAIServer(self.store_id,
+                                       chat_latency=self.config["chat_latency"],
+                                       embedding_latency=self.config["embedding_latency"],
+                                       jitter=self.config["jitter"],
+                                       error_rate=self.config["error_rate"],
+                                       error_status=self.config["error_status"],
+                                       max_concurrency=self.config["server_concurrency"],
+                                       fast_mode=self.config["fast_mode"])
+        self._lock = threading.Lock()
+
+    def _embeddings(self, model: str = HASHING_EMBEDDING_MODEL) -> OpenAIEmbeddings:
+        # Texts are sent as strings: tokenizing first would need the tokenizer files
+        return OpenAIEmbeddings(model=model, base_url=self.server.base_url, api_key="load-test",
+                                check_embedding_ctx_length=False, max_retries=self.config["client_retries"])
+
+    def _creator(self) -> VectorStoreCreator:
+        return VectorStoreCreator(embedding_model=HASHING_EMBEDDING_MODEL, embeddings=self._embeddings(),
+                                  vector_store_dir=self.vector_store_dir)
+
+    def _client(self) -> openai.OpenAI:
+        return openai.OpenAI(base_url=self.server.base_url, api_key="load-test",
+                             max_retries=self.config["client_retries"])
+
+    def setup(self) -> None:
+        """Start the fake server and build the shared store the sessions query."""
+        self.server.start()
+        if self._creator().process_files(self.suite["documents"], name=self.store_id) is None:
+            raise RuntimeError("Could not build the load test store")
+        self.metadata.add_vector_store(self.store_id, self.suite.get("description", self.suite["name"]),
+                                       HASHING_EMBEDDING_MODEL)
+
+    def teardown(self) -> None:
+        """Remove every store and chat session created by the test and stop the server."""
+        store_cache_for(self.vector_store_dir).invalidate()
+        shutil.rmtree(self.vector_store_dir, ignore_errors=True)
+        shutil.rmtree(self.chat_dir, ignore_errors=True)
+        self.server.stop()
+
+    def _upload(self, user_id: str, rng: random.Random) -> float:
+        """Upload flow: ingest one suite document into the session's own store."""
+        store_id = qualify(user_namespace(user_id), "upload")
+        started = time.perf_counter()
+        if self._creator().process_files([rng.choice(self.suite["documents"])], name=store_id) is None:
+            raise RuntimeError(f"Upload of session {user_id} failed")
+        self.metadata.add_vector_store(store_id, "Load test upload", HASHING_EMBEDDING_MODEL)
+        return time.perf_counter() - started
+
+    def _ask(self, user_id: str, state: Dict, question: str) -> Dict:
+        """One question through the steps of the chat page."""
+        started = time.perf_counter()
+        if state["session_id"] is None:
+            state["session_id"] = self.chat_store.create_session(user_id)
+            state["traces"].attach(state["session_id"])
+        state["messages"].append({"role": "user", "content": question})
+        self.chat_store.append_message(user_id, state["session_id"], "user", question)
+
+        # The chat page builds its agent on every rerun
+        agent = AgentAI(user_id=user_id, response_cache=ResponseCache(mode="off"), client=self._client(),
+                        embeddings_factory=self._embeddings, fast_mode=self.config["fast_mode"],
+                        vector_store_dir=self.vector_store_dir)
+        answer = agent.run(list(state["messages"]), self.config["model"]) or ""
+        state["traces"].add(agent.agent_messages[0]["content"], (0, len(state["messages"]) - 1),
+                            agent.agent_messages[agent.steps_from:])
+        self.chat_store.append_usage(user_id, state["session_id"], {**agent.token_count, "telemetry": agent.telemetry})
+        state["messages"].append({"role": "assistant", "content": answer})
+        self.chat_store.append_message(user_id, state["session_id"], "assistant", answer)
+        return {"seconds": time.perf_counter() - started, "turns": agent.turns,
+                "error": agent.telemetry.get("termination") in ("error", "invalid_output")}
+
+    def _session(self, index: int, level: int, delay: float, deadline: Optional[float],
+                 results: List[Dict], uploads: List[float], sessions: List[Dict]) -> None:
+        rng = random.Random(level * 100003 + index)
+        user_id = f"load-{level}-{index}"
+        time.sleep(delay)
+        state = {"session_id": None, "messages": [{"role": "assistant", "content": "Hello!"}],
+                 "traces": TraceStore(self.chat_store, user_id)}
+        with self._lock:
+            sessions.append(state)
+        try:
+            if rng.random() < self.config["upload_ratio"]:
+                seconds = self._upload(user_id, rng)
+                with self._lock:
+                    uploads.append(seconds)
+            asked = 0
+            while (deadline is None and asked < self.config["questions_per_session"]) \
+                    or (deadline is not None and time.perf_counter() < deadline):
+                if asked and self.config["think_time"]:
+                    time.sleep(rng.expovariate(1 / self.config["think_time"]))
+                result = self._ask(user_id, state, rng.choice(self.suite["questions"])["question"])
+                result["finished"] = time.perf_counter()
+                with self._lock:
+                    results.append(result)
+                asked += 1
+        except Exception as e:
+            logger.error(f"Session {user_id} failed: {e}")
+            with self._lock:
+                results.append({"seconds": float("nan"), "turns": 0, "error": True, "finished": time.perf_counter()})
+
+    def run_level(self, sessions: int, duration: Optional[float] = None) -> Dict:
+        """
+        Run concurrent sessions and measure them.
+
+        Args:
+            sessions: Sessions running at the same time
+            duration: Seconds the sessions keep asking questions; by default
+                each one asks `questions_per_session` questions
+
+        Returns:
+            Dict: Throughput, latency percentiles, errors and memory of the level
+        """
+        results: List[Dict] = []
+        uploads: List[float] = []
+        states: List[Dict] = []
+        baseline = rss_mb()
+        requests_before = dict(self.server.stats)
+        started = time.perf_counter()
+        deadline = started + duration if duration else None
+        threads = [threading.Thread(target=self._session, name=f"session-{i}",
+                                    args=(i, sessions, self.config["ramp_seconds"] * i / sessions, deadline,
+                                          results, uploads, states))
+                   for i in range(sessions)]
+        with _MemorySampler() as memory:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = [result["seconds"] for result in results if not result["error"]]
+        errors = sum(result["error"] for result in results)
+        report = {
+            "sessions": sessions,
+            "questions": len(results),
+            "errors": errors,
+            "error_rate": errors / len(results) if results else 0.0,
+            "seconds": elapsed,
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,  # answered questions per second
+            "latency": percentiles(latencies),
+            "upload_latency": percentiles(uploads),
+            "turns": float(np.mean([result["turns"] for result in results])) if results else 0.0,
+            "rss_baseline_mb": baseline,
+            "rss_peak_mb": memory.peak,
+            "memory_per_session_mb": max(memory.peak - baseline, 0.0) / sessions,
+            "server_requests": {kind: self.server.stats[kind] - requests_before[kind] for kind in self.server.stats},
+            "memory_samples": memory.samples,
+        }
+        if duration:
+            # Latency drift: questions finished in the first and last quarter of the run
+            quarter = elapsed / 4
+            report["latency_first_quarter"] = percentiles(
+                [r["seconds"] for r in results if not r["error"] and r["finished"] - started <= quarter])
+            report["latency_last_quarter"] = percentiles(
+                [r["seconds"] for r in results if not r["error"] and r["finished"] - started >= elapsed - quarter])
+        logger.info(f"{sessions} sessions: {report['throughput']:.2f} questions/s, "
+                    f"p95 {report['latency']['p95']:.2f}s, {errors} errors")
+        return report
+
+    def saturation(self, levels: List[Dict]) -> Dict:
+        """
+        Find the first level that stops scaling: it adds less than `min_scaling`
+        times the throughput of the previous level, breaks the p95 latency
+        objective or fails too many questions.
+
+        Returns:
+            Dict: saturation_sessions (None if every level scaled), max_sustainable_sessions and the reason
+        """
+        previous = None
+        for level in levels:
+            reason = None
+            if level["error_rate"] > self.config["max_error_rate"]:
+                reason = f"error rate {level['error_rate']:.1%}"
+            elif self.config["latency_slo"] and level["latency"]["p95"] > self.config["latency_slo"]:
+                reason = f"p95 latency {level['latency']['p95']:.2f}s above {self.config['latency_slo']}s"
+            elif previous and level["throughput"] < previous["throughput"] * self.config["min_scaling"]:
+                reason = (f"throughput {level['throughput']:.2f}/s vs {previous['throughput']:.2f}/s "
+                          f"with {previous['sessions']} sessions")
+            if reason:
+                return {"saturation_sessions": level["sessions"],
+                        "max_sustainable_sessions": previous["sessions"] if previous else None,
+                        "reason": reason}
+            previous = level
+        return {"saturation_sessions": None,
+                "max_sustainable_sessions": previous["sessions"] if previous else None,
+                "reason": "every level scaled"}
+
+    def run(self) -> Dict:
+        """Step through the concurrency levels."""
+        self.setup()
+        try:
+            levels = [self.run_level(sessions) for sessions in self.config["levels"]]
+        finally:
+            self.teardown()
+        return {"config": self.config, "levels": levels, "saturation": self.saturation(levels)}
+
+    def soak(self, sessions: int, duration: float) -> Dict:
+        """
+        Keep sessions busy for a while, to expose memory growth and latency drift.
+
+        Returns:
+            Dict: The level report with the memory growth in MB per minute and
+            the latency of the first and last quarter of the run
+        """
+        self.setup()
+        try:
+            report = self.run_level(sessions, duration)
+        finally:
+            self.teardown()
+        samples = report["memory_samples"]
+        times, mb = np.array([t for t, _ in samples]), np.array([m for _, m in samples])
+        report["memory_growth_mb_per_minute"] = float(np.polyfit(times, mb, 1)[0] * 60) if len(samples) > 2 else 0.0
+        return {"config": self.config, "soak": report}
+
+
+def format_levels(report: Dict) -> str:
+    """Table with one row per concurrency level and the saturation point."""
+    lines = [f"{'sessions':>8} {'questions':>9} {'errors':>6} {'q/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+             f"{'MB/session':>10} {'peak MB':>8}"]
+    for level in report["levels"]:
+        lines.append(f"{level['sessions']:>8} {level['questions']:>9} {level['errors']:>6} {level['throughput']:>7.2f} "
+                     f"{level['latency']['p50']:>7.2f} {level['latency']['p95']:>7.2f} {level['latency']['p99']:>7.2f} "
+                     f"{level['memory_per_session_mb']:>10.2f} {level['rss_peak_mb']:>8.0f}")
+    saturation = report["saturation"]
+    if saturation["saturation_sessions"] is None:
+        lines.append(f"No saturation up to {saturation['max_sustainable_sessions']} sessions")
+    else:
+        lines.append(f"Saturated at {saturation['saturation_sessions']} sessions ({saturation['reason']}); "
+                     f"max sustainable: {saturation['max_sustainable_sessions']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load or soak test concurrent chat sessions against a fake OpenAI server.")
+    parser.add_argument("--suite", default=DEFAULT_SUITE, help="Question suite whose documents and questions are used")
+    parser.add_argument("--levels", help="Comma-separated concurrent sessions of each step, e.g. 1,2,4,8")
+    parser.add_argument("--config", help="JSON file with overrides of DEFAULT_LOAD_CONFIG")
+    parser.add_argument("--questions", type=int, help="Questions per session")
+    parser.add_argument("--think-time", type=float, help="Mean seconds between the questions of a session")
+    parser.add_argument("--upload-ratio", type=float, help="Fraction of sessions that upload a document")
+    parser.add_argument("--chat-latency", type=float, help="Seconds per chat completion")
+    parser.add_argument("--embedding-latency", type=float, help="Seconds per embeddings request")
+    parser.add_argument("--error-rate", type=float, help="Fraction of model requests failing")
+    parser.add_argument("--server-concurrency", type=int, help="Model requests served at the same time, 0 for no limit")
+    parser.add_argument("--latency-slo", type=float, help="p95 seconds per question that saturates a level")
+    parser.add_argument("--soak", type=float, help="Run a soak test of this many seconds instead of the levels")
+    parser.add_argument("--sessions", type=int, default=8, help="Sessions of the soak test")
+    parser.add_argument("--output", help="Write the full report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Log every agent step")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.setLevel(logging.INFO)
+    config = {}
+    if args.config:
+        with open(args.config, "r") as f:
+            config = json.load(f)
+    overrides = {"questions_per_session": args.questions, "think_time": args.think_time,
+                 "upload_ratio": args.upload_ratio, "chat_latency": args.chat_latency,
+                 "embedding_latency": args.embedding_latency, "error_rate": args.error_rate,
+                 "server_concurrency": args.server_concurrency, "latency_slo": args.latency_slo}
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    if args.levels:
+        config["levels"] = [int(level) for level in args.levels.split(",")]
+
+    test = LoadTest(load_suite(args.suite), config)
+    if args.soak:
+        report = test.soak(args.sessions, args.soak)
+        soak = report["soak"]
+        print(f"{soak['sessions']} sessions for {soak['seconds']:.0f}s: {soak['questions']} questions, "
+              f"{soak['errors']} errors, {soak['throughput']:.2f} q/s, p95 {soak['latency']['p95']:.2f}s, "
+              f"memory {soak['rss_baseline_mb']:.0f} -> {soak['rss_peak_mb']:.0f} MB "
+              f"({soak['memory_growth_mb_per_minute']:+.1f} MB/min), p95 first/last quarter "
+              f"{soak['latency_first_quarter']['p95']:.2f}s/{soak['latency_last_quarter']['p95']:.2f}s")
+    else:
+        report = test.run()
+        print(format_levels(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
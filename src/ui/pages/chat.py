@@ -1,7 +1,9 @@
 import streamlit as st
 from src.ui.components.chat_interface import ChatInterface
 from src.utils.agent import AgentAI
-from src.utils.config import UI_CONFIG
+from src.utils.config import UI_CONFIG, CHAT_CONFIG, AGENT_CONFIG
+from src.utils.chat_store import ChatSessionStore
+from src.utils.trace_store import TraceStore
 from src.auth.auth_handler import is_authenticated
 from typing import Generator
 import time
@@ -9,9 +11,17 @@ import time
 class ChatPage:
     def __init__(self):
         self.chat_interface = ChatInterface()
-        self.agent = AgentAI()
+        # The page is built before login too, when there is no user yet
+        self.user_id = (st.session_state.get("user") or {}).get("user_id")
+        self.agent = AgentAI(user_id=self.user_id)
+        self.chat_store = ChatSessionStore()
         self.available_models = UI_CONFIG["available_models"]
         self._initialize_session_state()
+        if st.session_state.chat_session_id and \
+                self.chat_store.session_info(self.user_id, st.session_state.chat_session_id) is None:
+            # Session of another user that logged out in this browser
+            st.session_state.chat_session_id = None
+            st.session_state.traces = TraceStore(self.chat_store, self.user_id)
 
     def _initialize_session_state(self):
         """Initialize session state variables."""
@@ -22,10 +32,81 @@ class ChatPage:
                 "role": "assistant",
                 "content": f"Hello {st.session_state.user['user_id'].capitalize()}! I'm your AI assistant"
             }]
-        if "agent_messages" not in st.session_state:
-            st.session_state["agent_messages"] = []
         if "token_count" not in st.session_state:
             st.session_state["token_count"] = []
+        if "fast_mode" not in st.session_state:
+            st.session_state.fast_mode = AGENT_CONFIG["fast_mode"]
+        if "chat_session_id" not in st.session_state:
+            # Created when the first question is asked
+            st.session_state.chat_session_id = None
+        if "history_start" not in st.session_state:
+            # Position in the session of the first loaded message
+            st.session_state.history_start = 0
+        if "traces" not in st.session_state:
+            st.session_state.traces = TraceStore(self.chat_store, self.user_id, st.session_state.chat_session_id)
+
+    def _greeting(self) -> dict:
+        return {"role": "assistant",
+                "content": f"Hello {st.session_state.user['user_id'].capitalize()}! I'm your AI assistant"}
+
+    def _start_new_chat(self):
+        """Clear the conversation; the new session is created with its first question."""
+        st.session_state.messages = [self._greeting()]
+        st.session_state.chat_session_id = None
+        st.session_state.history_start = 0
+        st.session_state["token_count"] = []
+        st.session_state.traces = TraceStore(self.chat_store, self.user_id)
+
+    def _load_session(self, session_id: str):
+        """Resume a saved session, loading only its most recent messages."""
+        info = self.chat_store.session_info(self.user_id, session_id)
+        page = self.chat_store.load_messages(self.user_id, session_id)
+        st.session_state.messages = [self._greeting()] + page
+        st.session_state.history_start = info["message_count"] - len(page)
+        st.session_state["token_count"] = self.chat_store.load_usage(self.user_id, session_id)
+        st.session_state.chat_session_id = session_id
+        st.session_state.traces = TraceStore(self.chat_store, self.user_id, session_id)
+
+    def _load_older_messages(self):
+        """Prepend the previous page of messages of the current session."""
+        page = self.chat_store.load_messages(self.user_id, st.session_state.chat_session_id,
+                                             end=st.session_state.history_start)
+        st.session_state.messages = st.session_state.messages[:1] + page + st.session_state.messages[1:]
+        st.session_state.history_start -= len(page)
+
+    def _display_sessions(self):
+        """Select a saved chat session in the sidebar."""
+        sessions = self.chat_store.list_sessions(self.user_id, limit=CHAT_CONFIG["sessions_listed"])
+        if not sessions:
+            return
+        titles = {session["session_id"]: session["title"] or "(empty)" for session in sessions}
+        options = [None] + list(titles)
+        current = st.session_state.chat_session_id
+        selected = st.sidebar.selectbox(
+            "Chat sessions",
+            options=options,
+            index=options.index(current) if current in options else 0,
+            format_func=lambda session_id: "Current chat" if session_id is None else titles[session_id]
+        )
+        if selected is not None and selected != current:
+            self._load_session(selected)
+            st.rerun()
+
+    def _display_agent_trace(self):
+        """Show the agent steps of a question, read only while the viewer is open."""
+        options = st.session_state.traces.questions()
+        if not options:
+            return
+        if not st.sidebar.toggle("Agent thinking steps"):
+            return
+        question_selected = st.sidebar.selectbox(
+            "Question",
+            options=options,
+            index=len(options) - 1
+        )
+        if question_selected:
+            for message in st.session_state.traces.get_steps(question_selected):
+                st.sidebar.write(message)
 
 
     def _generate_response(self, prompt: str) -> Generator[str, None, str]:
@@ -39,11 +120,17 @@ class ChatPage:
             
             with st.spinner("Agent is thinking..."):
                 # Get response using the agent
+                self.agent.fast_mode = st.session_state.fast_mode
                 response = self.agent.run(prompt, st.session_state.model)
-                if not st.session_state["agent_messages"]:
-                    st.session_state["agent_messages"] = [self.agent.agent_messages]
-                else:
-                    st.session_state["agent_messages"].extend([self.agent.agent_messages])
+                # Keep only what this question added: its prompt (shared), history range and steps
+                history_end = st.session_state.history_start + len(st.session_state.messages) - 1
+                st.session_state.traces.add(
+                    self.agent.agent_messages[0]["content"],
+                    (st.session_state.history_start, history_end),
+                    self.agent.agent_messages[self.agent.steps_from:],
+                )
+                self.chat_store.append_usage(self.user_id, st.session_state.chat_session_id,
+                                             {**self.agent.token_count, "telemetry": self.agent.telemetry})
                 if not st.session_state["token_count"]:
                     st.session_state["token_count"] = [self.agent.token_count]
                 else:
@@ -76,15 +163,20 @@ class ChatPage:
 
         # Add new chat button in the sidebar
         if st.sidebar.button("New Chat", key="new_chat_button"):
-            st.session_state.messages = [{
-                "role": "assistant",
-                "content": f"Hello {st.session_state.user['user_id'].capitalize()}! I'm your AI assistant"}]
-            st.session_state["agent_messages"] = []
-            st.session_state["token_count"] = []
+            self._start_new_chat()
             st.rerun()
+        self._display_sessions()
 
         # diplay selec model in the sidebar
         self.chat_interface.display_model_controls(self.available_models)    
+        st.sidebar.toggle("Fast mode", key="fast_mode",
+                          help="Skip the thought steps of the agent: fewer LLM calls, faster and cheaper answers")
+
+        # Older messages of long sessions are only loaded on demand
+        if st.session_state.history_start > 0:
+            if st.button(f"Load older messages ({st.session_state.history_start} more)"):
+                self._load_older_messages()
+                st.rerun()
 
         # Display chat messages using the ChatInterface
         self.chat_interface.display_messages(st.session_state.messages)
@@ -93,6 +185,10 @@ class ChatPage:
         if prompt := st.chat_input("What would you like to know about your documents?"):
             # Add user message to chat history
             st.session_state.messages.append({"role": "user", "content": prompt})
+            if st.session_state.chat_session_id is None:
+                st.session_state.chat_session_id = self.chat_store.create_session(self.user_id)
+                st.session_state.traces.attach(st.session_state.chat_session_id)
+            self.chat_store.append_message(self.user_id, st.session_state.chat_session_id, "user", prompt)
             with st.chat_message("user"):
                 st.write(prompt)
             
@@ -104,6 +200,7 @@ class ChatPage:
             
             # Add assistant response to chat history
             st.session_state.messages.append({"role": "assistant", "content": full_response}) 
+            self.chat_store.append_message(self.user_id, st.session_state.chat_session_id, "assistant", full_response)
         
         if st.session_state.token_count:
             st.sidebar.write("Token count:")
@@ -121,23 +218,21 @@ class ChatPage:
             st.sidebar.write(f"Thinking completion tokens: {total_agent_completion_tokens}")
             st.sidebar.write(f"Thinking total tokens: {total_agent_total_tokens}")
 
-            if st.session_state.model.startswith("o"):
-                total_agent_reasoning_tokens = sum(item["agent_interaction"]["reasoning_tokens"]for item in st.session_state["token_count"])
+            total_agent_reasoning_tokens = sum(item["agent_interaction"].get("reasoning_tokens", 0) for item in st.session_state["token_count"])
+            if total_agent_reasoning_tokens:
                 st.sidebar.write(f"Reasoning tokens: {total_agent_reasoning_tokens}")
 
-                
-
-        if st.session_state.agent_messages:
-            options=[i+1 for i in range(len(st.session_state.agent_messages))]
-            index=len(options)-1
-            question_selected =st.sidebar.selectbox(
-                "Agent thinking steps",
-                options=options,
-                index=index
-            )
+            # Tokens and latency of each model tier
+            tiers = {}
+            for item in st.session_state["token_count"]:
+                for tier, stats in item.get("tiers", {}).items():
+                    totals = tiers.setdefault((tier, stats["model"]), {"total_tokens": 0, "seconds": 0.0, "calls": 0})
+                    for key in totals:
+                        totals[key] += stats[key]
+            for (tier, tier_model), totals in tiers.items():
+                st.sidebar.write(f"{tier.capitalize()} ({tier_model}): {totals['total_tokens']} tokens, "
+                                 f"{totals['calls']} calls, {totals['seconds']:.1f}s")
 
-            if question_selected:
-                for message in st.session_state["agent_messages"][question_selected-1][2 * question_selected:]:
-                    st.sidebar.write(message)
+                
 
-    
\ No newline at end of file
+        self._display_agent_trace()
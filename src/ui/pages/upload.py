@@ -6,19 +6,36 @@ from typing import Optional, List, Dict
 from src.auth.auth_handler import is_authenticated
 from src.utils.vector_store_creator import VectorStoreCreator
 from src.utils.vector_store_metadata import VectorStoreMetadata
+from src.utils.ingestion_queue import IngestionQueue, FINISHED_STATES, JOB_SUCCEEDED
+from src.utils.ingestion_worker import ensure_worker_running
+from src.utils.config import INGESTION_CONFIG, LOCAL_EMBEDDING_CONFIG
+from src.utils.embeddings import local_embeddings_available
+from src.utils.store_manifest import EmbeddingMismatchError, current_manifest
+from src.utils.store_summary import build_summary, current_summary
+from src.utils.loaders import supported_extensions
+from src.utils.file_store import ContentAddressedFileStore, StoredFile, hash_file
+from src.utils.namespaces import (SHARED_NAMESPACE, user_namespace, visible_namespaces, qualify, can_write,
+                                  split_store_id, namespace_usage, namespace_quota)
 
 class UploadPage:
     def __init__(self):
-        self.allowed_extensions = ['.txt', '.pdf', '.doc', '.docx']
+        self.allowed_extensions = supported_extensions()
         self.upload_path = "uploads"
         self._ensure_upload_directory()
+        self.file_store = ContentAddressedFileStore(self.upload_path)
         self.vector_store_creator = VectorStoreCreator()
         self.vector_store_metadata = VectorStoreMetadata()
+        self.ingestion_queue = IngestionQueue(INGESTION_CONFIG["jobs_dir"])
+        if "pending_ingestion_jobs" not in st.session_state:
+            st.session_state.pending_ingestion_jobs = []
         self.available_embedding_models = [
             "text-embedding-3-small",
             "text-embedding-3-large",
             "text-embedding-ada-002"
         ]
+        # Models computed on this server, offered when sentence-transformers is installed
+        if local_embeddings_available():
+            self.available_embedding_models.extend(LOCAL_EMBEDDING_CONFIG["models"])
 
     def _ensure_upload_directory(self):
         """Ensure the upload directory exists."""
@@ -64,20 +81,33 @@ class UploadPage:
 
         return name
     
-    def _save_uploaded_file(self, uploaded_file) -> Optional[str]:
-        """Save the uploaded file and return its path."""
+    def _save_uploaded_file(self, uploaded_file) -> Optional[StoredFile]:
+        """
+        Stream the uploaded file to the content-addressed store.
+        Files already ingested into the target vector store are reported and skipped.
+        """
         if uploaded_file is None:
             return None
             
-        file_path = os.path.join(self.upload_path, uploaded_file.name)
         try:
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            return file_path
+            stored = self.file_store.save_stream(uploaded_file, self._sanitize_name(uploaded_file.name) or "file")
+            store_name = self._store_id()
+            if store_name and stored.content_hash in self.vector_store_metadata.get_sources(store_name):
+                st.info(f"{uploaded_file.name} is already in vector store '{store_name}', skipping it.")
+                return None
+            return stored
         except Exception as e:
             st.error(f"Error saving file: {str(e)}")
             return None
 
+    def _store_id(self) -> Optional[str]:
+        """Id of the target vector store: its namespace and the name entered in the sidebar."""
+        store_name = st.session_state.vector_store_params.get("store_name")
+        if not store_name:
+            return None
+        namespace = st.session_state.vector_store_params.get("namespace") or user_namespace(st.session_state.user["user_id"])
+        return qualify(namespace, store_name)
+
     def _display_vector_store_params(self):
         """Display vector store parameters in the sidebar."""
         st.sidebar.title("Vector Store Parameters")
@@ -95,30 +125,57 @@ class UploadPage:
         col1, col2 = st.sidebar.columns(2)
         with col1:
             st.session_state.vector_store_params["chunk_size"] = st.number_input(
-                "Chunk Size (chars)",
-                min_value=100,
-                max_value=5000,
+                "Chunk Size (tokens)",
+                min_value=50,
+                max_value=2000,
                 value=st.session_state.vector_store_params["chunk_size"],
-                step=100,
-                help="Number of characters in each text chunk. Larger chunks capture more context but may be less precise."
+                step=50,
+                help="Maximum number of tokens in each text chunk. Chunks never cross a page or a section heading."
             )
         with col2:
+            # The overlap has to leave room for new text in every chunk
+            max_overlap = min(300, st.session_state.vector_store_params["chunk_size"] - 1)
             st.session_state.vector_store_params["chunk_overlap"] = st.number_input(
-                "Overlap (chars)",
+                "Overlap (tokens)",
                 min_value=0,
-                max_value=500,
-                value=st.session_state.vector_store_params["chunk_overlap"],
+                max_value=max_overlap,
+                value=min(st.session_state.vector_store_params["chunk_overlap"], max_overlap),
                 step=10,
-                help="Number of characters that overlap between consecutive chunks. Helps maintain context between chunks."
+                help="Tokens of trailing sentences repeated at the start of the next chunk. Helps maintain context between chunks."
             )
+        st.session_state.vector_store_params["semantic_merge"] = st.sidebar.checkbox(
+            "Semantic merge",
+            value=st.session_state.vector_store_params.get("semantic_merge", False),
+            help="Only keep adjacent sentences in the same chunk while their embeddings are similar. Costs extra embedding calls."
+        )
         
+        # Visibility of the store: private to the user or shared with everyone
+        own_namespace = user_namespace(st.session_state.user["user_id"])
+        loaded_namespace, loaded_name = split_store_id(st.session_state["vector_store_name"]) \
+            if st.session_state["vector_store_name"] else (own_namespace, "")
+        visibility = st.sidebar.radio(
+            "Visibility",
+            ["Private", "Shared"],
+            index=1 if loaded_namespace == SHARED_NAMESPACE else 0,
+            horizontal=True,
+            help="Private stores are only visible to you. Shared stores are visible to every user."
+        )
+        namespace = SHARED_NAMESPACE if visibility == "Shared" else own_namespace
+        st.session_state.vector_store_params["namespace"] = namespace
+        usage = namespace_usage(namespace, self.vector_store_metadata.load_all(), self.vector_store_creator.temp_dir)
+        quota = namespace_quota(namespace)
+        st.sidebar.caption(
+            f"Quota used: {usage['bytes'] / 1024 ** 2:.1f} / {quota['max_bytes'] / 1024 ** 2:.0f} MB, "
+            f"{usage['vectors']} / {quota['max_vectors']} vectors"
+        )
+
         # Vector store name (required)
         st.session_state.vector_store_params["store_name"] =self._sanitize_name(
             st.sidebar.text_input(
             "Vector Store Name *",
-            value=st.session_state["vector_store_name"],
+            value=loaded_name,
             help="Name for the vector store. This will be used to save and load the store.",
-            placeholder=st.session_state["vector_store_name"]
+            placeholder=loaded_name
         )
         )
 
@@ -135,8 +192,8 @@ class UploadPage:
         )
 
 
-    def _create_vector_store(self, file_paths: List[str]) -> bool:
-        """Create a vector store from the uploaded files."""
+    def _create_vector_store(self, uploaded_files: Dict[str, str]) -> bool:
+        """Queue a background job that creates the vector store from the uploaded files."""
         try:
             # Validate required fields
             if not st.session_state.vector_store_params.get("store_name"):
@@ -146,69 +203,149 @@ class UploadPage:
                 st.error("Vector store description is required. Please enter a description for your vector store.")
                 return False
 
-            with st.spinner("Creating vector store..."):
-                # Update vector store creator parameters
-                self.vector_store_creator.split_documents(
-                    chunk_size=st.session_state.vector_store_params["chunk_size"],
-                    chunk_overlap=st.session_state.vector_store_params["chunk_overlap"]
-                )
-                
-                vector_store = self.vector_store_creator.process_files(
-                    file_paths,
-                    name=st.session_state.vector_store_params["store_name"]
-                )
-                if vector_store:
-                    # Save vector store metadata
-                    if not self.vector_store_metadata.add_vector_store(
-                        st.session_state.vector_store_params["store_name"],
-                        st.session_state.vector_store_params["store_description"],
-                        st.session_state.vector_store_params["embedding_model"]
-                    ):
-                        st.error("Failed to save vector store metadata.")
-                        return False
+            if not self._valid_chunking():
+                return False
 
-                    st.session_state.vector_store = vector_store
-                    st.session_state["vector_store"] = vector_store  # Ensure both formats are set
-                    st.session_state.vector_store_name = st.session_state.vector_store_params["store_name"]
-                    st.success("Vector store created successfully!")
-                    return True
-                else:
-                    st.error("Failed to create vector store from the uploaded files.")
-                    return False
+            # Shared stores of other users are read-only
+            if not self._can_write(self._store_id()):
+                st.error(f"Vector store '{self._store_id()}' is shared by another user. "
+                         "Only its creator or an admin can add documents to it; use another name.")
+                return False
+
+            # Documents added to an existing store must be embedded with its pinned model
+            manifest = current_manifest(self._store_id())
+            if manifest and manifest["embedding_model"] != st.session_state.vector_store_params["embedding_model"]:
+                st.error(f"Vector store '{self._store_id()}' uses the embedding model {manifest['embedding_model']}. "
+                         "Select that model to add documents to it, or migrate the store to the new model.")
+                return False
+
+            params = {
+                "file_paths": list(uploaded_files),
+                "source_names": dict(uploaded_files),
+                "store_name": self._store_id(),
+                "store_description": st.session_state.vector_store_params["store_description"],
+                "embedding_model": st.session_state.vector_store_params["embedding_model"],
+                "chunk_size": st.session_state.vector_store_params["chunk_size"],
+                "chunk_overlap": st.session_state.vector_store_params["chunk_overlap"],
+                "semantic_merge": st.session_state.vector_store_params.get("semantic_merge", False),
+            }
+            self._submit_job(params)
+            return True
         except Exception as e:
             st.error(f"Error creating vector store: {str(e)}")
             return False
 
-    def _get_documents_from_vector_store(self) -> List[Dict]:
-        """Get unique documents from the current vector store."""
+    def _render_ingestion_jobs(self, jobs: List[Dict]):
+        """Display the state and progress of ingestion jobs."""
+        st.subheader("Ingestion Jobs")
+        for job in reversed(jobs[-5:]):
+            store_name = job["params"].get("store_name", "")
+            if job["status"] in FINISHED_STATES:
+                icon = "✅" if job["status"] == JOB_SUCCEEDED else "❌"
+                st.write(f"{icon} **{store_name}** — {job['message']}")
+            else:
+                st.progress(job["progress"], text=f"**{store_name}** — {job['stage']}: {job['message']}")
+
+    @st.fragment(run_every=2)
+    def _poll_ingestion_jobs(self):
+        """Refresh running jobs and load the store of the jobs submitted in this session once they finish."""
+        jobs = self.ingestion_queue.list_jobs(user_id=st.session_state.user["user_id"])
+        self._render_ingestion_jobs(jobs)
+
+        finished = [job for job in jobs
+                    if job["job_id"] in st.session_state.pending_ingestion_jobs and job["status"] in FINISHED_STATES]
+        for job in finished:
+            st.session_state.pending_ingestion_jobs.remove(job["job_id"])
+            if job["status"] == JOB_SUCCEEDED:
+                store_name = job["params"]["store_name"]
+                vector_store = self.vector_store_creator.load_vector_store(store_name)
+                if vector_store:
+                    st.session_state.vector_store = vector_store
+                    st.session_state.vector_store_name = store_name
+        if finished or all(job["status"] in FINISHED_STATES for job in jobs):
+            # Refresh the whole page: documents list, available stores, and stop polling
+            st.rerun(scope="app")
+
+    def _display_ingestion_jobs(self):
+        """Display ingestion jobs of the current user, polling while some are still running."""
+        jobs = self.ingestion_queue.list_jobs(user_id=st.session_state.user["user_id"])
+        if not jobs:
+            return
+        if any(job["status"] not in FINISHED_STATES for job in jobs):
+            ensure_worker_running(INGESTION_CONFIG["jobs_dir"])
+            self._poll_ingestion_jobs()
+        else:
+            self._render_ingestion_jobs(jobs)
+
+    def _get_store_summary(self) -> Optional[Dict]:
+        """Summary of the documents of the current vector store, saved with its published version."""
         if "vector_store" not in st.session_state or st.session_state.vector_store is None:
-            return []
-        
+            return None
+
         try:
-            # Get all documents from the vector store
-            docs = st.session_state.vector_store.docstore._dict.values()
-            
-            # Create a dictionary to store unique documents by source
-            unique_docs = {}
-            for doc in docs:
-                source = doc.metadata.get('source', 'Unknown')
-                if source not in unique_docs:
-                    unique_docs[source] = {
-                        'source': source,
-                        'pages': set()
-                    }
-                unique_docs[source]['pages'].add(doc.metadata.get('page', 0))
-            
-            # Convert to list and sort by source name
-            return sorted(
-                [{'source': doc['source'], 'pages': sorted(doc['pages'])} 
-                 for doc in unique_docs.values()],
-                key=lambda x: x['source']
-            )
+            summary = current_summary(st.session_state.vector_store_name)
+            if summary is None:
+                # Summary file unavailable: summarize the loaded store instead
+                manifest = current_manifest(st.session_state.vector_store_name) or {}
+                summary = build_summary(st.session_state.vector_store, manifest.get("embedding_model", ""))
+            return summary
         except Exception as e:
             print(f"Error getting documents from vector store: {e}")
-            return []
+            return None
 
+    def _can_write(self, store_name: str) -> bool:
+        """Whether the current user can change a store: their own, or a shared one they created (admins: any)."""
+        entry = self.vector_store_metadata.load_all().get(store_name)
+        return can_write(st.session_state.user["user_id"], store_name, entry)
+
+    def _valid_chunking(self) -> bool:
+        """Check the chunking parameters before queueing a job with them."""
+        if st.session_state.vector_store_params["chunk_overlap"] >= st.session_state.vector_store_params["chunk_size"]:
+            st.error("Overlap must be smaller than the chunk size.")
+            return False
+        return True
+
+    def _submit_job(self, params: Dict, kind: str = "ingest") -> None:
+        """Queue a background job on the current vector store and start polling it."""
+        job_id = self.ingestion_queue.submit(params, user_id=st.session_state.user["user_id"], kind=kind)
+        st.session_state.pending_ingestion_jobs.append(job_id)
+        ensure_worker_running(INGESTION_CONFIG["jobs_dir"])
+
+    def _display_source_actions(self, doc: Dict):
+        """Delete one file from the current vector store, or replace it with a new version of the file."""
+        store_name = st.session_state.vector_store_name
+        sources = {doc["content_hash"]: doc["source"]}
+        key = f"{store_name}_{doc['content_hash']}"
+
+        if st.button("Delete from store", key=f"delete_source_{key}",
+                     help="Remove the chunks of this file; the store is compacted in the background"):
+            self._submit_job({"store_name": store_name, "sources": sources}, kind="delete_sources")
+            # Creating the store again from the uploaded files would add it back
+            st.session_state.uploaded_files = {path: name for path, name in st.session_state.uploaded_files.items()
+                                               if not os.path.exists(path) or hash_file(path) not in sources}
+            st.rerun()
+
+        replacement = st.file_uploader("Replace with a new version",
+                                       type=[ext[1:] for ext in self.allowed_extensions],
+                                       key=f"replacement_{key}")
+        if replacement and st.button("Replace", key=f"replace_source_{key}"):
+            # Saved directly: the upload check would skip a file whose content is already in the store
+            stored = self.file_store.save_stream(replacement, self._sanitize_name(replacement.name) or "file")
+            manifest = current_manifest(store_name)
+            if manifest and self._valid_chunking():
+                entry = self.vector_store_metadata.load_all().get(store_name, {})
+                self._submit_job({
+                    "file_paths": [stored.path],
+                    "source_names": {stored.path: stored.source_name},
+                    "store_name": store_name,
+                    "store_description": entry.get("description", ""),
+                    "embedding_model": manifest["embedding_model"],
+                    "chunk_size": st.session_state.vector_store_params["chunk_size"],
+                    "chunk_overlap": st.session_state.vector_store_params["chunk_overlap"],
+                    "semantic_merge": st.session_state.vector_store_params.get("semantic_merge", False),
+                    "replace_sources": sources,
+                })
+                st.rerun()
 
     def _display_vector_store_management(self):
         """Display vector store management options."""
@@ -219,19 +356,37 @@ class UploadPage:
             # Clear current vector store and uploaded files
             if "vector_store" in st.session_state:
                 del st.session_state.vector_store
-            st.session_state.uploaded_files = []
+            st.session_state.uploaded_files = {}
             st.session_state.vector_store_params["store_name"] = ""
             st.session_state.vector_store_params["store_description"] = ""
             st.success("Ready to create a new vector store!")
             st.rerun()
         
         # List available vector stores with descriptions
-        available_stores = self.vector_store_metadata.list_vector_stores()
+        available_stores = self.vector_store_metadata.list_vector_stores(
+            visible_namespaces(st.session_state.user["user_id"])
+        )
         if available_stores:
             st.sidebar.write("Available Vector Stores:")
             for store_name, description in available_stores.items():
                 with st.sidebar.expander(f"📄 {store_name}"):
-                    st.write(f"Description: {description}")
+                    st.write(f"Description: {description.get('description', '') if isinstance(description, dict) else description}")
+                    if not can_write(st.session_state.user["user_id"], store_name, description):
+                        st.caption("Shared by another user (read-only)")
+                        continue
+                    versions = self.vector_store_creator.versions.list_versions(store_name)
+                    if len(versions) > 1:
+                        current = self.vector_store_creator.versions.current_version(store_name)
+                        st.caption(f"Version {versions.index(current) + 1 if current in versions else '?'} of {len(versions)} kept")
+                        if current != versions[0] and st.button("Rollback", key=f"rollback_{store_name}",
+                                                                help="Publish the previous version of this store again"):
+                            restored = self.vector_store_creator.rollback_vector_store(store_name)
+                            if restored:
+                                if st.session_state.get("vector_store_name") == store_name:
+                                    st.session_state.vector_store = self.vector_store_creator.load_vector_store(store_name)
+                                st.rerun()
+                            else:
+                                st.error("No previous version to roll back to")
                     if st.button("Delete", key=f"delete_{store_name}"):
                         # Delete both the vector store and its metadata
                         if self.vector_store_creator.delete_vector_store(store_name):
@@ -251,8 +406,16 @@ class UploadPage:
                 index=0
             )
             if st.sidebar.button("Load Selected Store"):
-                vector_store = self.vector_store_creator.load_vector_store(selected_store)
+                try:
+                    vector_store = self.vector_store_creator.load_vector_store(selected_store)
+                except EmbeddingMismatchError as e:
+                    st.error(str(e))
+                    vector_store = None
                 if vector_store:
+                    # New documents for this store must use its embedding model
+                    manifest = current_manifest(selected_store)
+                    if manifest and manifest["embedding_model"] in self.available_embedding_models:
+                        st.session_state.vector_store_params["embedding_model"] = manifest["embedding_model"]
                     st.session_state.vector_store = vector_store
                     st.session_state["vector_store"] = vector_store
                     st.session_state["vector_store_description"] = self.vector_store_metadata.get_vector_store_description(selected_store)
@@ -275,11 +438,18 @@ class UploadPage:
         if "vector_store" in st.session_state and st.session_state.vector_store is not None:
             st.session_state["vector_store_description"] = self.vector_store_metadata.get_vector_store_description(st.session_state.vector_store_name)
             st.subheader("Documents in Current Vector Store")
-            documents = self._get_documents_from_vector_store()
+            summary = self._get_store_summary()
+            documents = summary["sources"] if summary else []
             if documents:
+                size = f", {summary['bytes'] / 1024 ** 2:.1f} MB" if "bytes" in summary else ""
+                st.caption(f"{summary['documents']} documents, {summary['chunks']} chunks, {summary['tokens']} tokens, "
+                           f"embedded with {summary['embedding_model']}{size}")
                 for doc in documents:
                     with st.expander(f"📄 {doc['source']}"):
                         st.write(f"Pages: {', '.join(map(str, doc['pages']))}")
+                        st.caption(f"{doc['chunks']} chunks, {doc['tokens']} tokens")
+                        if doc.get("content_hash") and self._can_write(st.session_state.vector_store_name):
+                            self._display_source_actions(doc)
             
             else:
                 st.info("No documents found in the current vector store.")
@@ -290,20 +460,21 @@ class UploadPage:
         # Display current uploaded files
         if st.session_state.uploaded_files:
             st.write("Currently uploaded files:")
-            for file_path in st.session_state.uploaded_files:
+            for file_path, source_name in list(st.session_state.uploaded_files.items()):
                 col1, col2 = st.columns([3, 1])
                 with col1:
-                    st.text(os.path.basename(file_path))
+                    st.text(source_name)
                 with col2:
                     if st.button("Remove", key=f"remove_{file_path}"):
-                        st.session_state.uploaded_files.remove(file_path)
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
+                        # Stored content may be shared with other uploads, only forget it here
+                        del st.session_state.uploaded_files[file_path]
                         # Reset vector store if files are removed
                         if "vector_store" in st.session_state:
                             del st.session_state.vector_store
                         st.rerun()
 
+        self._display_ingestion_jobs()
+
         st.write("Upload your documents here. Supported formats: " + ", ".join(self.allowed_extensions))
 
         # Display vector store parameters in sidebar
@@ -328,19 +499,19 @@ class UploadPage:
                 valid_files = [file for file in uploaded_files if self._is_valid_file(file)]
                 if valid_files:
                     with st.spinner("Uploading files..."):
-                        saved_paths = []
+                        saved_files = []
                         for file in valid_files:
-                            saved_path = self._save_uploaded_file(file)
-                            if saved_path:
-                                if saved_path not in st.session_state.uploaded_files:
-                                    st.session_state.uploaded_files.append(saved_path)
-                                saved_paths.append(saved_path)
+                            stored = self._save_uploaded_file(file)
+                            if stored:
+                                # Path of the stored content, with the name this user uploaded it under
+                                st.session_state.uploaded_files[stored.path] = stored.source_name
+                                saved_files.append(stored)
                         
-                        if saved_paths:
-                            # Create or update vector store
+                        if saved_files:
+                            # Queue the creation or update of the vector store
                             if self._create_vector_store(st.session_state.uploaded_files):
-                                st.success("Files uploaded and vector store created successfully!")
-                                st.rerun()  # Force a rerun to update the chat window
+                                st.success("Files uploaded. The vector store is being created in the background.")
+                                st.rerun()  # Force a rerun to start polling the job
                             else:
                                 st.error("Files uploaded but vector store creation failed.")
                 else:
@@ -2,44 +2,92 @@ import openai
 import os
 import logging
 import json
-from typing import List, Dict, Optional
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional
 
-from pydantic import BaseModel
-from typing import Literal, Optional
 from pydantic import ValidationError
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 
-from src.utils.prompts import AGENT_PROMPT
-from src.utils.config import OPENAI_API_KEY
+from src.utils.prompts import AGENT_PROMPT, FAST_MODE_PROMPT, FAST_MODE_NUDGE, FORCE_ANSWER_PROMPT
+from src.utils.config import OPENAI_API_KEY, ROUTING_CONFIG, AGENT_CONFIG, MODEL_TIERS
+from src.utils.response_cache import ResponseCache
 from src.utils.models import AgentOutput
+from src.utils.retrieval import AdaptiveRetriever, QueryEmbeddingCache, format_context_entry
+from src.utils.observations import ObservationBuilder
+from src.utils.store_versions import store_cache_for
+from src.utils.namespaces import can_read, split_store_id, visible_namespaces
+from src.utils.store_router import router_for
+from src.utils.embeddings import get_embeddings
+from src.utils.store_manifest import legacy_manifest, load_index, load_manifest
+from src.utils.store_summary import current_summary, describe_summary
 
 logger = logging.getLogger(__name__)
 
+# Shared by all the agents: speculative retrievals only wait on embeddings and index searches
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-retrieval")
+
+
+def _word_overlap(a: str, b: str) -> float:
+    """Jaccard overlap of the words of two texts."""
+    words_a, words_b = set(re.findall(r"\w+", a.lower())), set(re.findall(r"\w+", b.lower()))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
 class AgentAI:
-    def __init__(self):
+    def __init__(self,
+                 user_id: Optional[str] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 client=None,
+                 embeddings_factory: Optional[Callable[[str], Embeddings]] = None,
+                 fast_mode: Optional[bool] = None,
+                 model_tiers: Optional[Dict[str, str]] = None,
+                 speculative: Optional[bool] = None,
+                 vector_store_dir: str = "temp_vector_store"):
         openai.api_key = OPENAI_API_KEY
+        self.user_id = user_id
+        # Offline evaluations and load tests query their own directory of stores
+        self.temp_dir = vector_store_dir
+        self.store_cache = store_cache_for(vector_store_dir)
+        self.fast_mode = AGENT_CONFIG["fast_mode"] if fast_mode is None else fast_mode
+        self.speculative = AGENT_CONFIG["speculative_retrieval"] if speculative is None else speculative
+        self.model_tiers = {**MODEL_TIERS, **(model_tiers or {})}
+        self.response_cache = response_cache or ResponseCache()
         self.max_retries = 3
         self.retry_delay = 1
         self.known_actions = {
-            "get_context_from_vector_store": self.get_context_from_vector_store
+            "get_context_from_vector_store": self.get_context_from_vector_store,
+            "list_vector_stores": self.list_vector_stores,
         }
+        self.router = router_for(vector_store_dir)
+        self.vector_stores: Dict[str, str] = {}
+        self.store_ranking: List[str] = []
         self.prompt = self._build_prompt()
         self.agent_messages = [{"role": "system", "content": self.prompt}]
-        self.client = openai.OpenAI()
-        self.embeddings = OpenAIEmbeddings()
-        self.temp_dir = "temp_vector_store"
+        # Replaying recorded responses needs no API key
+        self.client = client or openai.OpenAI(api_key=OPENAI_API_KEY or ("replay" if self.response_cache.mode == "replay" else None))
+        # Builds the embeddings of a store from its embedding model name, by default with the backend recorded for the store
+        self.embeddings_factory = embeddings_factory
+        self.retriever = AdaptiveRetriever()
+        self.observations = ObservationBuilder()
+        self.turns = 0
+        self.steps_from = 0
+        self.telemetry: Dict = {}
         self.token_count = {"user_interaction": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
                             "agent_interaction": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
 
-    def _build_prompt(self) -> str:
+    def _load_vector_stores(self) -> Dict[str, str]:
         """
-        Build the system prompt for the agent.
+        Get the descriptions of the vector stores visible to the user.
         Loads vector store metadata from a JSON file.
         If the file or its directory does not exist, it creates them
         and initializes the file with an empty JSON object {}.
         """
-        vector_stores_metadata_path = "temp_vector_store/vector_store_metadata.json"
+        vector_stores_metadata_path = os.path.join(self.temp_dir, "vector_store_metadata.json")
         directory_path = os.path.dirname(vector_stores_metadata_path)
 
         os.makedirs(directory_path, exist_ok=True)
@@ -56,11 +104,128 @@ class AgentAI:
             with open(vector_stores_metadata_path, "r") as f:
                 vector_stores = json.load(f)
         except Exception as e:
-            logger.error(f"Error building prompt: {e}")
+            logger.error(f"Error loading vector stores: {e}")
             raise
 
-        return AGENT_PROMPT.format(vector_stores=vector_stores, 
-                                   known_actions=self.known_actions.keys())
+        # Only the stores the user can see, with just what the agent needs to choose among them
+        namespaces = visible_namespaces(self.user_id)
+        return {
+            name: entry.get("description", "") if isinstance(entry, dict) else entry
+            for name, entry in vector_stores.items()
+            if split_store_id(name)[0] in namespaces
+        }
+
+    def _describe_store(self, name: str) -> str:
+        """Description of a store followed by the documents it holds, from the summary of its current version."""
+        contents = describe_summary(current_summary(name, self.temp_dir), ROUTING_CONFIG["prompt_sources"])
+        return f"{self.vector_stores[name]} ({contents})" if contents else self.vector_stores[name]
+
+    def _build_prompt(self, question: Optional[str] = None) -> str:
+        """
+        Build the system prompt for the agent.
+        Only the stores most related to the question are listed; the rest
+        are reachable through the list_vector_stores action.
+        """
+        self.vector_stores = self._load_vector_stores()
+        self.store_ranking = self.router.rank(question, self.vector_stores)
+        max_stores = ROUTING_CONFIG["max_stores_in_prompt"]
+        listed = {name: self._describe_store(name) for name in self.store_ranking[:max_stores]}
+        remaining = len(self.store_ranking) - len(listed)
+        more_stores = (f"{remaining} more vector stores are available, use the list_vector_stores action to see them."
+                       if remaining > 0 else "")
+
+        prompt = AGENT_PROMPT.format(vector_stores=listed,
+                                     more_stores=more_stores,
+                                     known_actions=self.known_actions.keys())
+        return prompt + FAST_MODE_PROMPT if self.fast_mode else prompt
+
+    def _budget_exhausted(self, turn: int, max_turns: int, used_tokens: int, started: float) -> Optional[str]:
+        """Reason to force the answer before this turn, or None while the question is within budget."""
+        max_tokens = AGENT_CONFIG["max_tokens_per_question"]
+        max_seconds = AGENT_CONFIG["max_seconds_per_question"]
+        if max_tokens and used_tokens >= max_tokens:
+            return "token_budget"
+        if max_seconds and time.perf_counter() - started >= max_seconds:
+            return "latency_budget"
+        if turn == max_turns - 1:
+            return "turn_limit"
+        return None
+
+    def _call_tier(self, tier: str, model: str):
+        """Get a response with the model of a tier, accounting its tokens and latency."""
+        started = time.perf_counter()
+        response = self.get_response(self.agent_messages, model)
+        usage = response.usage
+        reasoning_tokens = getattr(usage.completion_tokens_details, "reasoning_tokens", 0) or 0
+        stats = self.token_count["tiers"].setdefault(tier, {
+            "model": model, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "reasoning_tokens": 0, "total_tokens": 0, "seconds": 0.0,
+        })
+        stats["calls"] += 1
+        stats["prompt_tokens"] += usage.prompt_tokens
+        stats["completion_tokens"] += usage.completion_tokens
+        stats["reasoning_tokens"] += reasoning_tokens
+        stats["total_tokens"] += usage.total_tokens
+        stats["seconds"] = round(stats["seconds"] + time.perf_counter() - started, 3)
+        self.token_count["agent_interaction"]["reasoning_tokens"] += reasoning_tokens
+        return response
+
+    def _finish(self, reason: str, started: float, used_tokens: int) -> None:
+        """Record why and how the question ended."""
+        query_embeddings = self.retriever.query_embeddings
+        observations = self.observations.stats
+        self.telemetry.update({
+            "query_embeddings": {"computed": query_embeddings.computed, "reused": query_embeddings.reused},
+            "observations": {"count": len(observations),
+                             "tokens": sum(stats["tokens"] for stats in observations),
+                             "saved_tokens": sum(stats["saved_tokens"] for stats in observations)},
+            "termination": reason,
+            "turns": self.turns,
+            "tokens": used_tokens,
+            "seconds": round(time.perf_counter() - started, 3),
+        })
+        logger.info(f"Agent finished: {self.telemetry}")
+
+    def _speculate(self, question: Optional[str]) -> Dict[str, Future]:
+        """
+        Start ranking the most likely stores for the raw user question, so
+        the retrieval runs while the first turn is being generated.
+
+        Returns:
+            Dict[str, Future]: Pending rankings by store name
+        """
+        if not self.speculative or not question:
+            return {}
+        limit = AGENT_CONFIG["speculative_stores"]
+        routed = len(self.store_ranking) > ROUTING_CONFIG["max_stores_in_prompt"]
+        if not routed and len(self.store_ranking) > limit:
+            # Stores listed by name: none is more likely than the others
+            return {}
+        stores = self.store_ranking[:limit]
+        self.telemetry["speculation"] = {"stores": stores, "checked": False, "hit": False}
+        return {store: _prefetch_pool.submit(self._rank_store, store, question) for store in stores}
+
+    def _use_speculation(self, prefetched: Dict[str, Future], question: str, action_name: str, params: Dict) -> None:
+        """
+        Check the first retrieval of the agent against the prediction. On a
+        hit the prefetched ranking serves the agent query, which is then
+        neither embedded nor searched again.
+        """
+        speculation = self.telemetry.get("speculation")
+        if not prefetched or speculation["checked"] \
+                or action_name != "get_context_from_vector_store" or params.get("cursor"):
+            return
+        speculation["checked"] = True
+        future = prefetched.get(params["vector_store_name"])
+        if future is None or _word_overlap(question, params["question"]) < AGENT_CONFIG["speculative_min_overlap"]:
+            logger.info(f"Speculative retrieval missed: {params['vector_store_name']} - {params['question']}")
+            return
+        try:
+            future.result()
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed: {e}")
+            return
+        speculation["hit"] = self.retriever.share_ranking(params["vector_store_name"], question, params["question"])
         
     def get_response(self, messages: List[Dict], model) -> str:
         """
@@ -75,73 +240,174 @@ class AgentAI:
             str: The generated response
         """
         try:
-            response = self.client.beta.chat.completions.parse(
-                model=model,
-                messages=messages,
-                response_format=AgentOutput,
+            response = self.response_cache.complete(
+                lambda: self.client.beta.chat.completions.parse(
+                    model=model,
+                    messages=messages,
+                    response_format=AgentOutput,
+                ),
+                model,
+                messages,
+                AgentOutput,
             )
 
-            
             return response
         except Exception as e:
             logger.error(f"Failed to get response from OpenAI: {e}")
             raise
 
-    def get_context_from_vector_store(self, vector_store_name: str, query) -> str:
+    def list_vector_stores(self, offset: Optional[int] = None) -> str:
+        """
+        List the vector stores available to the user, most related to the question first.
+        
+        Args:
+            offset: Position of the next page of stores
+            
+        Returns:
+            str: Store names with their descriptions
+        """
+        start = offset or 0
+        page_size = ROUTING_CONFIG["list_page_size"]
+        names = self.store_ranking[start:start + page_size]
+        if not names:
+            return "No more vector stores available."
+        lines = [f"- {name}: {self._describe_store(name)}" for name in names]
+        next_offset = start + len(names)
+        if next_offset < len(self.store_ranking):
+            lines.append(f"[Showing stores {start + 1}-{next_offset} of {len(self.store_ranking)}. "
+                         f"For more, use offset={next_offset}]")
+        return "\n".join(lines)
+
+    def _rank_store(self, vector_store_name: str, question: str) -> None:
+        """Rank the chunks of a vector store for a question, unless the ranking is already cached."""
+        if self.retriever.has_ranking(vector_store_name, question):
+            return
+        # Get the current version of the vector store, loading it only if it changed
+        with open(os.path.join(self.temp_dir, "vector_store_metadata.json"), "r") as f:
+            metadata = json.load(f)
+            embeddings_model = metadata.get(vector_store_name)["embedding_model"]
+
+        def load(path: str) -> FAISS:
+            # Queries are embedded with the model pinned in the manifest of the loaded version
+            manifest = load_manifest(vector_store_name, path, self.temp_dir) or legacy_manifest(embeddings_model)
+            print(f"Loading vector store from {path} with embedding model {manifest['embedding_model']}")
+            if self.embeddings_factory:
+                embeddings = self.embeddings_factory(manifest["embedding_model"])
+            else:
+                embeddings = get_embeddings(manifest["embedding_model"], manifest.get("embedding_backend"))
+            return load_index(path, embeddings, manifest, vector_store_name)
+
+        vectorstore = self.store_cache.get(vector_store_name, embeddings_model, load)
+        self.retriever.rank(vectorstore, vector_store_name, question)
+
+    def get_context_from_vector_store(self, vector_store_name: str, question: str, cursor: Optional[int] = None) -> str:
         """
         Get relevant context from the vector store.
         
         Args:
             vector_store_name: Name of the vector store to query
-            query: The search query
+            question: The search query
+            cursor: Position of the next page of results for the same query
             
         Returns:
             str: Retrieved context or empty string if error
         """
         try:
-            # Load the vector store by name
-            load_path = os.path.join(self.temp_dir, vector_store_name)
-            with open("./temp_vector_store/vector_store_metadata.json", "r") as f:
-                metadata = json.load(f)
-                embeddings_model = metadata.get(vector_store_name)["embedding_model"]
-            print(f"Loading vector store from {load_path} with embedding model {embeddings_model}")
-            embeddings = OpenAIEmbeddings(model=embeddings_model)
-            vectorstore = FAISS.load_local(load_path, embeddings=embeddings, allow_dangerous_deserialization=True)
-            retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 8})
-
-            docs = retriever.invoke(query)
-            
+            if not can_read(self.user_id, vector_store_name):
+                return f"Error: vector store '{vector_store_name}' does not exist. Use one of the listed vector stores."
+
+            self._rank_store(vector_store_name, question)
+
+            start = cursor or 0
+            docs, next_cursor, total = self.retriever.page(vector_store_name, question, start)
+            if not docs:
+                return "No more relevant results for this question." if start else "No relevant results found for this question."
+
+            footer = None
+            if next_cursor is not None:
+                footer = (f"[Showing results {start + 1}-{start + len(docs)} of {total}. "
+                          f"For more, repeat the same question with cursor={next_cursor}]")
+            if self.retriever.config.get("compact_observations"):
+                return self.observations.build(docs, start, footer)
+
             context_parts = []
-            for i, doc in enumerate(docs, 1):
-                source = doc.metadata.get('source', f'Document {i}')
-                page = doc.metadata.get('page', 'N/A')
-                context_parts.append(f"[{i}] {doc.page_content}\nSource: {source} (Page {page})\n")
+            for i, doc in enumerate(docs, start + 1):
+                context_parts.append(format_context_entry(i, doc))
+            if footer:
+                context_parts.append(footer)
             context = "\n".join(context_parts)
             return context
         except Exception as e:
             logger.error(f"Error getting context from vector store: {e}")
             return ""
     
-    def run(self, chat_history, model, max_turns: int = 15) -> Optional[str]:
+    def run(self, chat_history, model, max_turns: Optional[int] = None) -> Optional[str]:
         """
         Run the agent with the given question.
+        The answer is forced when the token, latency or turn budget of the question runs out.
+
+        Thoughts and actions use the planning tier model; when the planner
+        decides to answer, the answer is written by the synthesis tier model
+        (by default the given model).
+
+        In speculative mode the raw question is retrieved from the most
+        likely stores during the first turn; when the first retrieval of the
+        agent matches, it reuses that ranking instead of waiting for a new one.
         """
+        max_turns = max_turns or AGENT_CONFIG["max_turns"]
+        tier_models = {
+            "planning": self.model_tiers["planning"] or model,
+            "synthesis": self.model_tiers["synthesis"] or model,
+        }
+        self.token_count["tiers"] = {}
+        self.token_count["agent_interaction"]["reasoning_tokens"] = 0
+        started = time.perf_counter()
+        used_tokens = 0
+        self.telemetry = {"fast_mode": self.fast_mode, "thought_turns": 0}
+        # Each query text is embedded once per model in this run, whatever the stores searched
+        self.retriever.query_embeddings = QueryEmbeddingCache()
+        # Citations and shown text are tracked over the observations of this run
+        self.observations = ObservationBuilder()
         try:
                         
+            # Route the stores listed in the system prompt by the latest user question
+            question = next((message["content"] for message in reversed(chat_history)
+                             if message["role"] == "user"), None)
+            self.prompt = self._build_prompt(question)
+            self.agent_messages[0] = {"role": "system", "content": self.prompt}
             self.agent_messages.extend(chat_history[1:])
-
-            if model.startswith("o"):
-                self.token_count["agent_interaction"]["reasoning_tokens"] = 0
+            # Where the agent steps of this question start, to save them as its trace
+            self.steps_from = len(self.agent_messages)
+            # Retrieval for the raw question overlaps the first LLM call
+            prefetched = self._speculate(question)
 
             for turn in range(max_turns):
+                self.turns = turn + 1
+                forced = self._budget_exhausted(turn, max_turns, used_tokens, started)
+                if forced:
+                    logger.info(f"Forcing the answer ({forced})")
+                    self.agent_messages.append({"role": "user", "content": FORCE_ANSWER_PROMPT})
                 # Get agent's response
                 try:
-                    response = self.get_response(self.agent_messages, model)
+                    # A forced turn is an answer turn: go straight to the synthesis model
+                    phase = "synthesis" if forced else "planning"
+                    response = self._call_tier(phase, tier_models[phase])
+                    used_tokens += response.usage.total_tokens
 
                     result = response.choices[0].message.parsed
+
+                    if result and result.type == "answer" and phase == "planning" \
+                            and tier_models["planning"] != tier_models["synthesis"]:
+                        # The planner has gathered enough: the answer itself is written by the synthesis model
+                        self.token_count["agent_interaction"]["prompt_tokens"] += response.usage.prompt_tokens
+                        self.token_count["agent_interaction"]["completion_tokens"] += response.usage.completion_tokens
+                        response = self._call_tier("synthesis", tier_models["synthesis"])
+                        used_tokens += response.usage.total_tokens
+                        result = response.choices[0].message.parsed
                     
                     if not result:
                         logger.error("Invalid agent output format")
+                        self._finish("invalid_output", started, used_tokens)
                         return None
 
                     logger.info(f"Turn {turn+1}: {result.type.upper()} - {result.content}")
@@ -163,9 +429,6 @@ class AgentAI:
                         self.token_count["agent_interaction"]["prompt_tokens"] += response.usage.prompt_tokens
                         self.token_count["user_interaction"]["completion_tokens"] += response.usage.completion_tokens
                     
-                    if model.startswith("o"):
-                        self.token_count["agent_interaction"]["reasoning_tokens"] += response.usage.completion_tokens_details.reasoning_tokens
-
                     
                     self.token_count["user_interaction"]["total_tokens"] = self.token_count["user_interaction"]["prompt_tokens"] + self.token_count["user_interaction"]["completion_tokens"]
                     self.token_count["agent_interaction"]["total_tokens"] = self.token_count["agent_interaction"]["prompt_tokens"] + self.token_count["user_interaction"]["completion_tokens"]
@@ -177,23 +440,25 @@ class AgentAI:
                                                                                     "content": result.content
                                                                                 })}
                         self.agent_messages.append(agent_message)
-                        
+                        self._finish(forced or "answer", started, used_tokens)
                         return result.content
+
+                    if forced:
+                        # The model ignored the request to answer: use its thought if there is one
+                        logger.warning(f"No answer after forcing it ({forced})")
+                        self._finish(forced, started, used_tokens)
+                        if result.type == "thought":
+                            return result.content
+                        return "I wasn't able to find a definitive answer within the allowed budget."
                         
                     elif result.type == "action":                    
 
-                        action_name, action_param = result.function_name, result.parameters
-
-                        question = action_param.question
-                        vector_store_name = action_param.vector_store_name
+                        action_name, action_param = result.function_name, result.parameters.model_dump()
 
                         agent_message = {"role": "assistant", "content": json.dumps({
                                                                                     "type": result.type,
                                                                                     "function_name": action_name,
-                                                                                    "parameters": {
-                                                                                        "question": question,
-                                                                                        "vector_store_name": vector_store_name
-                                                                                    }
+                                                                                    "parameters": action_param
 
                                                                                 })}
                         self.agent_messages.append(agent_message)
@@ -207,22 +472,27 @@ class AgentAI:
                             continue
                         
                         # Execute action and get observation
-                        observation = self.known_actions[action_name](vector_store_name, question)
+                        self._use_speculation(prefetched, question, action_name, action_param)
+                        observation = self.known_actions[action_name](**action_param)
                         # Add observation to message history
                         self.agent_messages.append({"role": "assistant", 
                                                     "content": f"Observation: {observation}"})
                         logger.info(f"Observation: {observation[:100]}...")
                         
                     elif result.type == "thought":
+                        self.telemetry["thought_turns"] += 1
                         agent_message = {"role": "assistant", "content": json.dumps({
                                                                                         "type": result.type,
                                                                                         "content": result.content
                                                                                     })}
                         self.agent_messages.append(agent_message)
-                        pass
+                        if self.fast_mode:
+                            # Fold the thought into the next turn instead of paying for another one
+                            self.agent_messages.append({"role": "user", "content": FAST_MODE_NUDGE})
                     
                     else:
                         logger.error(f"Unknown result type: {result.type}")
+                        self._finish("invalid_output", started, used_tokens)
                         return None
                     
                 except ValidationError as e:
@@ -235,9 +505,10 @@ class AgentAI:
                     continue
                     
             logger.warning(f"Maximum number of turns ({max_turns}) reached without a final answer")
+            self._finish("max_turns", started, used_tokens)
             return "I wasn't able to find a definitive answer within the allowed reasoning steps."
             
         except Exception as e:
             logger.error(f"Error running agent: {e}")
+            self._finish("error", started, used_tokens)
             return f"An error occurred: {str(e)}"
-
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import struct
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.utils.config import CHAT_CONFIG
+from src.utils.file_store import file_lock, write_json_atomic
+from src.utils.namespaces import user_namespace
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_FILE = "messages.jsonl"
+TRACES_FILE = "traces.jsonl"
+USAGE_FILE = "usage.jsonl"
+PROMPTS_FILE = "prompts.jsonl"
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+# Byte offset of each line of a messages or traces file, in `<file>.offsets`
+OFFSET = struct.Struct("<Q")
+
+
+def prompt_hash(prompt: str) -> str:
+    """Short content hash identifying a system prompt."""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class ChatSessionStore:
+    """
+    Append-only store of the chat sessions of each user.
+
+    A session is a directory with one JSON line per message, per agent
+    trace and per token count. Next to the messages and traces files, an
+    offsets file holds the byte offset of every line as a fixed-size
+    integer, so appending is O(1) and a page of recent messages or a single
+    trace is read with two seeks instead of loading the whole session.
+    The user index only keeps a small header per session (title, creation
+    time and the offsets of its system prompts); counts and the update time
+    come from the offsets files.
+    """
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or CHAT_CONFIG["sessions_dir"]
+
+    def _user_dir(self, user_id: str) -> str:
+        return os.path.join(self.root, user_namespace(user_id))
+
+    def _session_dir(self, user_id: str, session_id: str) -> str:
+        return os.path.join(self._user_dir(user_id), session_id)
+
+    def _offsets_path(self, user_id: str, session_id: str, file_name: str) -> str:
+        return os.path.join(self._session_dir(user_id, session_id), f"{file_name}.offsets")
+
+    def _index_lock(self, user_id: str):
+        """Lock held by every read-modify-write of the user index (sessions open in several tabs)."""
+        os.makedirs(self._user_dir(user_id), exist_ok=True)
+        return file_lock(os.path.join(self._user_dir(user_id), LOCK_FILE))
+
+    def _load_index(self, user_id: str) -> Dict[str, Dict]:
+        try:
+            with open(os.path.join(self._user_dir(user_id), INDEX_FILE), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self, user_id: str, index: Dict[str, Dict]) -> None:
+        write_json_atomic(os.path.join(self._user_dir(user_id), INDEX_FILE), index)
+
+    def _append(self, user_id: str, session_id: str, file_name: str, entry: Dict, indexed: bool = True) -> int:
+        """Append a JSON line to a session file (and its offset to the offsets file) and return its byte offset."""
+        path = os.path.join(self._session_dir(user_id, session_id), file_name)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        # The line and its offset are appended together, also from several tabs of one session
+        with file_lock(os.path.join(self._session_dir(user_id, session_id), LOCK_FILE)):
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            if indexed:
+                with open(self._offsets_path(user_id, session_id, file_name), "ab") as f:
+                    f.write(OFFSET.pack(offset))
+        return offset
+
+    def _count(self, user_id: str, session_id: str, file_name: str) -> int:
+        try:
+            return os.path.getsize(self._offsets_path(user_id, session_id, file_name)) // OFFSET.size
+        except FileNotFoundError:
+            return 0
+
+    def _offsets(self, user_id: str, session_id: str, file_name: str, start: int, end: int) -> List[int]:
+        """Offsets of the lines [start, end) of a session file."""
+        if end <= start:
+            return []
+        with open(self._offsets_path(user_id, session_id, file_name), "rb") as f:
+            f.seek(start * OFFSET.size)
+            data = f.read((end - start) * OFFSET.size)
+        return [offset for (offset,) in OFFSET.iter_unpack(data)]
+
+    def _read_at(self, user_id: str, session_id: str, file_name: str, offsets: List[int]) -> List[Dict]:
+        path = os.path.join(self._session_dir(user_id, session_id), file_name)
+        entries = []
+        with open(path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                entries.append(json.loads(f.readline().decode("utf-8")))
+        return entries
+
+    def create_session(self, user_id: str) -> str:
+        """Create an empty session and return its id."""
+        session_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self._session_dir(user_id, session_id), exist_ok=True)
+        with self._index_lock(user_id):
+            index = self._load_index(user_id)
+            index[session_id] = {
+                "title": "",
+                "created_at": datetime.now().isoformat(),
+                "prompt_offsets": {},
+            }
+            self._save_index(user_id, index)
+        return session_id
+
+    def _session_summary(self, user_id: str, session_id: str, entry: Dict) -> Dict:
+        try:
+            updated_at = datetime.fromtimestamp(
+                os.path.getmtime(self._offsets_path(user_id, session_id, MESSAGES_FILE))).isoformat()
+        except FileNotFoundError:
+            updated_at = entry["created_at"]
+        return {
+            "session_id": session_id,
+            "title": entry["title"],
+            "updated_at": updated_at,
+            "message_count": self._count(user_id, session_id, MESSAGES_FILE),
+            "question_count": self._count(user_id, session_id, TRACES_FILE),
+        }
+
+    def list_sessions(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        List the sessions of a user, most recently updated first.
+
+        Returns:
+            List[Dict]: session_id, title, updated_at, message_count and question_count of each session
+        """
+        sessions = [self._session_summary(user_id, session_id, entry)
+                    for session_id, entry in self._load_index(user_id).items()]
+        sessions.sort(key=lambda session: session["updated_at"], reverse=True)
+        return sessions[:limit] if limit else sessions
+
+    def session_info(self, user_id: str, session_id: str) -> Optional[Dict]:
+        """Message and question counts of a session, or None if it does not exist."""
+        entry = self._load_index(user_id).get(session_id)
+        return self._session_summary(user_id, session_id, entry) if entry else None
+
+    def append_message(self, user_id: str, session_id: str, role: str, content: str) -> None:
+        """Append a chat message to a session; the first user message becomes its title."""
+        self._append(user_id, session_id, MESSAGES_FILE,
+                     {"role": role, "content": content, "created_at": datetime.now().isoformat()})
+        if role != "user" or self._load_index(user_id)[session_id]["title"]:
+            return
+        with self._index_lock(user_id):
+            index = self._load_index(user_id)
+            if not index[session_id]["title"]:
+                index[session_id]["title"] = content[:60]
+                self._save_index(user_id, index)
+
+    def append_trace(self, user_id: str, session_id: str, trace: Dict, prompt: Optional[str] = None) -> None:
+        """
+        Append the agent trace of the last question of a session.
+
+        Only the delta of the question is stored: the system prompt is saved
+        once per session and referenced by its hash, and the chat history by
+        the range of session messages the agent was given.
+
+        Args:
+            user_id: Owner of the session
+            session_id: The session
+            trace: prompt_hash, history (message range) and steps of the question
+            prompt: System prompt of the question, saved if the session does not have it yet
+        """
+        if prompt is not None and trace["prompt_hash"] not in self._prompt_offsets(user_id, session_id):
+            with self._index_lock(user_id):
+                index = self._load_index(user_id)
+                prompt_offsets = index[session_id].setdefault("prompt_offsets", {})
+                if trace["prompt_hash"] not in prompt_offsets:
+                    prompt_offsets[trace["prompt_hash"]] = self._append(
+                        user_id, session_id, PROMPTS_FILE, {"hash": trace["prompt_hash"], "content": prompt},
+                        indexed=False)
+                    self._save_index(user_id, index)
+        self._append(user_id, session_id, TRACES_FILE, trace)
+
+    def _prompt_offsets(self, user_id: str, session_id: str) -> Dict[str, int]:
+        return self._load_index(user_id)[session_id].get("prompt_offsets", {})
+
+    def append_usage(self, user_id: str, session_id: str, token_count: Dict) -> None:
+        """Append the token count of the last question of a session."""
+        self._append(user_id, session_id, USAGE_FILE, token_count, indexed=False)
+
+    def load_messages(self, user_id: str, session_id: str, end: Optional[int] = None,
+                      limit: Optional[int] = None) -> List[Dict]:
+        """
+        Load a page of messages of a session.
+
+        Args:
+            user_id: Owner of the session
+            session_id: The session
+            end: Position after the last message to load, the end of the session by default
+            limit: Number of messages to load, CHAT_CONFIG["history_page_size"] by default
+
+        Returns:
+            List[Dict]: Messages [end - limit, end) with their role and content
+        """
+        count = self._count(user_id, session_id, MESSAGES_FILE)
+        end = count if end is None else min(end, count)
+        limit = limit or CHAT_CONFIG["history_page_size"]
+        page = self._offsets(user_id, session_id, MESSAGES_FILE, max(0, end - limit), end)
+        return [{"role": message["role"], "content": message["content"]}
+                for message in self._read_at(user_id, session_id, MESSAGES_FILE, page)]
+
+    def load_trace(self, user_id: str, session_id: str, question: int) -> Dict:
+        """Load the stored trace (prompt_hash, history and steps) of a question (1-based) of a session."""
+        if not 1 <= question <= self._count(user_id, session_id, TRACES_FILE):
+            raise IndexError(f"Session {session_id} has no question {question}")
+        offsets = self._offsets(user_id, session_id, TRACES_FILE, question - 1, question)
+        return self._read_at(user_id, session_id, TRACES_FILE, offsets)[0]
+
+    def load_prompt(self, user_id: str, session_id: str, hash_: str) -> Optional[str]:
+        """Load a system prompt saved in a session by its hash."""
+        offset = self._prompt_offsets(user_id, session_id).get(hash_)
+        if offset is None:
+            return None
+        return self._read_at(user_id, session_id, PROMPTS_FILE, [offset])[0]["content"]
+
+    def load_usage(self, user_id: str, session_id: str) -> List[Dict]:
+        """Load the token count of every question of a session."""
+        path = os.path.join(self._session_dir(user_id, session_id), USAGE_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
@@ -0,0 +1,274 @@
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+
+from src.utils.config import CHUNKING_CONFIG
+from src.utils.loaders import word_per_line
+from src.utils.tokens import CHARS_PER_TOKEN, count_tokens_batch, get_encoding
+
+logger = logging.getLogger(__name__)
+
+HEADING_PATTERNS = [
+    re.compile(r"^#{1,6}\s+\S"),                         # Markdown headings
+    re.compile(r"^(\d+(\.\d+)*\.?|[IVXLC]+\.)\s+[A-ZÁÉÍÓÚÑ]"),  # Numbered headings
+    re.compile(r"^[A-ZÁÉÍÓÚÑ0-9][A-ZÁÉÍÓÚÑ0-9 &/,:()-]{2,60}$"),  # SHORT UPPERCASE LINES
+]
+BULLET_PATTERN = re.compile(r"\s*(?=[●○•▪◦■–]\s)")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;])\s+(?=[^\s])")
+
+
+def embedding_text(chunk: Document) -> str:
+    """
+    Text a chunk is embedded as: the title of its document and its section
+    before its content, so the chunk of a section that never names its
+    document (the "Education" of a CV) is still found by questions about it.
+    """
+    title = os.path.splitext(chunk.metadata.get("source", ""))[0]
+    section = chunk.metadata.get("section", "")
+    header = [part for part in (title, section) if part and not chunk.page_content.startswith(part)]
+    return "\n".join(header + [chunk.page_content])
+
+
+class _Unit:
+    """A sentence-like piece of a page with its position and section."""
+    __slots__ = ("text", "start", "section", "heading", "tokens")
+
+    def __init__(self, text: str, start: int, section: str, heading: bool):
+        self.text = text
+        self.start = start
+        self.section = section
+        self.heading = heading
+        self.tokens = 0
+
+
+class StructureAwareChunker:
+    """
+    Splits loaded documents into chunks sized by tokenizer count.
+
+    Chunks never cross a page (each loaded Document is a page or slide) and
+    never cross a detected heading, so every chunk belongs to a single
+    section. Optionally, adjacent sentences are only kept together while
+    their embeddings stay similar. Tokenization and embeddings run in
+    batches over the whole corpus at once.
+    """
+    def __init__(self,
+                 chunk_size: int = 300,
+                 chunk_overlap: int = 30,
+                 semantic_merge: bool = False,
+                 embeddings: Optional[Embeddings] = None,
+                 similarity_threshold: Optional[float] = None,
+                 encoding_name: Optional[str] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        if semantic_merge and embeddings is None:
+            raise ValueError("semantic_merge requires an embeddings model")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.semantic_merge = semantic_merge
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold or CHUNKING_CONFIG["similarity_threshold"]
+        self.encoding_name = encoding_name or CHUNKING_CONFIG["encoding"]
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """
+        Undo word-per-line extraction artifacts (text from PDFs that the
+        loader could not re-read with its lines), keeping real line
+        structure and indentation otherwise.
+        """
+        lines = [line.rstrip() for line in text.splitlines()]
+        non_empty = [line.strip() for line in lines if line.strip()]
+        if not non_empty:
+            return ""
+        if word_per_line(text):
+            return re.sub(r"\s+", " ", " ".join(non_empty)).strip()
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip("\n")
+
+    @staticmethod
+    def _is_title(line: str) -> bool:
+        """Short Title Case line at the margin ("Experiencia Laboral"), as PDF headings are extracted."""
+        words = line.split()
+        if line[:1].isspace() or len(words) > 5 or line.rstrip()[-1] in ".,;:!?":
+            return False
+        if any(char.isdigit() or char in "|@/()" for char in line):
+            return False
+        return (words[0][0].isupper() and words[-1][0].isupper()
+                and all(word[0].isupper() or len(word) <= 3 for word in words))
+
+    @classmethod
+    def _is_heading(cls, line: str) -> bool:
+        stripped = line.strip()
+        if len(stripped) > 80 or len(stripped.split()) > 10:
+            return False
+        return any(pattern.match(stripped) for pattern in HEADING_PATTERNS) or cls._is_title(line)
+
+    def _units(self, text: str, section: str) -> Tuple[List[_Unit], str]:
+        """Break a normalized page into headings and sentence units."""
+        units = []
+        offset = 0
+        for line in text.split("\n"):
+            line_start = text.find(line, offset) if line else offset
+            offset = line_start + len(line)
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if self._is_heading(line):
+                section = stripped.lstrip("#").strip()
+                units.append(_Unit(stripped, line_start, section, True))
+                continue
+            for piece in BULLET_PATTERN.split(line):
+                for sentence in SENTENCE_PATTERN.split(piece):
+                    sentence = sentence.strip()
+                    if not sentence:
+                        continue
+                    start = text.find(sentence, line_start)
+                    units.append(_Unit(sentence, start if start >= 0 else line_start, section, False))
+        return units, section
+
+    def _split_long(self, unit: _Unit) -> List[_Unit]:
+        """
+        Cut a unit longer than chunk_size into token windows. Windows are cut
+        at the character offsets of their token boundaries, moved back to the
+        start of a character a token boundary falls inside of, so every piece
+        is exact source text at its exact offset.
+        """
+        encoding = get_encoding(self.encoding_name)
+        if encoding is not None:
+            data = unit.text.encode("utf-8")
+            token_bytes = [len(token) for token in encoding.decode_tokens_bytes(
+                encoding.encode(unit.text, disallowed_special=()))]
+            byte_cuts = [sum(token_bytes[:i]) for i in range(0, len(token_bytes), self.chunk_size)]
+            cuts = [len(data[:cut].decode("utf-8", errors="ignore")) for cut in byte_cuts]
+        else:
+            cuts = list(range(0, len(unit.text), self.chunk_size * CHARS_PER_TOKEN))
+
+        result = []
+        for start, end in zip(cuts, cuts[1:] + [len(unit.text)]):
+            piece = unit.text[start:end]
+            if not piece:
+                continue
+            part = _Unit(piece, unit.start + start, unit.section, False)
+            part.tokens = min(self.chunk_size, count_tokens_batch([piece], self.encoding_name)[0])
+            result.append(part)
+        return result
+
+    def _semantic_breaks(self, units: List[_Unit]) -> np.ndarray:
+        """
+        Mark units that start a new topic: cosine similarity with the
+        previous unit below the threshold. Returns a boolean array.
+        """
+        breaks = np.zeros(len(units), dtype=bool)
+        if not self.semantic_merge or len(units) < 2:
+            return breaks
+        batch_size = CHUNKING_CONFIG["embedding_batch_size"]
+        texts = [unit.text for unit in units]
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(self.embeddings.embed_documents(texts[i:i + batch_size]))
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        similarities = np.einsum("ij,ij->i", matrix[1:], matrix[:-1])
+        breaks[1:] = similarities < self.similarity_threshold
+        return breaks
+
+    def _pack(self, doc: Document, text: str, units: List[_Unit], breaks: np.ndarray) -> List[Document]:
+        """Greedily pack the units of one page into chunks."""
+        chunks = []
+        current: List[_Unit] = []
+        current_tokens = 0
+
+        def flush():
+            if not current or all(unit.heading for unit in current):
+                return
+            start = current[0].start
+            end = current[-1].start + len(current[-1].text)
+            metadata = dict(doc.metadata)
+            metadata.update({
+                "section": current[-1].section,
+                "start_index": start,
+                "tokens": sum(unit.tokens for unit in current),
+            })
+            chunks.append(Document(page_content=text[start:end], metadata=metadata))
+
+        for i, unit in enumerate(units):
+            # Consecutive headings (a title and a name) stay together with the text that follows
+            new_section = unit.heading and not all(previous.heading for previous in current)
+            new_topic = bool(breaks[i]) and current_tokens >= self.chunk_size // 2
+            overflow = current_tokens + unit.tokens > self.chunk_size
+
+            if current and (new_section or new_topic or overflow):
+                flush()
+                carried, carried_tokens = [], 0
+                if overflow and not new_section and not new_topic:
+                    # Overlap: carry trailing sentences of the same section
+                    for previous in reversed(current):
+                        if previous.heading or carried_tokens + previous.tokens > self.chunk_overlap:
+                            break
+                        carried.insert(0, previous)
+                        carried_tokens += previous.tokens
+                current, current_tokens = carried, carried_tokens
+
+            current.append(unit)
+            current_tokens += unit.tokens
+
+        flush()
+        return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        Split documents into token-sized, structure-aware chunks.
+
+        Args:
+            documents: Loaded documents, one per page/slide
+
+        Returns:
+            List[Document]: Chunks with the original metadata plus
+            'section', 'start_index', 'tokens' and 'chunk_index' (position
+            of the chunk in its source document)
+        """
+        pages = []
+        all_units: List[_Unit] = []
+        for doc in documents:
+            text = self._normalize(doc.page_content or "")
+            if not text:
+                continue
+            # Sections continue across pages of the same source
+            section = doc.metadata.get("section", "")
+            if pages and pages[-1][0].metadata.get("source") == doc.metadata.get("source"):
+                section = pages[-1][3]
+            units, last_section = self._units(text, section)
+            pages.append((doc, text, units, last_section))
+            all_units.extend(units)
+
+        # One batched tokenizer call for the whole corpus
+        for unit, tokens in zip(all_units, count_tokens_batch([u.text for u in all_units], self.encoding_name)):
+            unit.tokens = tokens
+
+        sized_pages, all_sized = [], []
+        for doc, text, units, _ in pages:
+            sized = []
+            for unit in units:
+                sized.extend(self._split_long(unit) if unit.tokens > self.chunk_size else [unit])
+            sized_pages.append((doc, text, sized, len(all_sized)))
+            all_sized.extend(sized)
+
+        # Embeddings for semantic merging are also computed corpus-wide in batches
+        breaks = self._semantic_breaks(all_sized)
+
+        chunks = []
+        for doc, text, sized, offset in sized_pages:
+            chunks.extend(self._pack(doc, text, sized, breaks[offset:offset + len(sized)]))
+
+        # Chunks are numbered per source document, whatever else is split with it
+        next_index: Dict[str, int] = {}
+        for chunk in chunks:
+            source = chunk.metadata.get("source", "")
+            chunk.metadata["chunk_index"] = next_index.get(source, 0)
+            next_index[source] = chunk.metadata["chunk_index"] + 1
+        logger.info(f"Split {len(documents)} pages into {len(chunks)} chunks")
+        return chunks
@@ -19,4 +19,144 @@ UI_CONFIG = {
         "o3-mini-2025-01-31",
         "o4-mini-2025-04-16",
     ]
-} 
\ No newline at end of file
+} 
+
+# Retrieval Configuration
+RETRIEVAL_CONFIG = {
+    "search_type": os.getenv("RETRIEVAL_SEARCH_TYPE", "mmr"),  # "mmr" or "similarity"
+    "fetch_k": int(os.getenv("RETRIEVAL_FETCH_K", 40)),
+    "lambda_mult": float(os.getenv("RETRIEVAL_LAMBDA_MULT", 0.6)),
+    "score_threshold": float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", 0.3)),
+    "max_observation_tokens": int(os.getenv("RETRIEVAL_MAX_OBSERVATION_TOKENS", 1500)),
+    "max_results_per_page": int(os.getenv("RETRIEVAL_MAX_RESULTS_PER_PAGE", 8)),
+    # Merge overlapping chunks, skip text already shown in the run and cite sources with short ids
+    "compact_observations": os.getenv("RETRIEVAL_COMPACT_OBSERVATIONS", "true").lower() == "true",
+}
+
+# Chunking Configuration (chunk_size and chunk_overlap are in tokens)
+CHUNKING_CONFIG = {
+    "encoding": os.getenv("CHUNKING_ENCODING", "cl100k_base"),
+    "similarity_threshold": float(os.getenv("CHUNKING_SIMILARITY_THRESHOLD", 0.75)),
+    "embedding_batch_size": int(os.getenv("CHUNKING_EMBEDDING_BATCH_SIZE", 256)),
+}
+
+# Background ingestion Configuration
+INGESTION_CONFIG = {
+    "jobs_dir": os.getenv("INGESTION_JOBS_DIR", "temp_vector_store/.jobs"),
+    "max_concurrent_jobs": int(os.getenv("INGESTION_MAX_CONCURRENT_JOBS", 2)),
+    "poll_interval": float(os.getenv("INGESTION_POLL_INTERVAL", 1.0)),
+    "embedding_batch_size": int(os.getenv("INGESTION_EMBEDDING_BATCH_SIZE", 128)),
+}
+
+# Vector store versions Configuration
+STORE_VERSIONS_CONFIG = {
+    "keep_versions": int(os.getenv("STORE_KEEP_VERSIONS", 3)),  # current included, older ones allow rollback
+    "lease_ttl": float(os.getenv("STORE_LEASE_TTL", 600)),  # seconds before a reader lease is considered stale
+    "orphan_ttl": float(os.getenv("STORE_ORPHAN_TTL", 3600)),  # seconds before an unpublished version is removed
+    "publish_attempts": int(os.getenv("STORE_PUBLISH_ATTEMPTS", 3)),  # tries when another writer published first
+}
+
+# Sharding of new vector stores by document hash; 1 keeps a single index per store
+SHARDING_CONFIG = {
+    "shards": int(os.getenv("VECTOR_STORE_SHARDS", 1)),
+    "search_threads": int(os.getenv("VECTOR_STORE_SEARCH_THREADS", 4)),
+}
+
+# OCR of scanned PDF pages (optional: pytesseract, pypdfium2 and the tesseract binary)
+OCR_CONFIG = {
+    "enabled": os.getenv("OCR_ENABLED", "false").lower() == "true",
+    "min_chars_per_page": int(os.getenv("OCR_MIN_CHARS_PER_PAGE", 50)),  # shorter text layers are read with OCR
+    "workers": int(os.getenv("OCR_WORKERS", 0)),  # 0 uses one process per CPU core
+    "language": os.getenv("OCR_LANGUAGE", "spa+eng"),
+    "dpi": int(os.getenv("OCR_DPI", 300)),
+    "tesseract_cmd": os.getenv("TESSERACT_CMD", ""),  # path of the binary if it is not on the PATH
+    "cache_dir": os.getenv("OCR_CACHE_DIR", "temp_vector_store/.cache/ocr"),
+}
+
+# Cache Configuration
+CACHE_CONFIG = {
+    "parsed_documents_dir": os.getenv("PARSED_DOCUMENTS_CACHE_DIR", "temp_vector_store/.cache/parsed"),
+    "llm_cache_mode": os.getenv("LLM_CACHE_MODE", "off"),  # off, record, replay or auto
+    "llm_responses_dir": os.getenv("LLM_CACHE_DIR", "temp_vector_store/.cache/llm"),
+}
+
+# Embedding models Configuration
+EMBEDDING_MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+}
+
+# Embedding models computed on the CPU of the server (sentence-transformers), without network calls
+LOCAL_EMBEDDING_CONFIG = {
+    "models": [
+        "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+        "sentence-transformers/all-MiniLM-L6-v2",
+    ],
+    "runtime": os.getenv("LOCAL_EMBEDDING_RUNTIME", "onnx"),  # onnx or torch
+    # Quantized ONNX weights of the model repository; "" for the full precision export
+    "onnx_file": os.getenv("LOCAL_EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx"),
+    "threads": int(os.getenv("LOCAL_EMBEDDING_THREADS", 0)),  # 0 uses every CPU core
+    "batch_size": int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 32)),
+}
+
+# Namespace quotas, enforced when documents are ingested
+NAMESPACE_QUOTAS = {
+    "user": {
+        "max_bytes": int(os.getenv("USER_QUOTA_MAX_MB", 200)) * 1024 ** 2,
+        "max_vectors": int(os.getenv("USER_QUOTA_MAX_VECTORS", 20000)),
+    },
+    "shared": {
+        "max_bytes": int(os.getenv("SHARED_QUOTA_MAX_MB", 1000)) * 1024 ** 2,
+        "max_vectors": int(os.getenv("SHARED_QUOTA_MAX_VECTORS", 100000)),
+    },
+}
+
+# Users that can change or delete any shared store; other users only change the shared stores they created
+NAMESPACE_ADMINS = [user.strip() for user in os.getenv("SHARED_STORE_ADMINS", "").split(",") if user.strip()]
+
+# Store routing Configuration: only the stores most related to a question are listed in the prompt
+ROUTING_CONFIG = {
+    "max_stores_in_prompt": int(os.getenv("ROUTING_MAX_STORES_IN_PROMPT", 8)),
+    "list_page_size": int(os.getenv("ROUTING_LIST_PAGE_SIZE", 20)),
+    "prompt_sources": int(os.getenv("ROUTING_PROMPT_SOURCES", 5)),  # document names listed per store, 0 for counts only
+    "embedding_model": os.getenv("ROUTING_EMBEDDING_MODEL", "text-embedding-3-small"),
+    "use_centroids": os.getenv("ROUTING_USE_CENTROIDS", "true").lower() == "true",
+    "centroid_weight": float(os.getenv("ROUTING_CENTROID_WEIGHT", 0.5)),  # 0 uses only descriptions
+    "index_dir": os.getenv("ROUTING_INDEX_DIR", "temp_vector_store/.cache/router"),
+}
+
+# Chat sessions Configuration
+CHAT_CONFIG = {
+    "sessions_dir": os.getenv("CHAT_SESSIONS_DIR", "chat_sessions"),
+    "history_page_size": int(os.getenv("CHAT_HISTORY_PAGE_SIZE", 20)),  # messages loaded at a time
+    "sessions_listed": int(os.getenv("CHAT_SESSIONS_LISTED", 20)),
+}
+
+# Agent traces Configuration
+TRACE_CONFIG = {
+    "max_traces_in_memory": int(os.getenv("TRACE_MAX_IN_MEMORY", 20)),  # most recent questions kept per session
+    "spill_to_disk": os.getenv("TRACE_SPILL_TO_DISK", "true").lower() == "true",  # otherwise older traces are dropped
+}
+
+# Agent loop Configuration: budget per question, the answer is forced when it runs out
+AGENT_CONFIG = {
+    "max_turns": int(os.getenv("AGENT_MAX_TURNS", 15)),
+    "max_tokens_per_question": int(os.getenv("AGENT_MAX_TOKENS_PER_QUESTION", 40000)),  # 0 disables the limit
+    "max_seconds_per_question": float(os.getenv("AGENT_MAX_SECONDS_PER_QUESTION", 60)),  # 0 disables the limit
+    "fast_mode": os.getenv("AGENT_FAST_MODE", "false").lower() == "true",  # skip standalone thought turns
+    # Retrieve for the raw question on the most likely stores while the first turn is generated. Off by default:
+    # it costs a query embedding and up to speculative_stores searches per question, wasted when the agent searches
+    # for something else
+    "speculative_retrieval": os.getenv("AGENT_SPECULATIVE_RETRIEVAL", "false").lower() == "true",
+    "speculative_stores": int(os.getenv("AGENT_SPECULATIVE_STORES", 2)),
+    "speculative_min_overlap": 0.5,  # word overlap between the raw question and the agent query to reuse the prefetch
+}
+
+# Model tiers (opt-in): a cheaper model can plan the searches while the model selected in the chat writes the answer
+MODEL_TIERS = {
+    "planning": os.getenv("PLANNING_MODEL", ""),  # empty to use the selected model, e.g. gpt-4.1-mini-2025-04-14
+    "synthesis": os.getenv("SYNTHESIS_MODEL", ""),  # empty to use the selected model
+}
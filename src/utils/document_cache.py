@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import logging
+from importlib import metadata as importlib_metadata
+from typing import List, Optional
+
+from langchain.docstore.document import Document
+
+from src.utils.config import CACHE_CONFIG
+from src.utils.file_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Bump when the post-processing applied to loaded documents changes
+PARSED_CACHE_FORMAT = 1
+
+
+def package_version(package: str) -> str:
+    """Installed version of a package, or 'unknown'."""
+    try:
+        return importlib_metadata.version(package)
+    except importlib_metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def loader_id(loader_name: str, package: Optional[str] = None, version: int = 1) -> str:
+    """Identify a loader by its own version and, if a package does the extraction, that package's version."""
+    package_part = f"/{package}=={package_version(package)}" if package else ""
+    return f"{loader_name}{package_part}/v{version}/v{PARSED_CACHE_FORMAT}"
+
+
+class ParsedDocumentCache:
+    """
+    Persistent cache of extracted page text and metadata.
+
+    Entries are keyed by the content hash of the file and the loader id
+    (loader and its version, extraction package version and cache format),
+    so the same file
+    is parsed once whatever its name or the store it goes into, and a loader
+    upgrade invalidates its entries.
+    """
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or CACHE_CONFIG["parsed_documents_dir"]
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, content_hash: str, loader: str) -> str:
+        loader_key = hashlib.sha1(loader.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{content_hash}-{loader_key}.json")
+
+    def get(self, content_hash: str, loader: str) -> Optional[List[Document]]:
+        """
+        Get the cached documents of a file.
+
+        Args:
+            content_hash: Content hash of the file
+            loader: Loader id used to parse it
+
+        Returns:
+            Optional[List[Document]]: The parsed pages, or None on a miss
+        """
+        try:
+            with open(self._path(content_hash, loader), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry.get("loader") != loader:
+            return None
+        return [Document(page_content=page["page_content"], metadata=page["metadata"]) for page in entry["pages"]]
+
+    def put(self, content_hash: str, loader: str, documents: List[Document]) -> None:
+        """Store the parsed pages of a file."""
+        entry = {
+            "loader": loader,
+            "pages": [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents],
+        }
+        try:
+            write_json_atomic(self._path(content_hash, loader), entry)
+        except (TypeError, OSError) as e:
+            # Metadata that is not JSON serializable is simply not cached
+            logger.warning(f"Could not cache parsed document {content_hash}: {e}")
@@ -0,0 +1,118 @@
+"""
+Embedding backends.
+
+Every store records the backend and model it was built with, and all the
+components get their embeddings from `get_embeddings`, so a query is always
+embedded like the chunks it is compared with.
+"""
+import importlib.util
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from src.utils.config import LOCAL_EMBEDDING_CONFIG, OPENAI_API_KEY
+
+logger = logging.getLogger(__name__)
+
+OPENAI_BACKEND = "openai"
+LOCAL_BACKEND = "local"
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Sentence-transformers model run on the CPU, by default with quantized
+    ONNX weights. Each model is loaded once per process and shared, and
+    texts are encoded in batches with a bounded number of threads.
+    """
+    _models: Dict[tuple, object] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model: str, config: Optional[Dict] = None):
+        self.model = model
+        self.config = {**LOCAL_EMBEDDING_CONFIG, **(config or {})}
+
+    def _model(self):
+        key = (self.model, self.config["runtime"], self.config["onnx_file"], self.config["threads"])
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self._load_model()
+            return self._models[key]
+
+    def _load_model(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("Local embeddings need sentence-transformers: "
+                              "pip install 'sentence-transformers[onnx]'") from e
+
+        threads = self.config["threads"] or os.cpu_count() or 1
+        model_kwargs = {}
+        if self.config["runtime"] == "onnx":
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+            if self.config["onnx_file"]:
+                model_kwargs["file_name"] = self.config["onnx_file"]
+        else:
+            import torch
+            torch.set_num_threads(threads)
+
+        logger.info(f"Loading local embedding model {self.model} ({self.config['runtime']}, {threads} threads)")
+        return SentenceTransformer(self.model, device="cpu", backend=self.config["runtime"],
+                                   model_kwargs=model_kwargs)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = self._model().encode(texts,
+                                       batch_size=self.config["batch_size"],
+                                       normalize_embeddings=True,
+                                       convert_to_numpy=True,
+                                       show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+
+# Builds the embeddings of a model, by backend name
+EMBEDDING_BACKENDS: Dict[str, Callable[[str], Embeddings]] = {
+    OPENAI_BACKEND: lambda model: OpenAIEmbeddings(model=model, openai_api_key=OPENAI_API_KEY),
+    LOCAL_BACKEND: LocalEmbeddings,
+}
+
+
+def embedding_backend(embedding_model: str) -> str:
+    """Name of the backend that computes an embedding model."""
+    return LOCAL_BACKEND if embedding_model in LOCAL_EMBEDDING_CONFIG["models"] else OPENAI_BACKEND
+
+
+def get_embeddings(embedding_model: str, backend: Optional[str] = None) -> Embeddings:
+    """
+    Embeddings of a model.
+
+    Args:
+        embedding_model: Name of the embedding model
+        backend: Backend recorded for the store, inferred from the model name by default
+
+    Returns:
+        Embeddings: LangChain embeddings computing the model
+    """
+    backend = backend or embedding_backend(embedding_model)
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return EMBEDDING_BACKENDS[backend](embedding_model)
+
+
+def local_embeddings_available() -> bool:
+    """Whether the local backend can be used in this installation."""
+    return importlib.util.find_spec("sentence_transformers") is not None
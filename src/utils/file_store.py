@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BLOCK_SIZE = 1024 * 1024  # 1 MiB
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Write JSON to a temporary file and atomically replace the target."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on a lock file while the block runs.
+
+    The lock is shared by every process on the machine, and by the threads
+    of one process, since each call opens its own file handle. Use it around
+    read-modify-write cycles of files that several processes update.
+    """
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def hash_file(file_path: str, block_size: int = BLOCK_SIZE) -> str:
+    """
+    Compute the SHA-256 of a file reading it in fixed-size blocks.
+
+    Args:
+        file_path: Path of the file
+        block_size: Bytes read per block
+
+    Returns:
+        str: Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StoredFile(NamedTuple):
+    """An upload saved in the content-addressed store."""
+    content_hash: str
+    # Where the content is stored; its file name is the one of the first upload of that content
+    path: str
+    # Name this upload should be known by (citations, summaries, metadata)
+    source_name: str
+    new: bool
+
+
+class ContentAddressedFileStore:
+    """
+    Stores uploaded files by the hash of their content.
+
+    A file lives at `<root>/objects/<hash[:2]>/<hash>/<sanitized name>`, so
+    identical uploads (from any user, under any name) are stored once and
+    different files with the same name never overwrite each other. The
+    hash identifies the file for duplicate detection and downstream caches.
+    The stored path is an internal detail: each upload keeps its own name as
+    `StoredFile.source_name`, whoever uploaded that content first.
+    """
+    def __init__(self, root: str = "uploads", block_size: int = BLOCK_SIZE):
+        self.root = root
+        self.block_size = block_size
+        self.objects_dir = os.path.join(root, "objects")
+        self.incoming_dir = os.path.join(root, ".incoming")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.incoming_dir, exist_ok=True)
+
+    def object_dir(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def find(self, digest: str) -> Optional[str]:
+        """Return the stored path of a content hash, or None if it is not stored."""
+        directory = self.object_dir(digest)
+        if not os.path.isdir(directory):
+            return None
+        files = sorted(os.listdir(directory))
+        return os.path.join(directory, files[0]) if files else None
+
+    def save_stream(self, stream: BinaryIO, file_name: str) -> StoredFile:
+        """
+        Stream a file to disk in blocks while hashing it.
+
+        The content is written to a temporary file first and only moved to
+        its content-addressed location when complete; if that content is
+        already stored, the temporary copy is dropped.
+
+        Args:
+            stream: Readable binary stream (e.g. a Streamlit UploadedFile)
+            file_name: Sanitized name to store the file under
+
+        Returns:
+            StoredFile: Content hash, stored path, `file_name` as the source
+            name of this upload and whether the content was new
+        """
+        if hasattr(stream, "seek"):
+            stream.seek(0)
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.incoming_dir, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, "wb") as f:
+                for block in iter(lambda: stream.read(self.block_size), b""):
+                    digest.update(block)
+                    f.write(block)
+            content_hash = digest.hexdigest()
+
+            existing = self.find(content_hash)
+            if existing:
+                os.remove(tmp_path)
+                return StoredFile(content_hash, existing, file_name, False)
+
+            directory = self.object_dir(content_hash)
+            os.makedirs(directory, exist_ok=True)
+            file_path = os.path.join(directory, file_name)
+            os.replace(tmp_path, file_path)
+            return StoredFile(content_hash, file_path, file_name, True)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,229 @@
+import json
+import os
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.utils.file_store import file_lock, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def process_alive(pid: int) -> bool:
+    """Whether a process with this id is running."""
+    if os.name == "nt":
+        try:
+            import psutil
+        except ImportError:
+            # Without psutil the owner cannot be checked on Windows: treat it as gone
+            return False
+        return psutil.pid_exists(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, under another user
+        return True
+    return True
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class IngestionQueue:
+    """
+    A local, file-backed queue of ingestion jobs.
+
+    Every job is a JSON file under `jobs_dir`, rewritten atomically on each
+    state or progress change, so any process (the Streamlit app or the
+    worker) can read it at any time and jobs survive page refreshes and
+    restarts. A worker claims a job by creating its lock file exclusively;
+    the lock records the ids of the processes running the job.
+    """
+    def __init__(self, jobs_dir: str = "temp_vector_store/.jobs"):
+        self.jobs_dir = jobs_dir
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _lock_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.lock")
+
+    def submit(self, params: Dict, user_id: Optional[str] = None, kind: str = "ingest") -> str:
+        """
+        Queue a new job.
+
+        Args:
+            params: Parameters of the job (files, store name, chunking...)
+            user_id: User that submitted the job
+            kind: Type of job, selects the handler in the worker
+
+        Returns:
+            str: Id of the queued job
+        """
+        # Sortable by submission time, also between jobs submitted in the same millisecond
+        job_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "user_id": user_id,
+            "status": JOB_QUEUED,
+            "stage": "queued",
+            "progress": 0.0,
+            "message": "",
+            "params": params,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        write_json_atomic(self._job_path(job_id), job)
+        logger.info(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Read the current state of a job, or None if it does not exist."""
+        try:
+            with open(self._job_path(job_id), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def list_jobs(self, user_id: Optional[str] = None, status: Optional[str] = None) -> List[Dict]:
+        """
+        List jobs ordered by creation time.
+
+        Args:
+            user_id: Only jobs of this user, if given
+            status: Only jobs in this state, if given
+
+        Returns:
+            List[Dict]: Matching jobs, oldest first
+        """
+        jobs = []
+        for file_name in sorted(os.listdir(self.jobs_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            job = self.get_job(file_name[:-len(".json")])
+            if job is None:
+                continue
+            if user_id is not None and job.get("user_id") != user_id:
+                continue
+            if status is not None and job["status"] != status:
+                continue
+            jobs.append(job)
+        return jobs
+
+    def update_job(self, job_id: str, **fields) -> Optional[Dict]:
+        """Update fields of a job and persist it atomically."""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        write_json_atomic(self._job_path(job_id), job)
+        return job
+
+    def report_progress(self, job_id: str, stage: str, progress: float, message: str = "") -> None:
+        """Persist the stage and progress (0 to 1) of a running job."""
+        self.update_job(job_id, stage=stage, progress=round(min(max(progress, 0.0), 1.0), 3), message=message)
+
+    def claim_next_job(self) -> Optional[Dict]:
+        """
+        Claim the oldest queued job for this worker.
+
+        Jobs on a store that already has a running job stay queued: two jobs
+        publishing the same store at once would each start from the same
+        version, and the chunks of the first to publish would be lost.
+
+        Returns:
+            Optional[Dict]: The claimed job, now running, or None if there is none
+        """
+        with file_lock(os.path.join(self.jobs_dir, "claim.lock")):
+            busy_stores = {job["params"].get("store_name") for job in self.list_jobs(status=JOB_RUNNING)}
+            for job in self.list_jobs(status=JOB_QUEUED):
+                if job["params"].get("store_name") in busy_stores:
+                    continue
+                try:
+                    fd = os.open(self._lock_path(job["job_id"]), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    continue
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"pids": [os.getpid()]}, f)
+                return self.update_job(job["job_id"],
+                                       status=JOB_RUNNING,
+                                       stage="starting",
+                                       started_at=datetime.now().isoformat())
+        return None
+
+    def finish_job(self, job_id: str, succeeded: bool, message: str = "") -> None:
+        """Mark a job as finished and release its lock."""
+        fields = {
+            "status": JOB_SUCCEEDED if succeeded else JOB_FAILED,
+            "stage": "done" if succeeded else "failed",
+            "message": message,
+            "finished_at": datetime.now().isoformat(),
+        }
+        if succeeded:
+            fields["progress"] = 1.0
+        self.update_job(job_id, **fields)
+        try:
+            os.remove(self._lock_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def job_owners(self, job_id: str) -> List[int]:
+        """Ids of the processes running a job: the worker that claimed it and the process it runs in."""
+        try:
+            with open(self._lock_path(job_id), "r") as f:
+                return json.load(f).get("pids", [])
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            return []
+
+    def add_job_owner(self, job_id: str) -> None:
+        """Record the current process as running a claimed job."""
+        owners = self.job_owners(job_id)
+        write_json_atomic(self._lock_path(job_id), {"pids": owners + [os.getpid()]})
+
+    def requeue_interrupted_jobs(self) -> int:
+        """
+        Put back in the queue the running jobs whose processes are all gone
+        (a worker that died). Jobs whose worker or job process is still alive
+        are left running, so they are never run twice at the same time.
+
+        Returns:
+            int: Number of requeued jobs
+        """
+        requeued = 0
+        for job in self.list_jobs(status=JOB_RUNNING):
+            if any(process_alive(pid) for pid in self.job_owners(job["job_id"])):
+                continue
+            try:
+                os.remove(self._lock_path(job["job_id"]))
+            except FileNotFoundError:
+                pass
+            self.update_job(job["job_id"], status=JOB_QUEUED, stage="queued", progress=0.0,
+                            message="Requeued after worker restart")
+            requeued += 1
+        return requeued
+
+    def worker_heartbeat_path(self) -> str:
+        return os.path.join(self.jobs_dir, "worker.heartbeat")
+
+    def beat(self) -> None:
+        """Record that a worker is alive."""
+        write_json_atomic(self.worker_heartbeat_path(), {"pid": os.getpid(), "time": time.time()})
+
+    def worker_alive(self, timeout: float = 15.0) -> bool:
+        """Check whether a worker has reported a heartbeat recently."""
+        try:
+            with open(self.worker_heartbeat_path(), "r") as f:
+                heartbeat = json.load(f)
+            return time.time() - heartbeat["time"] < timeout
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return False
@@ -0,0 +1,276 @@
+"""
+Background worker that runs queued ingestion jobs.
+
+Run it with `python -m src.utils.ingestion_worker`; the upload page also
+starts it on demand when no worker heartbeat is found.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from typing import Dict
+
+from src.utils.config import INGESTION_CONFIG
+from src.utils.file_store import hash_file
+from src.utils.ingestion_queue import IngestionQueue, JOB_RUNNING
+from src.utils.namespaces import (SHARED_NAMESPACE, can_write, check_quota, estimate_ingest_bytes, namespace_usage,
+                                  owner_usage, split_store_id, user_namespace)
+from src.utils.store_router import StoreRouter
+
+logger = logging.getLogger(__name__)
+
+
+def _record_centroid(store_name: str, embedding_model: str, vector_store) -> None:
+    try:
+        StoreRouter().record_centroid(store_name, embedding_model, vector_store)
+    except Exception as e:
+        # Routing falls back to the store description
+        logger.warning(f"Could not record the centroid of '{store_name}': {e}")
+
+
+def _delete_sources(store_name: str, embedding_model: str, sources: Dict[str, str], metadata) -> int:
+    """Remove some files from a store as a new version and from its metadata; returns the chunks removed."""
+    from src.utils.vector_store_creator import VectorStoreCreator
+
+    creator = VectorStoreCreator(embedding_model=embedding_model)
+    removed = creator.delete_sources(store_name, sources)
+    metadata.remove_sources(store_name, list(sources))
+    if removed:
+        metadata.update_vector_store(store_name, vector_count=creator.db.index.ntotal)
+        _record_centroid(store_name, embedding_model, creator.db)
+    return removed
+
+
+def run_ingest_job(queue: IngestionQueue, job: Dict) -> str:
+    """
+    Load, split, embed and publish the files of an ingestion job.
+    With `replace_sources` in its parameters, the chunks of those files of
+    the store are removed in the same new version.
+
+    Returns:
+        str: Summary message of the finished job
+    """
+    # Imported here so the worker loop itself stays light
+    from src.utils.vector_store_creator import VectorStoreCreator
+    from src.utils.vector_store_metadata import VectorStoreMetadata
+
+    params = job["params"]
+    metadata = VectorStoreMetadata()
+    user_id = job.get("user_id")
+    if not can_write(user_id, params["store_name"], metadata.load_all().get(params["store_name"])):
+        raise PermissionError(f"User '{user_id}' cannot change vector store '{params['store_name']}'")
+
+    def progress(stage: str, fraction: float, message: str = ""):
+        queue.report_progress(job["job_id"], stage, fraction, message)
+
+    # Skip files whose content is already in the store before any parsing or embedding
+    replace_sources = params.get("replace_sources") or {}
+    known_sources = {content_hash: source for content_hash, source in metadata.get_sources(params["store_name"]).items()
+                     if content_hash not in replace_sources}
+    # Stored uploads are named after the first upload of their content: each job carries its own names
+    source_names = params.get("source_names") or {}
+    new_files: Dict[str, str] = {}
+    for file_path in params["file_paths"]:
+        content_hash = hash_file(file_path)
+        if content_hash not in known_sources and content_hash not in new_files:
+            new_files[content_hash] = file_path
+    skipped = len(params["file_paths"]) - len(new_files)
+    if not new_files:
+        message = f"All {skipped} files are already in vector store '{params['store_name']}'"
+        if not replace_sources:
+            return message
+        # The new content is already in the store under another name: only the replaced files are removed
+        progress("deleting", 0.3, f"Removing {len(replace_sources)} files")
+        removed = _delete_sources(params["store_name"], params["embedding_model"], replace_sources, metadata)
+        return f"{message}; removed {removed} chunks of {', '.join(replace_sources.values())}"
+
+    namespace = split_store_id(params["store_name"])[0]
+
+    def enforce_quota(chunks):
+        all_metadata = metadata.load_all()
+        text_bytes = sum(len(chunk.page_content.encode("utf-8")) for chunk in chunks)
+        new_bytes = estimate_ingest_bytes(len(chunks), text_bytes, params["embedding_model"])
+        check_quota(namespace, namespace_usage(namespace, all_metadata), len(chunks), new_bytes)
+        if namespace == SHARED_NAMESPACE and user_id:
+            # Shared stores also count against the quota of the user who creates them
+            check_quota(user_namespace(user_id), owner_usage(user_id, all_metadata), len(chunks), new_bytes)
+
+    creator = VectorStoreCreator(embedding_model=params["embedding_model"])
+    vector_store = creator.process_files(
+        list(new_files.values()),
+        name=params["store_name"],
+        chunk_size=params["chunk_size"],
+        chunk_overlap=params["chunk_overlap"],
+        semantic_merge=params.get("semantic_merge", False),
+        progress_callback=progress,
+        before_embedding=enforce_quota,
+        replace_sources=replace_sources,
+        source_names=source_names,
+    )
+    if vector_store is None:
+        raise RuntimeError("No documents could be processed from the uploaded files")
+
+    if not metadata.add_vector_store(params["store_name"],
+                                     params["store_description"],
+                                     params["embedding_model"],
+                                     owner=user_id):
+        raise RuntimeError("Failed to save vector store metadata")
+    metadata.update_vector_store(params["store_name"], vector_count=vector_store.index.ntotal)
+    metadata.remove_sources(params["store_name"], list(replace_sources))
+    metadata.add_sources(params["store_name"],
+                         {content_hash: source_names.get(path) or os.path.basename(path)
+                          for content_hash, path in new_files.items()})
+    _record_centroid(params["store_name"], params["embedding_model"], vector_store)
+    message = f"Vector store '{params['store_name']}' published with {len(creator.split_docs)} new chunks"
+    if replace_sources:
+        message += f" replacing {', '.join(replace_sources.values())}"
+    if skipped:
+        message += f" ({skipped} duplicate files skipped)"
+    if creator.ocr_timings:
+        pages = sum(timings["pages"] for timings in creator.ocr_timings)
+        seconds = sum(timings["wall_seconds"] for timings in creator.ocr_timings)
+        message += f", {pages} scanned pages read with OCR in {seconds:.0f}s"
+    return message
+
+
+def run_delete_job(queue: IngestionQueue, job: Dict) -> str:
+    """
+    Remove the chunks of some files from a store and publish the compacted
+    index as a new version.
+
+    Returns:
+        str: Summary message of the finished job
+    """
+    from src.utils.store_manifest import current_manifest
+    from src.utils.vector_store_metadata import VectorStoreMetadata
+
+    params = job["params"]
+    store_name, sources = params["store_name"], params["sources"]
+    metadata = VectorStoreMetadata()
+    if not can_write(job.get("user_id"), store_name, metadata.load_all().get(store_name)):
+        raise PermissionError(f"User '{job.get('user_id')}' cannot change vector store '{store_name}'")
+    manifest = current_manifest(store_name)
+    if manifest is None:
+        raise FileNotFoundError(f"Vector store '{store_name}' does not exist")
+
+    queue.report_progress(job["job_id"], "deleting", 0.3, f"Removing {len(sources)} files")
+    removed = _delete_sources(store_name, manifest["embedding_model"], sources, metadata)
+    return f"Removed {removed} chunks of {', '.join(sources.values())} from vector store '{store_name}'"
+
+
+JOB_HANDLERS = {
+    "ingest": run_ingest_job,
+    "delete_sources": run_delete_job,
+}
+
+
+def _run_job(job_id: str, jobs_dir: str):
+    """Entry point of the child process running a single job."""
+    logging.basicConfig(level=logging.INFO)
+    queue = IngestionQueue(jobs_dir)
+    # The job keeps its lock while this process runs, even if the worker dies
+    queue.add_job_owner(job_id)
+    job = queue.get_job(job_id)
+    try:
+        message = JOB_HANDLERS[job["kind"]](queue, job)
+        queue.finish_job(job_id, True, message)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        queue.finish_job(job_id, False, str(e))
+
+
+def run_worker(jobs_dir: str = INGESTION_CONFIG["jobs_dir"],
+               max_concurrency: int = INGESTION_CONFIG["max_concurrent_jobs"],
+               poll_interval: float = INGESTION_CONFIG["poll_interval"]):
+    """
+    Claim queued jobs and run each one in its own process, at most
+    `max_concurrency` at a time.
+    """
+    queue = IngestionQueue(jobs_dir)
+    if queue.worker_alive():
+        logger.info("Another ingestion worker is already running")
+        return
+    queue.beat()
+
+    running: Dict[str, multiprocessing.Process] = {}
+    while True:
+        queue.beat()
+        # Jobs left by a previous worker are taken over once their job processes are gone too
+        requeued = queue.requeue_interrupted_jobs()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted jobs")
+
+        for job_id, process in list(running.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            job = queue.get_job(job_id)
+            if job and job["status"] == JOB_RUNNING:
+                # The child died without reporting (crash, OOM kill...)
+                queue.finish_job(job_id, False, f"Job process exited with code {process.exitcode}")
+            del running[job_id]
+
+        while len(running) < max_concurrency:
+            job = queue.claim_next_job()
+            if job is None:
+                break
+            process = multiprocessing.Process(target=_run_job, args=(job["job_id"], jobs_dir))
+            process.start()
+            running[job["job_id"]] = process
+            logger.info(f"Started job {job['job_id']} ({len(running)}/{max_concurrency} slots)")
+
+        time.sleep(poll_interval)
+
+
+def ensure_worker_running(jobs_dir: str = INGESTION_CONFIG["jobs_dir"]) -> bool:
+    """
+    Start a detached worker process if no worker is alive.
+
+    Returns:
+        bool: True if a new worker was started
+    """
+    queue = IngestionQueue(jobs_dir)
+    if queue.worker_alive():
+        return False
+
+    # Avoid several sessions spawning workers at the same time
+    spawn_lock = os.path.join(jobs_dir, "worker.spawn")
+    try:
+        if time.time() - os.path.getmtime(spawn_lock) < 15:
+            return False
+        os.remove(spawn_lock)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(spawn_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+
+    if os.name == "nt":
+        detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    # The worker keeps its own copy of the log file descriptor
+    with open(os.path.join(jobs_dir, "worker.log"), "a") as log_file:
+        subprocess.Popen([sys.executable, "-m", "src.utils.ingestion_worker", "--jobs-dir", jobs_dir],
+                         stdout=log_file, stderr=subprocess.STDOUT, **detach)
+    logger.info("Started ingestion worker")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the background ingestion worker.")
+    parser.add_argument("--jobs-dir", default=INGESTION_CONFIG["jobs_dir"])
+    parser.add_argument("--max-concurrency", type=int, default=INGESTION_CONFIG["max_concurrent_jobs"])
+    parser.add_argument("--poll-interval", type=float, default=INGESTION_CONFIG["poll_interval"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    run_worker(args.jobs_dir, args.max_concurrency, args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
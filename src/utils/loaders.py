@@ -0,0 +1,398 @@
+"""
+Document loaders by file extension.
+
+Each format has a loader returning one Document per page (PDF pages, Word
+pages as last laid out by Word, slides). Formats without pages (text,
+Markdown, HTML) are a single page. Native extractors render headings as
+Markdown headings, list items as bullets and tables as rows of cells, so
+the chunker finds the real sections of the document instead of guessing
+them from the text.
+
+Legacy `.doc` files go through the Unstructured loader, which is only
+imported when such a file is loaded. New formats are added with
+`register_loader`. Per-format throughput is measured with:
+
+    python -m src.utils.loaders benchmark <files or directories> [--repeat 3]
+"""
+import argparse
+import logging
+import os
+import re
+import time
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+
+from langchain.docstore.document import Document
+
+logger = logging.getLogger(__name__)
+
+
+class FormatLoader:
+    """
+    A way to extract the pages of a file format.
+
+    Args:
+        name: Name of the loader, part of the parsed-document cache key
+        package: Package doing the extraction, if any; its version is part of the cache key
+        load: Function returning the pages of a file
+        version: Version of the loader itself, bumped when its output changes
+    """
+    def __init__(self, name: str, package: Optional[str], load: Callable[[str], List[Document]], version: int = 1):
+        self.name = name
+        self.package = package
+        self.load = load
+        self.version = version
+
+
+LOADERS: Dict[str, FormatLoader] = {}
+
+
+def register_loader(extensions: List[str], loader: FormatLoader) -> None:
+    """Use a loader for files with the given extensions (with the dot, lowercase)."""
+    for extension in extensions:
+        LOADERS[extension] = loader
+
+
+def get_loader(file_path: str) -> Optional[FormatLoader]:
+    """Loader of a file by its extension, or None if the format is not supported."""
+    return LOADERS.get(os.path.splitext(file_path.lower())[1])
+
+
+def supported_extensions() -> List[str]:
+    return sorted(LOADERS)
+
+
+def _pages(texts: List[str]) -> List[Document]:
+    """Documents of the non-empty pages, numbered from 1."""
+    return [Document(page_content=text, metadata={"page": number})
+            for number, text in enumerate(texts, start=1) if text.strip()]
+
+
+def _read_text(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        data = f.read()
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Files saved by older Windows editors
+        return data.decode("cp1252", errors="replace")
+
+
+def word_per_line(text: str) -> bool:
+    """Whether text came out of the PDF with one word per line (most lines are a single word)."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return bool(lines) and sum(1 for line in lines if " " not in line) / len(lines) > 0.6
+
+
+def _layout_text(page) -> str:
+    """
+    Text of a PDF page read in pypdf's layout mode, which keeps the lines
+    of the page. Column padding is removed; indented lines (list items and
+    their continuations) keep one leading space so they are not taken for
+    headings.
+    """
+    lines = []
+    for line in page.extract_text(extraction_mode="layout").splitlines():
+        words = line.split()
+        lines.append((" " if words and line[0].isspace() else "") + " ".join(words))
+    return "\n".join(lines)
+
+
+def load_pdf(file_path: str) -> List[Document]:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    docs = PyPDFLoader(file_path).load()
+    reader = None
+    for number, doc in enumerate(docs, start=1):
+        if word_per_line(doc.page_content):
+            # Some PDFs come out with one word per line, which loses their headings
+            if reader is None:
+                from pypdf import PdfReader
+                reader = PdfReader(file_path)
+            doc.page_content = _layout_text(reader.pages[doc.metadata.get("page", number - 1)])
+        doc.metadata["page"] = number
+    return docs
+
+
+def load_text(file_path: str) -> List[Document]:
+    return [Document(page_content=_read_text(file_path), metadata={"page": 1})]
+
+
+_SETEXT_HEADING = re.compile(r"^(?P<text>[^\n]+)\n(?P<underline>=+|-+)[ \t]*$", re.MULTILINE)
+_FRONT_MATTER = re.compile(r"\A---\n.*?\n---\n", re.DOTALL)
+
+
+def load_markdown(file_path: str) -> List[Document]:
+    text = _FRONT_MATTER.sub("", _read_text(file_path).replace("\r\n", "\n"))
+    # Underlined headings as # headings, the form the chunker recognizes
+    text = _SETEXT_HEADING.sub(
+        lambda m: ("# " if m.group("underline")[0] == "=" else "## ") + m.group("text").strip(), text)
+    return [Document(page_content=text, metadata={"page": 1})]
+
+
+_WORD_HEADING_STYLE = re.compile(r"^(heading|t[ií]tulo)\s*(\d)$", re.IGNORECASE)
+
+
+def _docx_prefix(paragraph) -> str:
+    """Markdown prefix of a Word paragraph: # for headings, - for list items."""
+    style = paragraph.style.name if paragraph.style is not None else ""
+    if style in ("Title", "Título"):
+        return "# "
+    match = _WORD_HEADING_STYLE.match(style)
+    if match:
+        return "#" * min(int(match.group(2)), 6) + " "
+    properties = paragraph._p.pPr
+    if style.lower().startswith("list") or (properties is not None and properties.numPr is not None):
+        return "- "
+    return ""
+
+
+def load_docx(file_path: str) -> List[Document]:
+    import docx
+    from docx.oxml.ns import qn
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    document = docx.Document(file_path)
+    pages: List[List[str]] = [[]]
+    page_has_text = False
+
+    def new_page():
+        nonlocal page_has_text
+        # Word records an explicit break and the layout break right after it: count them once
+        if page_has_text:
+            pages.append([])
+            page_has_text = False
+
+    def add_paragraph(paragraph: Paragraph):
+        nonlocal page_has_text
+        parts = []
+        for element in paragraph._p.iter(qn("w:t"), qn("w:tab"), qn("w:br"), qn("w:cr"),
+                                         qn("w:lastRenderedPageBreak")):
+            if element.tag == qn("w:t"):
+                parts.append(element.text or "")
+            elif element.tag == qn("w:tab"):
+                parts.append("\t")
+            elif element.tag == qn("w:cr") or (element.tag == qn("w:br") and element.get(qn("w:type")) != "page"):
+                parts.append("\n")
+            else:
+                # Text before the break stays on the previous page
+                text = "".join(parts).strip()
+                if text:
+                    pages[-1].append(_docx_prefix(paragraph) + text)
+                    page_has_text = True
+                parts = []
+                new_page()
+        text = "".join(parts).strip()
+        if text:
+            pages[-1].append(_docx_prefix(paragraph) + text)
+            page_has_text = True
+
+    for element in document.element.body.iterchildren():
+        if element.tag == qn("w:p"):
+            add_paragraph(Paragraph(element, document))
+        elif element.tag == qn("w:tbl"):
+            for row in Table(element, document).rows:
+                cells = [cell.text.strip() for cell in row.cells]
+                # Merged cells repeat their text in every grid column
+                cells = [cell for i, cell in enumerate(cells) if cell and (i == 0 or cell != cells[i - 1])]
+                if cells:
+                    pages[-1].append(" | ".join(cells))
+                    page_has_text = True
+    return _pages(["\n\n".join(page) for page in pages])
+
+
+def _pptx_shape_lines(shape) -> List[str]:
+    """Text of a slide shape, with bullets by indentation level, tables as rows and groups recursively."""
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+    lines = []
+    if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+        for child in sorted(shape.shapes, key=lambda s: (s.top or 0, s.left or 0)):
+            lines.extend(_pptx_shape_lines(child))
+    elif getattr(shape, "has_table", False) and shape.has_table:
+        for row in shape.table.rows:
+            cells = [cell.text.strip() for cell in row.cells]
+            if any(cells):
+                lines.append(" | ".join(cell for cell in cells if cell))
+    elif shape.has_text_frame:
+        for paragraph in shape.text_frame.paragraphs:
+            text = "".join(run.text for run in paragraph.runs).strip()
+            if text:
+                lines.append("  " * paragraph.level + "- " + text if paragraph.level else text)
+    return lines
+
+
+def load_pptx(file_path: str) -> List[Document]:
+    from pptx import Presentation
+
+    slides = []
+    for slide in Presentation(file_path).slides:
+        title = slide.shapes.title
+        lines = [f"# {title.text.strip()}"] if title is not None and title.text.strip() else []
+        # Reading order: top to bottom, then left to right
+        shapes = [shape for shape in slide.shapes if title is None or shape.shape_id != title.shape_id]
+        for shape in sorted(shapes, key=lambda s: (s.top or 0, s.left or 0)):
+            lines.extend(_pptx_shape_lines(shape))
+        if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+            notes = slide.notes_slide.notes_text_frame.text.strip()
+            if notes:
+                lines.append(f"Notes: {notes}")
+        slides.append("\n".join(lines))
+    return _pages(slides)
+
+
+class _HTMLText(HTMLParser):
+    """Visible text of an HTML page, with headings, list items and table rows on their own lines."""
+    SKIPPED = {"script", "style", "noscript", "template", "svg", "head"}
+    BLOCKS = {"p", "div", "section", "article", "header", "footer", "main", "aside", "nav", "blockquote",
+              "pre", "ul", "ol", "dl", "dt", "dd", "table", "tr", "form", "figure", "figcaption", "hr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title = ""
+        self._skipping = 0
+        self._in_title = False
+        self._in_pre = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skipping += 1
+        elif tag == "title":
+            self._in_title = True
+        elif re.fullmatch(r"h[1-6]", tag):
+            self.parts.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag in ("td", "th"):
+            self.parts.append(" | ")
+        elif tag == "br":
+            self.parts.append("\n")
+        elif tag in self.BLOCKS:
+            self._in_pre = self._in_pre or tag == "pre"
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skipping = max(self._skipping - 1, 0)
+        elif tag == "title":
+            self._in_title = False
+        elif re.fullmatch(r"h[1-6]", tag) or tag in self.BLOCKS:
+            self._in_pre = self._in_pre and tag != "pre"
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skipping:
+            self.parts.append(data if self._in_pre else re.sub(r"\s+", " ", data))
+
+    def text(self) -> str:
+        lines = [line.strip(" |") if " | " in line else line.strip() for line in "".join(self.parts).split("\n")]
+        text = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+        title = " ".join(self.title.split())
+        # Pages without a top heading are titled by their <title>
+        if title and not text.startswith("# "):
+            text = f"# {title}\n\n{text}"
+        return text
+
+
+def load_html(file_path: str) -> List[Document]:
+    parser = _HTMLText()
+    parser.feed(_read_text(file_path))
+    parser.close()
+    return [Document(page_content=parser.text(), metadata={"page": 1})]
+
+
+def load_doc(file_path: str) -> List[Document]:
+    """Legacy Word files, through Unstructured (and LibreOffice); imported only when such a file is loaded."""
+    from langchain_community.document_loaders import UnstructuredWordDocumentLoader
+
+    docs = UnstructuredWordDocumentLoader(file_path).load()
+    for number, doc in enumerate(docs, start=1):
+        doc.metadata["page"] = number
+    return docs
+
+
+register_loader([".pdf"], FormatLoader("PyPDFLoader", "pypdf", load_pdf, version=2))
+register_loader([".txt"], FormatLoader("text", None, load_text))
+register_loader([".md", ".markdown"], FormatLoader("markdown", None, load_markdown))
+register_loader([".docx"], FormatLoader("docx", "python-docx", load_docx))
+register_loader([".pptx"], FormatLoader("pptx", "python-pptx", load_pptx))
+register_loader([".html", ".htm"], FormatLoader("html", None, load_html))
+register_loader([".doc"], FormatLoader("UnstructuredWordDocumentLoader", "unstructured", load_doc))
+
+
+def benchmark(file_paths: List[str], repeat: int = 1) -> Dict[str, Dict]:
+    """
+    Measure the extraction throughput of each format.
+
+    Args:
+        file_paths: Files to load; unsupported formats are ignored
+        repeat: Loads of each file, the fastest one is kept
+
+    Returns:
+        Dict[str, Dict]: Per extension: loader, files, pages, characters, MB, seconds,
+            pages per second and MB per second
+    """
+    results: Dict[str, Dict] = {}
+    for file_path in file_paths:
+        loader = get_loader(file_path)
+        if loader is None:
+            continue
+        extension = os.path.splitext(file_path.lower())[1]
+        stats = results.setdefault(extension, {"loader": loader.name, "files": 0, "failed": 0, "pages": 0,
+                                               "characters": 0, "mb": 0.0, "seconds": 0.0})
+        try:
+            timings = []
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                docs = loader.load(file_path)
+                timings.append(time.perf_counter() - started)
+        except Exception as e:
+            logger.warning(f"Could not load {file_path} with {loader.name}: {e}")
+            stats["failed"] += 1
+            continue
+        stats["files"] += 1
+        stats["pages"] += len(docs)
+        stats["characters"] += sum(len(doc.page_content) for doc in docs)
+        stats["mb"] += os.path.getsize(file_path) / 1024 ** 2
+        stats["seconds"] += min(timings)
+
+    for stats in results.values():
+        stats["pages_per_second"] = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats["mb_per_second"] = stats["mb"] / stats["seconds"] if stats["seconds"] else 0.0
+    return results
+
+
+def _collect_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(directory, name) for directory, _, names in os.walk(path) for name in sorted(names))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document loaders by file format.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench = subparsers.add_parser("benchmark", help="Measure the extraction throughput of each format")
+    bench.add_argument("paths", nargs="+", help="Files or directories")
+    bench.add_argument("--repeat", type=int, default=1, help="Loads of each file, the fastest one is kept")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    results = benchmark(_collect_files(args.paths), args.repeat)
+    print(f"{'format':<10} {'loader':<14} {'files':>5} {'failed':>6} {'pages':>6} {'MB':>8} {'seconds':>8} "
+          f"{'pages/s':>9} {'MB/s':>8}")
+    for extension, stats in sorted(results.items()):
+        print(f"{extension:<10} {stats['loader']:<14} {stats['files']:>5} {stats['failed']:>6} {stats['pages']:>6} "
+              f"{stats['mb']:>8.2f} {stats['seconds']:>8.3f} {stats['pages_per_second']:>9.1f} "
+              f"{stats['mb_per_second']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
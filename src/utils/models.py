@@ -1,23 +1,38 @@
 from pydantic import BaseModel, model_validator, Field, ConfigDict
-from typing import Literal, Optional
+from typing import Literal, Optional, Union
 
 # 1. Define a specific Pydantic model for the action's parameters
 class GetContextParameters(BaseModel):
     """Defines the expected parameters for the get_context_from_vector_store action."""
     question: str = Field(..., description="The precise question to ask the vector store.")
     vector_store_name: str = Field(..., description="The exact name of the vector store to query.")
+    cursor: Optional[int] = Field(None, description="Cursor returned by a previous observation to get more results for the same question, null for the first page.")
 
     # Pydantic V2 configuration to disallow extra fields in the JSON schema
     model_config = ConfigDict(extra='forbid')
 
 
+class ListVectorStoresParameters(BaseModel):
+    """Defines the expected parameters for the list_vector_stores action."""
+    offset: Optional[int] = Field(None, description="Offset returned by a previous list_vector_stores observation to get the next stores, null for the first page.")
+
+    model_config = ConfigDict(extra='forbid')
+
+
+# Parameters model of each known action
+ACTION_PARAMETERS = {
+    "get_context_from_vector_store": GetContextParameters,
+    "list_vector_stores": ListVectorStoresParameters,
+}
+
+
 # 2. Define the AgentOutput model with proper validation
 class AgentOutput(BaseModel):
     """Represents the structured output expected from the AI agent."""
     type: Literal["thought", "answer", "action"]
     content: Optional[str]
-    function_name: Optional[Literal["get_context_from_vector_store"]]
-    parameters: Optional[GetContextParameters]
+    function_name: Optional[Literal["get_context_from_vector_store", "list_vector_stores"]]
+    parameters: Optional[Union[GetContextParameters, ListVectorStoresParameters]]
 
     # Pydantic V2 configuration
     model_config = ConfigDict(extra='forbid')
@@ -37,12 +52,14 @@ class AgentOutput(BaseModel):
             if self.content is not None:
                 raise ValueError("'content' must be None when type is 'action'")
             
-            # function_name must be the specific value
-            if self.function_name != "get_context_from_vector_store":
-                raise ValueError("'function_name' must be 'get_context_from_vector_store' when type is 'action'")
+            # function_name must be one of the known actions
+            if self.function_name not in ACTION_PARAMETERS:
+                raise ValueError(f"'function_name' must be one of {list(ACTION_PARAMETERS)} when type is 'action'")
             
-            # parameters must be present
+            # parameters must be present and match the action
             if self.parameters is None:
                 raise ValueError("'parameters' must be present when type is 'action'")
+            if not isinstance(self.parameters, ACTION_PARAMETERS[self.function_name]):
+                raise ValueError(f"'parameters' do not match the '{self.function_name}' action")
         
         return self
\ No newline at end of file
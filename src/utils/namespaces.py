@@ -0,0 +1,162 @@
+import hashlib
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.config import NAMESPACE_ADMINS, NAMESPACE_QUOTAS, EMBEDDING_MODEL_DIMENSIONS
+
+SHARED_NAMESPACE = "shared"
+USER_NAMESPACE_PREFIX = "user_"
+
+
+class QuotaExceededError(Exception):
+    """Raised when an ingestion would exceed the quota of a namespace."""
+
+
+def _slug(value: str) -> str:
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    value = re.sub(r'[^a-zA-Z0-9_-]+', '_', value.strip().lower())
+    return re.sub(r'_+', '_', value).strip('_') or "anonymous"
+
+
+def user_namespace(user_id: str) -> str:
+    """
+    Private namespace of a user: a readable slug of the id and a hash of the
+    exact id, so ids with the same slug (e.g. 'Alice' and 'alice') never share it.
+    """
+    digest = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:12]
+    return f"{USER_NAMESPACE_PREFIX}{_slug(user_id)}-{digest}"
+
+
+def visible_namespaces(user_id: Optional[str]) -> List[str]:
+    """Namespaces whose stores a user can see: their own and the shared one."""
+    if not user_id:
+        return [SHARED_NAMESPACE]
+    return [user_namespace(user_id), SHARED_NAMESPACE]
+
+
+def qualify(namespace: str, name: str) -> str:
+    """Build a store id from its namespace and name."""
+    return f"{namespace}/{name}"
+
+
+def split_store_id(store_id: str) -> Tuple[str, str]:
+    """
+    Split a store id into namespace and name.
+    Stores created before namespaces existed have no prefix and are shared.
+    """
+    if "/" in store_id:
+        namespace, name = store_id.split("/", 1)
+        return namespace, name
+    return SHARED_NAMESPACE, store_id
+
+
+def can_read(user_id: Optional[str], store_id: str) -> bool:
+    """Check whether a user can see and query a store."""
+    return split_store_id(store_id)[0] in visible_namespaces(user_id)
+
+
+def is_admin(user_id: Optional[str]) -> bool:
+    """Whether a user administers the shared stores (SHARED_STORE_ADMINS)."""
+    return bool(user_id) and user_id in NAMESPACE_ADMINS
+
+
+def can_write(user_id: Optional[str], store_id: str, entry: Optional[Dict] = None) -> bool:
+    """
+    Check whether a user can add to, remove from, roll back or delete a store.
+
+    Every store of a user's own namespace is theirs. A shared store can only
+    be changed by the user who created it or by an admin; a new shared store
+    (no metadata entry yet) can be created by anyone.
+
+    Args:
+        user_id: The user
+        store_id: The store
+        entry: Metadata entry of the store, None if it does not exist yet
+    """
+    if not user_id:
+        return False
+    namespace = split_store_id(store_id)[0]
+    if namespace == user_namespace(user_id):
+        return True
+    if namespace != SHARED_NAMESPACE:
+        return False
+    if entry is None or is_admin(user_id):
+        return True
+    return isinstance(entry, dict) and entry.get("owner") == user_id
+
+
+def namespace_quota(namespace: str) -> Dict[str, int]:
+    """Disk and vector limits of a namespace."""
+    kind = SHARED_NAMESPACE if namespace == SHARED_NAMESPACE else "user"
+    return NAMESPACE_QUOTAS[kind]
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for directory, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, file_name))
+            except OSError:
+                pass
+    return total
+
+
+def namespace_usage(namespace: str, metadata: Dict[str, Dict], vector_store_dir: str = "temp_vector_store") -> Dict[str, int]:
+    """
+    Current usage of a namespace.
+
+    Args:
+        namespace: The namespace
+        metadata: All vector store metadata entries, by store id
+        vector_store_dir: Root directory of the stores
+
+    Returns:
+        Dict[str, int]: 'bytes' on disk and 'vectors' stored
+    """
+    usage = {"bytes": 0, "vectors": 0}
+    for store_id, entry in metadata.items():
+        if split_store_id(store_id)[0] != namespace:
+            continue
+        usage["bytes"] += _directory_size(os.path.join(vector_store_dir, store_id))
+        if isinstance(entry, dict):
+            usage["vectors"] += entry.get("vector_count", 0)
+    return usage
+
+
+def owner_usage(user_id: str, metadata: Dict[str, Dict], vector_store_dir: str = "temp_vector_store") -> Dict[str, int]:
+    """
+    Usage charged to the quota of a user: their own namespace plus the shared
+    stores they created, so writing to the shared namespace does not bypass it.
+    """
+    usage = namespace_usage(user_namespace(user_id), metadata, vector_store_dir)
+    owned = {store_id: entry for store_id, entry in metadata.items()
+             if isinstance(entry, dict) and entry.get("owner") == user_id
+             and split_store_id(store_id)[0] == SHARED_NAMESPACE}
+    shared = namespace_usage(SHARED_NAMESPACE, owned, vector_store_dir)
+    return {key: usage[key] + shared[key] for key in usage}
+
+
+def estimate_ingest_bytes(num_vectors: int, text_bytes: int, embedding_model: str) -> int:
+    """Estimate the disk size added by new chunks: float32 vectors plus the stored text."""
+    dimension = EMBEDDING_MODEL_DIMENSIONS.get(embedding_model, 1536)
+    return num_vectors * dimension * 4 + text_bytes
+
+
+def check_quota(namespace: str, usage: Dict[str, int], new_vectors: int, new_bytes: int) -> None:
+    """
+    Raise QuotaExceededError if adding vectors and bytes to a namespace exceeds its quota.
+    """
+    quota = namespace_quota(namespace)
+    if usage["vectors"] + new_vectors > quota["max_vectors"]:
+        raise QuotaExceededError(
+            f"Namespace '{namespace}' would hold {usage['vectors'] + new_vectors} vectors, "
+            f"over its quota of {quota['max_vectors']}"
+        )
+    if usage["bytes"] + new_bytes > quota["max_bytes"]:
+        raise QuotaExceededError(
+            f"Namespace '{namespace}' would use {(usage['bytes'] + new_bytes) / 1024 ** 2:.1f} MB, "
+            f"over its quota of {quota['max_bytes'] / 1024 ** 2:.1f} MB"
+        )
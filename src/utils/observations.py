@@ -0,0 +1,173 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+from src.utils.retrieval import format_context_entry
+from src.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Chunks of the same page closer than this (in characters) are shown as one passage
+MERGE_GAP = 2
+
+
+def _subtract(start: int, end: int, shown: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Parts of [start, end) not covered by the shown intervals."""
+    parts = [(start, end)]
+    for shown_start, shown_end in shown:
+        remaining = []
+        for part_start, part_end in parts:
+            if shown_end <= part_start or shown_start >= part_end:
+                remaining.append((part_start, part_end))
+                continue
+            if part_start < shown_start:
+                remaining.append((part_start, shown_start))
+            if shown_end < part_end:
+                remaining.append((shown_end, part_end))
+        parts = remaining
+    return parts
+
+
+class _Passage:
+    """Contiguous text of one page, made of one or more chunks."""
+    __slots__ = ("key", "page", "start", "end", "text", "rank")
+
+    def __init__(self, key: str, page, start: Optional[int], text: str, rank: int):
+        self.key = key
+        self.page = page
+        # Offset in the page text, None when unknown
+        self.start = start
+        self.end = start + len(text) if start is not None else None
+        self.text = text
+        self.rank = rank
+
+    def touches(self, other: "_Passage") -> bool:
+        """Whether a passage starting at or after this one overlaps or follows it closely on the same page."""
+        return (self.key == other.key and self.page == other.page and None not in (self.start, other.start)
+                and other.start <= self.end + MERGE_GAP)
+
+    def absorb(self, other: "_Passage") -> None:
+        # Parts that touch exactly are one text: a chunk can end in the middle of a word
+        if other.start > self.end:
+            self.text = self.text.rstrip() + " " + other.text.lstrip()
+        else:
+            self.text += other.text[self.end - other.start:]
+        self.end = max(self.end, other.end)
+        self.rank = min(self.rank, other.rank)
+
+
+class ObservationBuilder:
+    """
+    Formats retrieved chunks into the observations of one agent run.
+
+    - Overlapping or adjacent chunks of the same page are merged into a single passage.
+    - Text already shown earlier in the run is not repeated; a chunk that
+      was fully shown is only referred to by its citation.
+    - Sources get compact citation ids (`S1 p2` for page 2 of the first
+      source), defined once per run (`S1 = file.pdf`).
+
+    Every observation reports how many tokens it saved compared to
+    formatting each chunk in full.
+    """
+    def __init__(self):
+        self._citations: Dict[str, str] = {}
+        # Character intervals already shown, by source and page
+        self._shown: Dict[Tuple[str, object], List[Tuple[int, int]]] = {}
+        # Chunks without offsets (older stores) are only recognized when identical
+        self._shown_texts = set()
+        self.stats: List[Dict] = []
+
+    @staticmethod
+    def _source_key(doc: Document) -> str:
+        return doc.metadata.get("content_hash") or doc.metadata.get("source", "")
+
+    def _cite(self, doc: Document, new_sources: List[str]) -> str:
+        key = self._source_key(doc)
+        if key not in self._citations:
+            self._citations[key] = f"S{len(self._citations) + 1}"
+            new_sources.append(f"{self._citations[key]} = {doc.metadata.get('source', 'Unknown')}")
+        return self._citations[key]
+
+    def build(self, docs: List[Document], start: int = 0, footer: Optional[str] = None) -> str:
+        """
+        Build the observation of a page of results.
+
+        Args:
+            docs: Chunks of the page, in ranking order
+            start: Position of the page in the ranking, for the full-format token baseline
+            footer: Line appended after the passages (e.g. the cursor of the next page)
+
+        Returns:
+            str: The observation text
+        """
+        passages: List[_Passage] = []
+        repeated: List[str] = []
+        new_sources: List[str] = []
+        citations = {}
+        # Text shown by this observation; only text of earlier observations is marked as already shown
+        shown_now: Dict[Tuple[str, object], List[Tuple[int, int]]] = {}
+        texts_now = set()
+        for rank, doc in enumerate(docs):
+            key, page = self._source_key(doc), doc.metadata.get("page")
+            citations[key] = self._cite(doc, new_sources)
+            label = f"{citations[key]} p{page}" if page is not None else citations[key]
+            doc_start = doc.metadata.get("start_index")
+            if doc_start is None:
+                if doc.page_content in self._shown_texts:
+                    repeated.append(label)
+                elif doc.page_content not in texts_now:
+                    texts_now.add(doc.page_content)
+                    passages.append(_Passage(key, page, None, doc.page_content.strip(), rank))
+                continue
+
+            doc_end = doc_start + len(doc.page_content)
+            shown_before = self._shown.get((key, page), [])
+            shown = shown_now.setdefault((key, page), [])
+            parts = _subtract(doc_start, doc_end, shown_before + shown)
+            if not parts:
+                if not _subtract(doc_start, doc_end, shown_before):
+                    repeated.append(label)
+                continue
+            for part_start, part_end in parts:
+                text = doc.page_content[part_start - doc_start:part_end - doc_start]
+                if text.strip():
+                    passages.append(_Passage(key, page, part_start, text, rank))
+            shown.append((doc_start, doc_end))
+        for page_key, intervals in shown_now.items():
+            self._shown.setdefault(page_key, []).extend(intervals)
+        self._shown_texts |= texts_now
+
+        # Merge passages of the same page that touch or overlap, then restore ranking order
+        passages.sort(key=lambda p: (p.key, str(p.page), p.start if p.start is not None else -1))
+        merged: List[_Passage] = []
+        for passage in passages:
+            if merged and merged[-1].touches(passage):
+                merged[-1].absorb(passage)
+            else:
+                merged.append(passage)
+        merged.sort(key=lambda p: p.rank)
+
+        lines = [f"Sources: {'; '.join(new_sources)}"] if new_sources else []
+        lines.extend(f"[{citations[p.key]}{f' p{p.page}' if p.page is not None else ''}] {' '.join(p.text.split())}"
+                     for p in merged)
+        if repeated:
+            lines.append(f"[Already shown above: {', '.join(dict.fromkeys(repeated))}]")
+        if footer:
+            lines.append(footer)
+        observation = "\n".join(lines)
+
+        full = "\n".join([format_context_entry(i, doc) for i, doc in enumerate(docs, start + 1)]
+                         + ([footer] if footer else []))
+        stats = {
+            "chunks": len(docs),
+            "passages": len(merged),
+            "repeated": len(repeated),
+            "full_tokens": count_tokens(full),
+            "tokens": count_tokens(observation),
+        }
+        stats["saved_tokens"] = stats["full_tokens"] - stats["tokens"]
+        self.stats.append(stats)
+        logger.info(f"Observation of {stats['chunks']} chunks as {stats['passages']} passages "
+                    f"({stats['repeated']} already shown): {stats['tokens']} tokens, {stats['saved_tokens']} saved")
+        return observation
@@ -0,0 +1,165 @@
+"""
+OCR of scanned PDF pages.
+
+`PyPDFLoader` only reads the text layer of a PDF, which is empty on
+scans. With OCR enabled, pages whose text layer is shorter than
+`OCR_MIN_CHARS_PER_PAGE` are rendered (pypdfium2) and read with Tesseract
+(pytesseract), one page per process of a pool. Results are cached by the
+hash of the rendered page, so a page is only recognized once whatever file
+it comes in. Tesseract keeps the blocks of the page layout as paragraphs
+separated by blank lines, which the chunker splits on.
+
+Per-page timings are logged and returned, to size the pool for a machine:
+
+    python -m src.utils.ocr scan.pdf --workers 4
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.config import OCR_CONFIG
+from src.utils.document_cache import loader_id
+from src.utils.file_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def ocr_available() -> bool:
+    """Whether OCR can run in this installation: the Python packages and the Tesseract binary."""
+    return (importlib.util.find_spec("pytesseract") is not None
+            and importlib.util.find_spec("pypdfium2") is not None
+            and shutil.which(OCR_CONFIG["tesseract_cmd"] or "tesseract") is not None)
+
+
+def ocr_enabled() -> bool:
+    """Whether scanned pages should be read with OCR; warns if it is enabled but cannot run."""
+    if not OCR_CONFIG["enabled"]:
+        return False
+    if not ocr_available():
+        logger.warning("OCR is enabled but pytesseract, pypdfium2 or the tesseract binary is missing")
+        return False
+    return True
+
+
+def needs_ocr(text: str) -> bool:
+    """Whether the text layer of a page is too short to be the content of the page."""
+    return len("".join(text.split())) < OCR_CONFIG["min_chars_per_page"]
+
+
+def ocr_id() -> str:
+    """Part of the parsed-document cache key of PDFs read with OCR: the text depends on the language and resolution."""
+    return f"{loader_id('tesseract', 'pytesseract')}/{OCR_CONFIG['language']}@{OCR_CONFIG['dpi']}dpi"
+
+
+def _cache_path(page_hash: str) -> str:
+    return os.path.join(OCR_CONFIG["cache_dir"], page_hash[:2], f"{page_hash}.json")
+
+
+def _ocr_page(file_path: str, page_index: int, dpi: int, language: str) -> Tuple[str, float, bool]:
+    """
+    Render one page and recognize its text, in a worker process.
+
+    Returns:
+        Tuple[str, float, bool]: Text of the page, seconds spent and whether it came from the cache
+    """
+    import pypdfium2
+    import pytesseract
+
+    if OCR_CONFIG["tesseract_cmd"]:
+        pytesseract.pytesseract.tesseract_cmd = OCR_CONFIG["tesseract_cmd"]
+    started = time.perf_counter()
+    pdf = pypdfium2.PdfDocument(file_path)
+    try:
+        image = pdf[page_index].render(scale=dpi / 72).to_pil().convert("L")
+    finally:
+        pdf.close()
+
+    # Same pixels and settings, same text
+    digest = hashlib.sha256(np.asarray(image).tobytes())
+    digest.update(f"{image.size}|{language}|{pytesseract.get_tesseract_version()}".encode("utf-8"))
+    page_hash = digest.hexdigest()
+    cache_path = _cache_path(page_hash)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)["text"], time.perf_counter() - started, True
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    text = pytesseract.image_to_string(image, lang=language)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    write_json_atomic(cache_path, {"text": text, "language": language, "dpi": dpi})
+    return text, time.perf_counter() - started, False
+
+
+def ocr_pages(file_path: str, page_indexes: List[int], workers: Optional[int] = None) -> Tuple[Dict[int, str], Dict]:
+    """
+    Recognize the text of some pages of a PDF in parallel.
+
+    Args:
+        file_path: Path of the PDF
+        page_indexes: 0-based pages to recognize
+        workers: Processes of the pool; OCR_WORKERS (or one per CPU core) if not given
+
+    Returns:
+        Tuple[Dict[int, str], Dict]: Text per page index, and timings: pages, cached pages,
+            wall seconds, per-page seconds (mean, p95, max) and workers
+    """
+    if not page_indexes:
+        return {}, {"pages": 0}
+    workers = min(workers or OCR_CONFIG["workers"] or os.cpu_count() or 1, len(page_indexes))
+    started = time.perf_counter()
+    texts, seconds, cached = {}, [], 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {index: pool.submit(_ocr_page, file_path, index, OCR_CONFIG["dpi"], OCR_CONFIG["language"])
+                   for index in page_indexes}
+        for index, future in futures.items():
+            text, page_seconds, from_cache = future.result()
+            texts[index] = text
+            seconds.append(page_seconds)
+            cached += from_cache
+            logger.info(f"OCR {os.path.basename(file_path)} page {index + 1}: {page_seconds:.2f}s"
+                        f"{' (cached)' if from_cache else ''}")
+
+    timings = {
+        "pages": len(page_indexes),
+        "cached": cached,
+        "workers": workers,
+        "wall_seconds": time.perf_counter() - started,
+        "page_seconds_mean": float(np.mean(seconds)),
+        "page_seconds_p95": float(np.percentile(seconds, 95)),
+        "page_seconds_max": float(np.max(seconds)),
+    }
+    logger.info(f"OCR of {len(page_indexes)} pages of {os.path.basename(file_path)} with {workers} workers: "
+                f"{timings['wall_seconds']:.1f}s ({timings['page_seconds_mean']:.2f}s per page, "
+                f"p95 {timings['page_seconds_p95']:.2f}s, {cached} cached)")
+    return texts, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR every page of a PDF and report per-page timings.")
+    parser.add_argument("pdf")
+    parser.add_argument("--workers", type=int, help="Processes of the pool (default: OCR_WORKERS or CPU cores)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not ocr_available():
+        parser.error("OCR needs `pip install pytesseract pypdfium2` and the tesseract binary")
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(args.pdf)
+    pages = len(pdf)
+    pdf.close()
+    _, timings = ocr_pages(args.pdf, list(range(pages)), args.workers)
+    print(json.dumps(timings, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import logging
+from typing import Callable, Dict, List, Optional, Type
+
+from openai.types.chat import ParsedChatCompletion
+from pydantic import BaseModel
+
+from src.utils.config import CACHE_CONFIG
+from src.utils.file_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# off:    no caching, every call goes to the API
+# record: every call goes to the API and its response is stored
+# replay: responses only come from the cache, a miss is an error (no network)
+# auto:   cached responses are reused, misses go to the API and are stored
+CACHE_MODES = ("off", "record", "replay", "auto")
+
+
+class ResponseCacheMiss(Exception):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class ResponseCache:
+    """
+    On-disk cache of structured chat completions.
+
+    A request is identified by a canonical hash of the model, the messages
+    and the JSON schema of the response format, so identical agent turns
+    are answered from disk, and recorded traces can be replayed offline.
+    """
+    def __init__(self, mode: Optional[str] = None, cache_dir: Optional[str] = None):
+        self.mode = mode or CACHE_CONFIG["llm_cache_mode"]
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode '{self.mode}', expected one of {CACHE_MODES}")
+        self.cache_dir = cache_dir or CACHE_CONFIG["llm_responses_dir"]
+        self.hits = 0
+        self.misses = 0
+        if self.mode != "off":
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def request_key(model: str, messages: List[Dict], response_format: Type[BaseModel]) -> str:
+        """Canonical hash of a chat completion request."""
+        canonical = json.dumps(
+            {"model": model, "messages": messages, "schema": response_format.model_json_schema()},
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str, response_format: Type[BaseModel]) -> Optional[ParsedChatCompletion]:
+        """Read a recorded response, or None if the request was never recorded."""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return ParsedChatCompletion[response_format].model_validate(entry["response"])
+
+    def put(self, key: str, model: str, messages: List[Dict], response: ParsedChatCompletion) -> None:
+        """Record a response together with its request."""
+        os.makedirs(os.path.dirname(self._path(key)), exist_ok=True)
+        write_json_atomic(self._path(key), {
+            "request": {"model": model, "messages": messages},
+            "response": response.model_dump(mode="json"),
+        })
+
+    def complete(self,
+                 call: Callable[[], ParsedChatCompletion],
+                 model: str,
+                 messages: List[Dict],
+                 response_format: Type[BaseModel]) -> ParsedChatCompletion:
+        """
+        Answer a request according to the cache mode.
+
+        Args:
+            call: Performs the real API request
+            model: Model of the request
+            messages: Messages of the request
+            response_format: Pydantic model of the structured output
+
+        Returns:
+            ParsedChatCompletion: Recorded or fresh response
+        """
+        if self.mode == "off":
+            return call()
+
+        key = self.request_key(model, messages, response_format)
+        if self.mode in ("replay", "auto"):
+            cached = self.get(key, response_format)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+            if self.mode == "replay":
+                raise ResponseCacheMiss(f"No recorded response for request {key} (model {model})")
+
+        response = call()
+        self.put(key, model, messages, response)
+        return response
@@ -0,0 +1,190 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from src.utils.config import RETRIEVAL_CONFIG
+from src.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def relevance_score(vectorstore: FAISS, score: float) -> float:
+    """
+    Convert a raw FAISS score into a cosine-like relevance in [-1, 1].
+
+    Inner-product indexes hold unit-norm vectors, so their score already
+    is the cosine. IndexFlatL2 returns squared L2 distances; for unit-norm
+    embeddings (OpenAI's are) that is 2 - 2*cos, so cos = 1 - d/2.
+    """
+    if vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return float(score)
+    return 1.0 - float(score) / 2.0
+
+
+def format_context_entry(position: int, doc: Document) -> str:
+    """Format a retrieved chunk the way observations show it to the agent."""
+    source = doc.metadata.get('source', f'Document {position}')
+    page = doc.metadata.get('page', 'N/A')
+    return f"[{position}] {doc.page_content}\nSource: {source} (Page {page})\n"
+
+
+class QueryEmbeddingCache:
+    """
+    Query embeddings of one agent run, by embedding model and text, shared
+    by every store searched in the run. Vectors are normalized once here,
+    so searches of inner-product indexes give cosine similarities directly.
+    """
+    def __init__(self):
+        self._vectors: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.reused = 0
+
+    @staticmethod
+    def _model_key(embeddings: Embeddings) -> str:
+        model = getattr(embeddings, "model", None)
+        # Embeddings without a model name are only shared by the same instance
+        return f"{type(embeddings).__name__}:{model}" if model else f"{type(embeddings).__name__}@{id(embeddings)}"
+
+    def embed(self, embeddings: Embeddings, text: str) -> List[float]:
+        """Embedding of a query, computed at most once per model and text."""
+        key = (self._model_key(embeddings), " ".join(text.split()))
+        with self._lock:
+            if key in self._vectors:
+                self.reused += 1
+                return self._vectors[key]
+        vector = np.asarray(embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vector = (vector / norm if norm else vector).tolist()
+        with self._lock:
+            self._vectors[key] = vector
+            self.computed += 1
+        return vector
+
+
+class AdaptiveRetriever:
+    """
+    Selects context for the agent with a relevance threshold, MMR diversity
+    and a token budget per observation.
+
+    The full ranking for a (vector store, query) pair is computed once and
+    kept, so asking for the next page with a cursor neither reloads the
+    store nor re-embeds the query.
+    """
+    def __init__(self, config: Optional[Dict] = None, query_embeddings: Optional[QueryEmbeddingCache] = None):
+        self.config = {**RETRIEVAL_CONFIG, **(config or {})}
+        # Shares query embeddings between stores with the same model, when given
+        self.query_embeddings = query_embeddings
+        self._rankings: Dict[Tuple[str, str], List[Tuple[Document, float]]] = {}
+
+    def _key(self, vector_store_name: str, query: str) -> Tuple[str, str]:
+        return vector_store_name, " ".join(query.split()).lower()
+
+    def has_ranking(self, vector_store_name: str, query: str) -> bool:
+        """Check whether a ranking for this query is already cached."""
+        return self._key(vector_store_name, query) in self._rankings
+
+    def share_ranking(self, vector_store_name: str, query: str, alias: str) -> bool:
+        """
+        Serve another query with the cached ranking of a query, e.g. a
+        paraphrase of it, so that paging with either uses the same ranking.
+
+        Returns:
+            bool: False if the query has no cached ranking
+        """
+        ranking = self._rankings.get(self._key(vector_store_name, query))
+        if ranking is None:
+            return False
+        self._rankings.setdefault(self._key(vector_store_name, alias), ranking)
+        return True
+
+    def rank(self, vectorstore: FAISS, vector_store_name: str, query: str) -> List[Tuple[Document, float]]:
+        """
+        Rank the candidate chunks of a vector store for a query.
+
+        Args:
+            vectorstore: Loaded FAISS vector store
+            vector_store_name: Name used to key the cached ranking
+            query: The search query
+
+        Returns:
+            List[Tuple[Document, float]]: Chunks above the relevance threshold,
+            in selection order, with their relevance score
+        """
+        key = self._key(vector_store_name, query)
+        if key in self._rankings:
+            return self._rankings[key]
+
+        fetch_k = min(self.config["fetch_k"], vectorstore.index.ntotal)
+        if fetch_k == 0:
+            self._rankings[key] = []
+            return []
+
+        if self.query_embeddings is not None:
+            embedding = self.query_embeddings.embed(vectorstore.embeddings, query)
+        else:
+            embedding = vectorstore.embeddings.embed_query(query)
+        if self.config["search_type"] == "mmr":
+            # Asking MMR for every fetched candidate yields a full diversity-aware ordering
+            docs_and_scores = vectorstore.max_marginal_relevance_search_with_score_by_vector(
+                embedding,
+                k=fetch_k,
+                fetch_k=fetch_k,
+                lambda_mult=self.config["lambda_mult"],
+            )
+        else:
+            docs_and_scores = vectorstore.similarity_search_with_score_by_vector(embedding, k=fetch_k)
+
+        ranking = []
+        for doc, score in docs_and_scores:
+            relevance = relevance_score(vectorstore, score)
+            if relevance >= self.config["score_threshold"]:
+                ranking.append((doc, relevance))
+
+        logger.info(f"Ranked {len(ranking)}/{len(docs_and_scores)} chunks above threshold for '{query}' in {vector_store_name}")
+        self._rankings[key] = ranking
+        return ranking
+
+    def page(self, vector_store_name: str, query: str, cursor: int = 0) -> Tuple[List[Document], Optional[int], int]:
+        """
+        Take the next page of a cached ranking that fits the token budget.
+
+        At least one chunk is always returned (if any is left) even when it
+        alone exceeds the budget.
+
+        Args:
+            vector_store_name: Name of the vector store
+            query: The search query
+            cursor: Position in the ranking where the page starts
+
+        Returns:
+            Tuple[List[Document], Optional[int], int]: Chunks of the page, cursor
+            of the next page (None when exhausted) and total ranked chunks
+        """
+        ranking = self._rankings.get(self._key(vector_store_name, query), [])
+        budget = self.config["max_observation_tokens"]
+        max_results = self.config["max_results_per_page"]
+
+        docs, used_tokens = [], 0
+        position = max(cursor, 0)
+        while position < len(ranking) and len(docs) < max_results:
+            doc = ranking[position][0]
+            tokens = count_tokens(format_context_entry(position + 1, doc))
+            if docs and used_tokens + tokens > budget:
+                break
+            docs.append(doc)
+            used_tokens += tokens
+            position += 1
+
+        next_cursor = position if position < len(ranking) else None
+        return docs, next_cursor, len(ranking)
+
+    def reset(self):
+        """Forget all cached rankings."""
+        self._rankings.clear()
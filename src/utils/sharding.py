@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy, maximal_marginal_relevance
+from langchain_core.embeddings import Embeddings
+
+from src.utils.config import SHARDING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SHARD_FILES = ("index.faiss", "index.pkl")
+
+# FAISS releases the GIL while searching, so shards are searched truly in parallel
+_search_pool = ThreadPoolExecutor(max_workers=SHARDING_CONFIG["search_threads"], thread_name_prefix="shard-search")
+
+
+def shard_dir(path: str, shard: int) -> str:
+    return os.path.join(path, f"shard_{shard:02d}")
+
+
+def shard_of(metadata: Dict, shards: int) -> int:
+    """Shard of a chunk, by the hash of its document: all the chunks of a document share a shard."""
+    key = metadata.get("content_hash") or metadata.get("source", "")
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) % shards
+
+
+class _ShardedIndex:
+    """The parts of a FAISS index the rest of the code reads (size, dimension, vectors), over all shards."""
+    def __init__(self, shards: List[Optional[FAISS]]):
+        self._shards = [shard for shard in shards if shard is not None]
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.index.ntotal for shard in self._shards)
+
+    @property
+    def d(self) -> int:
+        return self._shards[0].index.d if self._shards else 0
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        """Vectors [start, start + count) of the shards in shard order, reading only the shards in the range."""
+        vectors, offset, end = [], 0, start + count
+        for shard in self._shards:
+            total = shard.index.ntotal
+            first, last = max(start, offset), min(end, offset + total)
+            if first < last:
+                vectors.append(shard.index.reconstruct_n(first - offset, last - first))
+            offset += total
+            if offset >= end:
+                break
+        if not vectors:
+            return np.zeros((0, self.d), dtype=np.float32)
+        return np.concatenate(vectors)
+
+
+class ShardedVectorStore:
+    """
+    A vector store split into independent FAISS shards by document hash.
+
+    Every shard is saved in its own directory of the store version and
+    searched in parallel; results are merged into a single top-k. Only the
+    shards that changed are written when a new version is saved, the others
+    are hard-linked from the version they were loaded from.
+
+    Shards without documents are None.
+    """
+    def __init__(self,
+                 shards: List[Optional[FAISS]],
+                 embeddings: Embeddings,
+                 distance_strategy: DistanceStrategy = DistanceStrategy.MAX_INNER_PRODUCT,
+                 source_path: Optional[str] = None):
+        self.shards = shards
+        self.embeddings = embeddings
+        self.distance_strategy = distance_strategy
+        # Version directory the shards were loaded from, to link unchanged shards on save
+        self.source_path = source_path
+        self.dirty = set() if source_path else set(range(len(shards)))
+
+    @property
+    def index(self) -> _ShardedIndex:
+        return _ShardedIndex(self.shards)
+
+    @property
+    def docstore(self) -> InMemoryDocstore:
+        """Documents of every shard (read-only view)."""
+        documents = {}
+        for shard in self.shards:
+            if shard is not None:
+                documents.update(shard.docstore._dict)
+        return InMemoryDocstore(documents)
+
+    @classmethod
+    def load(cls, path: str, embeddings: Embeddings, shards: int,
+             distance_strategy: DistanceStrategy = DistanceStrategy.MAX_INNER_PRODUCT) -> "ShardedVectorStore":
+        """Load the shards of a version directory in parallel."""
+        def load_shard(shard: int) -> Optional[FAISS]:
+            directory = shard_dir(path, shard)
+            if not os.path.isdir(directory):
+                return None
+            return FAISS.load_local(directory, embeddings, allow_dangerous_deserialization=True,
+                                    distance_strategy=distance_strategy)
+
+        return cls(list(_search_pool.map(load_shard, range(shards))), embeddings, distance_strategy, source_path=path)
+
+    def save_local(self, path: str) -> None:
+        """Write the changed shards to a new version directory and hard-link the others."""
+        os.makedirs(path, exist_ok=True)
+        linked = 0
+        for shard, store in enumerate(self.shards):
+            if store is None:
+                continue
+            target = shard_dir(path, shard)
+            if shard not in self.dirty and self._link_shard(shard, target):
+                linked += 1
+                continue
+            store.save_local(target)
+        logger.info(f"Saved {len(self.shards)} shards to {path} ({linked} unchanged shards linked)")
+        self.source_path = path
+        self.dirty.clear()
+
+    def _link_shard(self, shard: int, target: str) -> bool:
+        source = shard_dir(self.source_path, shard) if self.source_path else None
+        if not source or not os.path.isdir(source):
+            return False
+        try:
+            os.makedirs(target, exist_ok=True)
+            for file_name in SHARD_FILES:
+                os.link(os.path.join(source, file_name), os.path.join(target, file_name))
+            return True
+        except OSError as e:
+            # E.g. file systems without hard links: the shard is written from memory instead
+            logger.warning(f"Could not link shard {shard}: {e}")
+            shutil.rmtree(target, ignore_errors=True)
+            return False
+
+    def _candidates(self, shard: FAISS, query: np.ndarray, k: int,
+                    with_vectors: bool) -> List[Tuple[Document, float, Optional[np.ndarray]]]:
+        scores, indices = shard.index.search(query, min(k, shard.index.ntotal))
+        return [(shard.docstore.search(shard.index_to_docstore_id[i]), float(score),
+                 shard.index.reconstruct(int(i)) if with_vectors else None)
+                for score, i in zip(scores[0], indices[0]) if i != -1]
+
+    def _search(self, embedding: List[float], k: int,
+                with_vectors: bool = False) -> List[Tuple[Document, float, Optional[np.ndarray]]]:
+        """Top-k candidates over all shards, best first; with their vectors only if asked (for MMR)."""
+        query = np.array([embedding], dtype=np.float32)
+        shards = [shard for shard in self.shards if shard is not None and shard.index.ntotal]
+        results = _search_pool.map(lambda shard: self._candidates(shard, query, k, with_vectors), shards)
+        candidates = [candidate for shard_results in results for candidate in shard_results]
+        # Inner products are similarities, L2 scores are distances
+        descending = self.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+        candidates.sort(key=lambda candidate: candidate[1], reverse=descending)
+        return candidates[:k]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs) -> List[Tuple[Document, float]]:
+        return [(doc, score) for doc, score, _ in self._search(embedding, k)]
+
+    def max_marginal_relevance_search_with_score_by_vector(self, embedding: List[float], *, k: int = 4,
+                                                           fetch_k: int = 20, lambda_mult: float = 0.5,
+                                                           **kwargs) -> List[Tuple[Document, float]]:
+        candidates = self._search(embedding, fetch_k, with_vectors=True)
+        if not candidates:
+            return []
+        selected = maximal_marginal_relevance(np.array([embedding], dtype=np.float32),
+                                              [vector for _, _, vector in candidates],
+                                              k=k, lambda_mult=lambda_mult)
+        return [(candidates[i][0], candidates[i][1]) for i in selected]
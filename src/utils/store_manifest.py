@@ -0,0 +1,264 @@
+"""
+Embedding manifest of vector store versions.
+
+Every published version holds a `manifest.json` pinning the embedding
+model, backend, vector dimension, normalization and metric its index was
+built with, and its number of shards. Stores are always loaded with the manifest model, and documents or
+queries embedded with anything else are rejected instead of silently
+mixing vector spaces.
+
+Switching a store to another model re-embeds its chunks into a new version:
+
+    python -m src.utils.store_manifest migrate <store> <embedding_model>
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.embeddings import Embeddings
+
+from src.utils.chunking import embedding_text
+from src.utils.config import EMBEDDING_MODEL_DIMENSIONS, INGESTION_CONFIG
+from src.utils.embeddings import embedding_backend
+from src.utils.sharding import ShardedVectorStore
+from src.utils.store_versions import MANIFEST_FILE, VersionedStoreManager, store_cache
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+logger = logging.getLogger(__name__)
+
+INNER_PRODUCT = "inner_product"
+L2 = "l2"
+
+
+class EmbeddingMismatchError(ValueError):
+    """Raised when vectors of another embedding configuration would meet a store."""
+
+
+def build_manifest(vectorstore: FAISS, embedding_model: str, backend: Optional[str] = None) -> Dict:
+    """
+    Describe the embeddings of an index. Normalization is measured on the
+    stored vectors rather than assumed from the model.
+
+    Returns:
+        Dict: embedding_model, embedding_backend, dimension, normalized, metric and shards
+    """
+    total = vectorstore.index.ntotal
+    normalized = True
+    if total:
+        sample = vectorstore.index.reconstruct_n(0, min(total, 1000))
+        normalized = bool(np.allclose(np.linalg.norm(sample, axis=1), 1.0, atol=1e-3))
+    return {
+        "embedding_model": embedding_model,
+        "embedding_backend": backend or embedding_backend(embedding_model),
+        "dimension": int(vectorstore.index.d),
+        "normalized": normalized,
+        "metric": INNER_PRODUCT if vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT else L2,
+        "shards": len(vectorstore.shards) if isinstance(vectorstore, ShardedVectorStore) else 1,
+    }
+
+
+def normalize_rows(vectors: List[List[float]]) -> np.ndarray:
+    """Scale vectors to unit length, so their inner products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def build_index(texts: List[str], vectors: List[List[float]], embeddings: Embeddings,
+                metadatas: List[Dict], ids: Optional[List[str]] = None) -> FAISS:
+    """
+    Build an inner-product index of pre-normalized vectors: searching it
+    ranks by cosine similarity without normalizing anything per query.
+    """
+    return FAISS.from_embeddings(list(zip(texts, normalize_rows(vectors).tolist())), embeddings,
+                                 metadatas=metadatas, ids=ids,
+                                 distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT)
+
+
+def add_to_index(vectorstore: FAISS, texts: List[str], vectors: List[List[float]], metadatas: List[Dict]) -> None:
+    """Add vectors to an index, normalized like the ones already in it."""
+    check_vectors(vectors, vectorstore)
+    if vectorstore.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        vectors = normalize_rows(vectors).tolist()
+    vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+
+
+def load_index(path: str, embeddings: Embeddings, manifest: Dict, name: str):
+    """
+    Load a version directory with the metric and sharding of its manifest, checking its dimension.
+
+    Returns:
+        FAISS or ShardedVectorStore: The loaded store
+    """
+    strategy = (DistanceStrategy.MAX_INNER_PRODUCT if manifest.get("metric") == INNER_PRODUCT
+                else DistanceStrategy.EUCLIDEAN_DISTANCE)
+    if manifest.get("shards", 1) > 1:
+        vectorstore = ShardedVectorStore.load(path, embeddings, manifest["shards"], strategy)
+    else:
+        vectorstore = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True,
+                                       distance_strategy=strategy)
+    check_index(manifest, vectorstore, name)
+    return vectorstore
+
+
+def read_manifest(version_path: str) -> Optional[Dict]:
+    """Manifest of a version directory, or None for versions saved before manifests existed."""
+    try:
+        with open(os.path.join(version_path, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def legacy_manifest(embedding_model: str) -> Dict:
+    """Manifest assumed for a version without one, from the model recorded in the store metadata."""
+    return {
+        "embedding_model": embedding_model,
+        "embedding_backend": embedding_backend(embedding_model),
+        "dimension": EMBEDDING_MODEL_DIMENSIONS.get(embedding_model),
+        "normalized": None,
+        "metric": L2,
+    }
+
+
+def load_manifest(name: str, version_path: str, vector_store_dir: str = "temp_vector_store") -> Optional[Dict]:
+    """
+    Manifest of a version of a store; for versions without one, the manifest
+    assumed from the store metadata.
+
+    Returns:
+        Optional[Dict]: The manifest, or None if nothing is known about the store
+    """
+    manifest = read_manifest(version_path)
+    if manifest is None:
+        entry = VectorStoreMetadata(vector_store_dir).load_all().get(name)
+        if isinstance(entry, dict) and entry.get("embedding_model"):
+            manifest = legacy_manifest(entry["embedding_model"])
+    return manifest
+
+
+def current_manifest(name: str, vector_store_dir: str = "temp_vector_store") -> Optional[Dict]:
+    """Manifest of the published version of a store, or None if it does not exist."""
+    versions = VersionedStoreManager(vector_store_dir)
+    version = versions.current_version(name)
+    if version is None:
+        return None
+    return load_manifest(name, versions.version_path(name, version), vector_store_dir)
+
+
+def check_model(manifest: Dict, embedding_model: str, name: str) -> None:
+    """Reject embedding a store with a model other than its own."""
+    if manifest["embedding_model"] != embedding_model:
+        raise EmbeddingMismatchError(
+            f"Vector store '{name}' is embedded with {manifest['embedding_model']}, not {embedding_model}. "
+            f"Use that model or migrate the store: python -m src.utils.store_manifest migrate {name} {embedding_model}")
+
+
+def check_index(manifest: Dict, vectorstore: FAISS, name: str) -> None:
+    """Reject a loaded index whose dimension differs from its manifest."""
+    if manifest.get("dimension") and vectorstore.index.d != manifest["dimension"]:
+        raise EmbeddingMismatchError(
+            f"Vector store '{name}' has {vectorstore.index.d}-dimensional vectors but its manifest "
+            f"pins {manifest['embedding_model']} with {manifest['dimension']} dimensions")
+
+
+def check_vectors(vectors: List[List[float]], vectorstore: FAISS) -> None:
+    """Reject new vectors whose dimension differs from the index."""
+    if vectors and len(vectors[0]) != vectorstore.index.d:
+        raise EmbeddingMismatchError(
+            f"Cannot add {len(vectors[0])}-dimensional vectors to a {vectorstore.index.d}-dimensional index")
+
+
+def migrate_store(name: str, embedding_model: str, workers: int = 4) -> Optional[str]:
+    """
+    Re-embed every chunk of a store with another model and publish it as a
+    new version. Chunks are taken from the store itself, so no file is
+    parsed or split again, and embedding batches run concurrently.
+
+    Migrating an L2 store to its own model rebuilds it as a normalized
+    inner-product index from the stored vectors, without embedding anything.
+
+    Args:
+        name: Store to migrate
+        embedding_model: Model of the new version
+        workers: Embedding batches in flight at the same time
+
+    Returns:
+        Optional[str]: The published version, or None if there is nothing to migrate
+    """
+    # Imported here: the creator depends on this module
+    from src.utils.vector_store_creator import VectorStoreCreator
+    from src.utils.store_router import StoreRouter
+
+    current = current_manifest(name)
+    if current is None:
+        raise FileNotFoundError(f"Vector store {name} does not exist")
+    if current["embedding_model"] == embedding_model and current.get("metric") == INNER_PRODUCT:
+        logger.info(f"Vector store {name} already uses {embedding_model}")
+        return None
+
+    creator = VectorStoreCreator(embedding_model=embedding_model)
+    old_store = creator.load_vector_store(name)
+    # In the order of index.reconstruct_n: shard by shard
+    ids, docs = [], []
+    for shard in getattr(old_store, "shards", [old_store]):
+        if shard is None:
+            continue
+        shard_ids = [shard.index_to_docstore_id[i] for i in range(shard.index.ntotal)]
+        ids.extend(shard_ids)
+        docs.extend(shard.docstore.search(doc_id) for doc_id in shard_ids)
+    texts = [doc.page_content for doc in docs]
+
+    if current["embedding_model"] == embedding_model:
+        vectors = old_store.index.reconstruct_n(0, old_store.index.ntotal)
+        logger.info(f"Rebuilding {name} as an inner-product index")
+    else:
+        batch_size = INGESTION_CONFIG["embedding_batch_size"]
+        embedded = [embedding_text(doc) for doc in docs]
+        batches = [embedded[i:i + batch_size] for i in range(0, len(embedded), batch_size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            vectors = [vector for batch in pool.map(creator.embeddings.embed_documents, batches) for vector in batch]
+        logger.info(f"Re-embedded {len(vectors)} chunks of {name} with {embedding_model}")
+
+    creator.db = creator.new_index(texts, vectors, [doc.metadata for doc in docs], ids, shards=current.get("shards", 1))
+    version = creator.save_vector_store(name, creator.db)
+
+    VectorStoreMetadata().update_vector_store(name,
+                                              embedding_model=embedding_model,
+                                              embedding_backend=embedding_backend(embedding_model),
+                                              vector_count=creator.db.index.ntotal)
+    store_cache.invalidate(name)
+    try:
+        StoreRouter().record_centroid(name, embedding_model, creator.db)
+    except Exception as e:
+        logger.warning(f"Could not record the centroid of '{name}': {e}")
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or migrate the embedding manifest of vector stores.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show = subparsers.add_parser("show", help="Print the manifest of the current version of a store")
+    show.add_argument("store")
+    migrate = subparsers.add_parser("migrate", help="Re-embed a store with another model as a new version")
+    migrate.add_argument("store")
+    migrate.add_argument("embedding_model")
+    migrate.add_argument("--workers", type=int, default=4, help="Embedding batches in flight at the same time")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.command == "show":
+        print(json.dumps(current_manifest(args.store), indent=4))
+    else:
+        version = migrate_store(args.store, args.embedding_model, args.workers)
+        print(f"Published version {version}" if version else "Nothing to migrate")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import logging
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from src.utils.config import ROUTING_CONFIG
+from src.utils.embeddings import get_embeddings
+from src.utils.file_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class StoreRouter:
+    """
+    Pre-selects the vector stores most related to a question.
+
+    Each store is represented by the embedding of its description and,
+    optionally, by the centroid of its chunk vectors (recorded when the
+    store is published). Only the top stores are listed in the system
+    prompt; the agent can page through the rest with the
+    `list_vector_stores` action.
+    """
+    def __init__(self, config: Optional[Dict] = None, embeddings=None):
+        self.config = {**ROUTING_CONFIG, **(config or {})}
+        self.index_dir = self.config["index_dir"]
+        self.descriptions_path = os.path.join(self.index_dir, "descriptions.json")
+        self.centroids_dir = os.path.join(self.index_dir, "centroids")
+        self._embeddings = embeddings
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = get_embeddings(self.config["embedding_model"])
+        return self._embeddings
+
+    def _description_key(self, description: str) -> str:
+        return hashlib.sha1(f"{self.config['embedding_model']}\n{description}".encode("utf-8")).hexdigest()
+
+    def _description_vectors(self, stores: Dict[str, str]) -> Dict[str, np.ndarray]:
+        """Embeddings of the store descriptions, embedding only new or changed descriptions."""
+        try:
+            with open(self.descriptions_path, "r") as f:
+                cached = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            cached = {}
+
+        missing = [store_id for store_id, description in stores.items()
+                   if cached.get(store_id, {}).get("key") != self._description_key(description)]
+        if missing:
+            vectors = self.embeddings.embed_documents([f"{store_id}: {stores[store_id]}" for store_id in missing])
+            for store_id, vector in zip(missing, vectors):
+                cached[store_id] = {"key": self._description_key(stores[store_id]), "vector": vector}
+            os.makedirs(self.index_dir, exist_ok=True)
+            write_json_atomic(self.descriptions_path, cached)
+
+        return {store_id: _normalize(np.asarray(cached[store_id]["vector"], dtype=np.float32)) for store_id in stores}
+
+    def _centroid_path(self, store_id: str) -> str:
+        store_key = hashlib.sha1(store_id.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.centroids_dir, f"{store_key}-{self.config['embedding_model']}.npy")
+
+    def record_centroid(self, store_id: str, embedding_model: str, vectorstore: FAISS) -> bool:
+        """
+        Store the centroid of the chunk vectors of a store.
+        Only stores embedded with the routing model are comparable with the question embedding.
+
+        Returns:
+            bool: True if a centroid was recorded
+        """
+        if not self.config["use_centroids"] or embedding_model != self.config["embedding_model"]:
+            return False
+        total = vectorstore.index.ntotal
+        if not total:
+            return False
+        vectors = vectorstore.index.reconstruct_n(0, total)
+        centroid = _normalize(_normalize(vectors).mean(axis=0)).astype(np.float32)
+
+        os.makedirs(self.centroids_dir, exist_ok=True)
+        path = self._centroid_path(store_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, centroid)
+        os.replace(tmp_path, path)
+        return True
+
+    def _centroid(self, store_id: str) -> Optional[np.ndarray]:
+        try:
+            return np.load(self._centroid_path(store_id))
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def rank(self, question: str, stores: Dict[str, str]) -> List[str]:
+        """
+        Order stores by relevance to a question.
+
+        When all the stores fit in the prompt nothing is embedded and they
+        are returned by name. If routing fails the same order is used.
+
+        Args:
+            question: The user question
+            stores: Descriptions of the candidate stores, by store id
+
+        Returns:
+            List[str]: Store ids, most relevant first
+        """
+        by_name = sorted(stores)
+        if len(stores) <= self.config["max_stores_in_prompt"] or not question:
+            return by_name
+        try:
+            query = _normalize(np.asarray(self.embeddings.embed_query(question), dtype=np.float32))
+            descriptions = self._description_vectors(stores)
+            weight = self.config["centroid_weight"] if self.config["use_centroids"] else 0.0
+            scores = {}
+            for store_id in stores:
+                score = float(descriptions[store_id] @ query)
+                centroid = self._centroid(store_id) if weight else None
+                if centroid is not None:
+                    score = (1 - weight) * score + weight * float(centroid @ query)
+                scores[store_id] = score
+            return sorted(by_name, key=lambda store_id: scores[store_id], reverse=True)
+        except Exception as e:
+            logger.warning(f"Store routing failed, listing stores by name: {e}")
+            return by_name
+
+
+def router_for(vector_store_dir: str = "temp_vector_store") -> StoreRouter:
+    """Router of the stores of a vector store directory; directories other than the app's keep their index inside."""
+    if os.path.abspath(vector_store_dir) == os.path.abspath("temp_vector_store"):
+        return StoreRouter()
+    return StoreRouter({"index_dir": os.path.join(vector_store_dir, ".cache", "router")})
@@ -0,0 +1,100 @@
+"""
+Document summary of vector store versions.
+
+Every saved version holds a `summary.json` listing its documents (source,
+content hash, pages, chunks and tokens) with the totals, the embedding
+model and the size of the version on disk. It is built once when the
+version is written, so showing what a store contains reads one small
+file instead of walking every chunk of the loaded index.
+"""
+import json
+import logging
+import os
+from typing import Dict, Iterator, Optional
+
+from langchain.docstore.document import Document
+
+from src.utils.store_versions import SUMMARY_FILE, VersionedStoreManager
+from src.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def iter_documents(vectorstore) -> Iterator[Document]:
+    """Chunks of a FAISS or sharded store, through the index-to-docstore mapping."""
+    for shard in getattr(vectorstore, "shards", [vectorstore]):
+        if shard is None:
+            continue
+        for doc_id in shard.index_to_docstore_id.values():
+            yield shard.docstore.search(doc_id)
+
+
+def build_summary(vectorstore, embedding_model: str, previous: Optional[Dict] = None) -> Dict:
+    """
+    Summarize the documents of a store.
+
+    Args:
+        vectorstore: FAISS or ShardedVectorStore to summarize
+        embedding_model: Embedding model of the store
+        previous: Summary of the version the store was loaded from; documents
+            with the same chunks keep their token count instead of being tokenized again
+
+    Returns:
+        Dict: sources (sorted by name), documents, chunks, tokens and embedding_model
+    """
+    texts: Dict[str, list] = {}
+    sources: Dict[str, Dict] = {}
+    for doc in iter_documents(vectorstore):
+        source = doc.metadata.get("source", "Unknown")
+        if source not in sources:
+            sources[source] = {"source": source, "content_hash": doc.metadata.get("content_hash"),
+                               "pages": set(), "chunks": 0}
+            texts[source] = []
+        sources[source]["pages"].add(doc.metadata.get("page", 0))
+        sources[source]["chunks"] += 1
+        texts[source].append(doc.page_content)
+
+    known = {(entry["source"], entry.get("content_hash"), entry["chunks"]): entry["tokens"]
+             for entry in (previous or {}).get("sources", [])}
+    for source, entry in sources.items():
+        entry["pages"] = sorted(entry["pages"])
+        tokens = known.get((source, entry["content_hash"], entry["chunks"]))
+        entry["tokens"] = tokens if tokens is not None else sum(count_tokens(text) for text in texts[source])
+
+    entries = sorted(sources.values(), key=lambda entry: entry["source"])
+    return {
+        "embedding_model": embedding_model,
+        "documents": len(entries),
+        "chunks": sum(entry["chunks"] for entry in entries),
+        "tokens": sum(entry["tokens"] for entry in entries),
+        "sources": entries,
+    }
+
+
+def read_summary(version_path: str) -> Optional[Dict]:
+    """Summary of a version directory, or None for versions saved before summaries existed."""
+    try:
+        with open(os.path.join(version_path, SUMMARY_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def current_summary(name: str, vector_store_dir: str = "temp_vector_store") -> Optional[Dict]:
+    """Summary of the published version of a store, or None if it has none."""
+    versions = VersionedStoreManager(vector_store_dir)
+    version = versions.current_version(name)
+    if version is None:
+        return None
+    return read_summary(versions.version_path(name, version))
+
+
+def describe_summary(summary: Optional[Dict], max_sources: int) -> str:
+    """Short description of the contents of a store for the agent prompt, e.g. '3 documents: a.pdf, b.pdf, ...'."""
+    if not summary or not summary.get("documents"):
+        return ""
+    if max_sources <= 0:
+        return f"{summary['documents']} documents"
+    names = [entry["source"] for entry in summary["sources"][:max_sources]]
+    more = ", ..." if summary["documents"] > len(names) else ""
+    return f"{summary['documents']} documents: {', '.join(names)}{more}"
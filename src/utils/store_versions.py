@@ -0,0 +1,376 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+
+from src.utils.config import STORE_VERSIONS_CONFIG
+from src.utils.file_store import file_lock, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+READERS_DIR = ".readers"
+LEGACY_FILES = ("index.faiss", "index.pkl")
+MANIFEST_FILE = "manifest.json"
+SUMMARY_FILE = "summary.json"
+LOCK_FILE = ".lock"
+# Base version of publish calls that replace whatever version is current
+ANY_VERSION = "*"
+
+
+class VersionConflictError(Exception):
+    """The published version of a store changed since the caller loaded it."""
+
+
+def write_text_atomic(path: str, text: str) -> None:
+    """Write a small text file through a temporary file and an atomic replace."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_version_summary(path: str, summary: Dict) -> Dict:
+    """Write the document summary of a version directory, with the size of its files."""
+    size = 0
+    for directory, _, files in os.walk(path):
+        if os.path.basename(directory) != READERS_DIR:
+            size += sum(os.path.getsize(os.path.join(directory, f)) for f in files)
+    summary = {**summary, "bytes": size}
+    write_json_atomic(os.path.join(path, SUMMARY_FILE), summary)
+    return summary
+
+
+class VersionedStoreManager:
+    """
+    Manages immutable, versioned vector store directories.
+
+    Layout of a store:
+
+        temp_vector_store/<name>/CURRENT              -> id of the published version
+        temp_vector_store/<name>/versions/<version>/  -> index files (or shard directories),
+                                                         embedding manifest and document
+                                                         summary of that version
+
+    A version is fully written before CURRENT is swapped to it with an
+    atomic replace, so readers always load a complete index. The swap is a
+    compare-and-swap under a per-store lock: a writer publishes only if
+    CURRENT still points at the version it started from, so concurrent
+    writers cannot silently drop each other's changes. Readers hold
+    a lease (an in-process reference count plus a lease file visible to
+    other processes) while they read a version, and old versions are only
+    garbage-collected when no lease is left on them.
+    """
+    _refcounts: Dict[Tuple[str, str], int] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, root: str = "temp_vector_store", keep_versions: Optional[int] = None):
+        self.root = root
+        self.keep_versions = keep_versions or STORE_VERSIONS_CONFIG["keep_versions"]
+
+    def store_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def version_path(self, name: str, version: str) -> str:
+        return os.path.join(self.store_path(name), VERSIONS_DIR, version)
+
+    def _migrate_legacy(self, name: str) -> None:
+        """Move an unversioned store (index files directly in its directory) into a first version."""
+        store_path = self.store_path(name)
+        if os.path.exists(os.path.join(store_path, CURRENT_FILE)):
+            return
+        if not all(os.path.exists(os.path.join(store_path, f)) for f in LEGACY_FILES):
+            return
+        version = self._new_version_id()
+        path = self.version_path(name, version)
+        os.makedirs(path, exist_ok=True)
+        for file_name in LEGACY_FILES:
+            os.replace(os.path.join(store_path, file_name), os.path.join(path, file_name))
+        write_text_atomic(os.path.join(store_path, CURRENT_FILE), version)
+        logger.info(f"Migrated legacy store {name} to version {version}")
+
+    @staticmethod
+    def _new_version_id() -> str:
+        # Sortable by creation time, also between versions saved in the same millisecond
+        return f"{time.time_ns()}-{uuid.uuid4().hex[:6]}"
+
+    def current_version(self, name: str) -> Optional[str]:
+        """Return the published version of a store, or None if it has none."""
+        self._migrate_legacy(name)
+        try:
+            with open(os.path.join(self.store_path(name), CURRENT_FILE), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _is_complete(path: str) -> bool:
+        # Sharded versions write their manifest after all the shards
+        return (all(os.path.exists(os.path.join(path, f)) for f in LEGACY_FILES)
+                or os.path.exists(os.path.join(path, MANIFEST_FILE)))
+
+    def list_versions(self, name: str) -> List[str]:
+        """List the complete versions of a store, oldest first."""
+        versions_dir = os.path.join(self.store_path(name), VERSIONS_DIR)
+        if not os.path.isdir(versions_dir):
+            return []
+        return sorted(v for v in os.listdir(versions_dir) if self._is_complete(os.path.join(versions_dir, v)))
+
+    def exists(self, name: str) -> bool:
+        return self.current_version(name) is not None
+
+    @contextmanager
+    def store_lock(self, name: str) -> Iterator[None]:
+        """Lock of a store, held while its CURRENT pointer is compared and swapped."""
+        os.makedirs(self.store_path(name), exist_ok=True)
+        with file_lock(os.path.join(self.store_path(name), LOCK_FILE)):
+            yield
+
+    def save(self, name: str, vectorstore: FAISS, manifest: Optional[Dict] = None,
+             summary: Optional[Dict] = None, base_version: Optional[str] = None) -> str:
+        """
+        Write a vector store as a new version and publish it.
+
+        Args:
+            name: Name of the store
+            vectorstore: The FAISS store to persist
+            manifest: Embedding configuration of the index, saved with the version
+            summary: Documents of the index, saved with the version and its size on disk
+            base_version: Version the store was loaded from, None for a new store
+
+        Returns:
+            str: The published version id
+
+        Raises:
+            VersionConflictError: If another version was published since `base_version`;
+                the new version is discarded
+        """
+        self._migrate_legacy(name)
+        version = self._new_version_id()
+        path = self.version_path(name, version)
+        vectorstore.save_local(path)
+        if summary is not None:
+            write_version_summary(path, summary)
+        if manifest is not None:
+            write_json_atomic(os.path.join(path, MANIFEST_FILE), manifest)
+        try:
+            self.publish(name, version, base_version)
+        except VersionConflictError:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        return version
+
+    def _publish(self, name: str, version: str, base_version: Optional[str]) -> None:
+        # The caller holds the store lock
+        if version not in self.list_versions(name):
+            raise ValueError(f"Version {version} of store {name} does not exist")
+        current = self.current_version(name)
+        if base_version != ANY_VERSION and current != base_version:
+            raise VersionConflictError(f"Vector store {name} is at version {current}, "
+                                       f"not {base_version or 'empty'} as when it was loaded")
+        write_text_atomic(os.path.join(self.store_path(name), CURRENT_FILE), version)
+        logger.info(f"Published version {version} of store {name}")
+
+    def publish(self, name: str, version: str, base_version: Optional[str] = ANY_VERSION) -> None:
+        """
+        Atomically point CURRENT to an existing version and collect old ones in the background.
+
+        Args:
+            name: Name of the store
+            version: Version to publish
+            base_version: Version CURRENT must still point at (None: no version yet);
+                by default any
+
+        Raises:
+            VersionConflictError: If CURRENT points at another version than `base_version`
+        """
+        with self.store_lock(name):
+            self._publish(name, version, base_version)
+        self.collect_garbage_async(name)
+
+    def rollback(self, name: str, version: Optional[str] = None) -> Optional[str]:
+        """
+        Publish an older version again.
+
+        Args:
+            name: Name of the store
+            version: Version to restore; the one before the current if not given
+
+        Returns:
+            Optional[str]: The restored version, or None if there is nothing to roll back to
+        """
+        with self.store_lock(name):
+            versions = self.list_versions(name)
+            current = self.current_version(name)
+            if version is None:
+                older = [v for v in versions if current is None or v < current]
+                if not older:
+                    return None
+                version = older[-1]
+            self._publish(name, version, current)
+        self.collect_garbage_async(name)
+        return version
+
+    def delete(self, name: str) -> None:
+        """Delete a store with all its versions."""
+        shutil.rmtree(self.store_path(name), ignore_errors=True)
+
+    @contextmanager
+    def reader(self, name: str, version: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Lease a version of a store while reading it.
+
+        Yields:
+            Tuple[str, str]: The leased version and its directory
+        """
+        version = version or self.current_version(name)
+        if version is None:
+            raise FileNotFoundError(f"Vector store {name} has no published version")
+        key = (name, version)
+        readers_dir = os.path.join(self.version_path(name, version), READERS_DIR)
+        os.makedirs(readers_dir, exist_ok=True)
+        lease_path = os.path.join(readers_dir, f"{os.getpid()}-{uuid.uuid4().hex}")
+        with open(lease_path, "w") as f:
+            f.write(str(time.time()))
+        with self._lock:
+            self._refcounts[key] = self._refcounts.get(key, 0) + 1
+        try:
+            yield version, self.version_path(name, version)
+        finally:
+            with self._lock:
+                self._refcounts[key] -= 1
+                if self._refcounts[key] == 0:
+                    del self._refcounts[key]
+            try:
+                os.remove(lease_path)
+            except FileNotFoundError:
+                pass
+
+    def _has_readers(self, name: str, version: str) -> bool:
+        with self._lock:
+            if self._refcounts.get((name, version), 0) > 0:
+                return True
+        readers_dir = os.path.join(self.version_path(name, version), READERS_DIR)
+        if not os.path.isdir(readers_dir):
+            return False
+        now = time.time()
+        # Leases left behind by crashed processes expire
+        return any(now - os.path.getmtime(os.path.join(readers_dir, lease)) < STORE_VERSIONS_CONFIG["lease_ttl"]
+                   for lease in os.listdir(readers_dir))
+
+    def collect_garbage(self, name: str) -> List[str]:
+        """
+        Remove versions that are no longer needed: older than the last
+        `keep_versions` (current included) and without readers, plus
+        abandoned partial writes.
+
+        Returns:
+            List[str]: Removed versions
+        """
+        current = self.current_version(name)
+        if current is None:
+            return []
+        versions_dir = os.path.join(self.store_path(name), VERSIONS_DIR)
+        complete = self.list_versions(name)
+        older = [v for v in complete if v < current]
+        expired = older[:max(len(older) - (self.keep_versions - 1), 0)]
+
+        # Incomplete directories that were never published (a writer died)
+        now = time.time()
+        for version in os.listdir(versions_dir):
+            path = os.path.join(versions_dir, version)
+            if version not in complete and now - os.path.getmtime(path) > STORE_VERSIONS_CONFIG["orphan_ttl"]:
+                expired.append(version)
+
+        removed = []
+        for version in expired:
+            if self._has_readers(name, version):
+                continue
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+            removed.append(version)
+        if removed:
+            logger.info(f"Removed old versions of store {name}: {removed}")
+        return removed
+
+    def collect_garbage_async(self, name: str) -> threading.Thread:
+        """Run collect_garbage in a background thread."""
+        def run():
+            try:
+                self.collect_garbage(name)
+            except Exception as e:
+                logger.error(f"Error collecting old versions of store {name}: {e}")
+
+        thread = threading.Thread(target=run, name=f"store-gc-{name}")
+        thread.start()
+        return thread
+
+
+class LoadedStoreCache:
+    """
+    Process-wide cache of loaded vector stores.
+
+    Entries are keyed by store, published version and embedding model:
+    every lookup reads the (tiny) CURRENT pointer, so a newly published
+    version is picked up on the next query without a restart. Cached
+    stores are shared and must be treated as read-only.
+    """
+    def __init__(self, manager: Optional[VersionedStoreManager] = None):
+        self.manager = manager or VersionedStoreManager()
+        self._stores: Dict[str, Tuple[str, str, FAISS]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, embeddings_model: str, load: Callable[[str], FAISS]) -> FAISS:
+        """
+        Return the current version of a store, loading it if needed.
+
+        Args:
+            name: Name of the store
+            embeddings_model: Embedding model the store is queried with
+            load: Function loading the store from a version directory
+
+        Returns:
+            FAISS: The loaded store
+        """
+        version = self.manager.current_version(name)
+        if version is None:
+            raise FileNotFoundError(f"Vector store {name} has no published version")
+        with self._lock:
+            cached = self._stores.get(name)
+        if cached and cached[0] == version and cached[1] == embeddings_model:
+            return cached[2]
+
+        with self.manager.reader(name, version) as (_, path):
+            vectorstore = load(path)
+        with self._lock:
+            self._stores[name] = (version, embeddings_model, vectorstore)
+        logger.info(f"Loaded version {version} of store {name}")
+        return vectorstore
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Drop one cached store, or all of them."""
+        with self._lock:
+            if name is None:
+                self._stores.clear()
+            else:
+                self._stores.pop(name, None)
+
+
+# Shared by every session of the app process
+store_cache = LoadedStoreCache()
+_store_caches: Dict[str, LoadedStoreCache] = {}
+_store_caches_lock = threading.Lock()
+
+
+def store_cache_for(root: str) -> LoadedStoreCache:
+    """Process-wide cache of the stores of a vector store directory (`store_cache` for the default one)."""
+    if os.path.abspath(root) == os.path.abspath(store_cache.manager.root):
+        return store_cache
+    with _store_caches_lock:
+        return _store_caches.setdefault(os.path.abspath(root), LoadedStoreCache(VersionedStoreManager(root)))
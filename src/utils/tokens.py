@@ -0,0 +1,60 @@
+import logging
+from functools import lru_cache
+from typing import List
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+# Rough characters-per-token ratio used when the tokenizer files are unavailable (offline runs)
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = DEFAULT_ENCODING):
+    """Return a cached tiktoken encoding, or None if it cannot be loaded."""
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"Tokenizer {name} unavailable, estimating tokens from characters: {e}")
+        return None
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """
+    Count the tokens of a text with the given tokenizer.
+
+    Args:
+        text: Text to measure
+        encoding_name: Name of the tiktoken encoding
+
+    Returns:
+        int: Number of tokens in the text
+    """
+    if not text:
+        return 0
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts: List[str], encoding_name: str = DEFAULT_ENCODING) -> List[int]:
+    """
+    Count the tokens of many texts in a single batched call.
+
+    Args:
+        texts: Texts to measure
+        encoding_name: Name of the tiktoken encoding
+
+    Returns:
+        List[int]: Number of tokens of each text, in the same order
+    """
+    if not texts:
+        return []
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return [max(1, len(text) // CHARS_PER_TOKEN) if text else 0 for text in texts]
+    encoded = encoding.encode_batch(texts, disallowed_special=())
+    return [len(tokens) for tokens in encoded]
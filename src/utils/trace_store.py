@@ -0,0 +1,103 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.chat_store import ChatSessionStore, prompt_hash
+from src.utils.config import TRACE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class TraceStore:
+    """
+    Agent traces of the questions of one chat session.
+
+    Each question keeps only its delta: the agent steps, the range of chat
+    messages the agent was given and the hash of its system prompt. Prompts
+    are shared by every question that used them, so a conversation costs
+    memory proportional to its new steps instead of a full copy of all the
+    messages per question.
+
+    At most `max_in_memory` traces are kept in memory. In spill-to-disk mode
+    every trace is also appended to the chat session on disk, and evicted
+    traces are read back from there; otherwise they are dropped.
+    """
+    def __init__(self,
+                 chat_store: Optional[ChatSessionStore] = None,
+                 user_id: Optional[str] = None,
+                 session_id: Optional[str] = None,
+                 max_in_memory: Optional[int] = None,
+                 spill_to_disk: Optional[bool] = None):
+        self.chat_store = chat_store
+        self.user_id = user_id
+        self.session_id = session_id
+        self.max_in_memory = max_in_memory or TRACE_CONFIG["max_traces_in_memory"]
+        spill_to_disk = TRACE_CONFIG["spill_to_disk"] if spill_to_disk is None else spill_to_disk
+        self.spill_to_disk = spill_to_disk and chat_store is not None
+        self._traces: "OrderedDict[int, Dict]" = OrderedDict()
+        self._prompts: Dict[str, str] = {}
+        self.question_count = 0
+        if self.spill_to_disk and session_id:
+            info = chat_store.session_info(user_id, session_id)
+            self.question_count = info["question_count"] if info else 0
+
+    def attach(self, session_id: str) -> None:
+        """Set the chat session the traces are saved to, once it is created."""
+        self.session_id = session_id
+
+    def add(self, prompt: str, history: Tuple[int, int], steps: List[Dict]) -> int:
+        """
+        Save the trace of a new question.
+
+        Args:
+            prompt: System prompt the agent used
+            history: Range [start, end) of session messages the agent was given
+            steps: Messages produced by the agent and its observations
+
+        Returns:
+            int: Number (1-based) of the question
+        """
+        hash_ = prompt_hash(prompt)
+        trace = {"prompt_hash": hash_, "history": list(history), "steps": steps}
+        self.question_count += 1
+        self._prompts.setdefault(hash_, prompt)
+        self._traces[self.question_count] = trace
+        if self.spill_to_disk and self.session_id:
+            self.chat_store.append_trace(self.user_id, self.session_id, trace, prompt)
+
+        while len(self._traces) > self.max_in_memory:
+            self._traces.popitem(last=False)
+        # Prompts are kept while a trace in memory refers to them
+        used = {trace["prompt_hash"] for trace in self._traces.values()}
+        for unused in set(self._prompts) - used:
+            del self._prompts[unused]
+        return self.question_count
+
+    def questions(self) -> List[int]:
+        """Questions whose trace can still be read."""
+        if self.spill_to_disk:
+            return list(range(1, self.question_count + 1))
+        return list(self._traces)
+
+    def get(self, question: int) -> Optional[Dict]:
+        """Get the trace of a question from memory, or from disk in spill-to-disk mode."""
+        if question in self._traces:
+            return self._traces[question]
+        if self.spill_to_disk and self.session_id and 0 < question <= self.question_count:
+            return self.chat_store.load_trace(self.user_id, self.session_id, question)
+        return None
+
+    def get_steps(self, question: int) -> List[Dict]:
+        """Agent steps of a question, or an empty list if its trace is no longer kept."""
+        trace = self.get(question)
+        return trace["steps"] if trace else []
+
+    def get_prompt(self, question: int) -> Optional[str]:
+        """System prompt the agent used for a question."""
+        trace = self.get(question)
+        if trace is None:
+            return None
+        prompt = self._prompts.get(trace["prompt_hash"])
+        if prompt is None and self.spill_to_disk and self.session_id:
+            prompt = self.chat_store.load_prompt(self.user_id, self.session_id, trace["prompt_hash"])
+        return prompt
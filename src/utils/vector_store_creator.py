@@ -1,19 +1,24 @@
 import os
 from dotenv import load_dotenv
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredWordDocumentLoader,
-    UnstructuredPowerPointLoader,
-)
 from langchain.docstore.document import Document
-from src.utils.config import OPENAI_API_KEY
+from src.utils.config import OPENAI_API_KEY, INGESTION_CONFIG, SHARDING_CONFIG, STORE_VERSIONS_CONFIG
+from src.utils.chunking import StructureAwareChunker, embedding_text
+from src.utils.store_versions import VersionConflictError, VersionedStoreManager, store_cache_for, write_version_summary
+from src.utils.file_store import hash_file
+from src.utils.document_cache import ParsedDocumentCache, loader_id
+from src.utils.namespaces import QuotaExceededError, SHARED_NAMESPACE, USER_NAMESPACE_PREFIX, qualify
+from src.utils.embeddings import embedding_backend, get_embeddings
+from src.utils.store_manifest import (EmbeddingMismatchError, add_to_index, build_index, build_manifest, check_model,
+                                      check_vectors, current_manifest, legacy_manifest, load_index, load_manifest)
+from src.utils.sharding import ShardedVectorStore, shard_of
+from src.utils.store_summary import build_summary, read_summary
+from src.utils.ocr import needs_ocr, ocr_enabled, ocr_id, ocr_pages
+from src.utils.loaders import get_loader
+from src.utils.store_router import router_for
+from src.utils.vector_store_metadata import VectorStoreMetadata
 import openai
-from langchain_openai import OpenAIEmbeddings
 import streamlit as st
 
 load_dotenv()
@@ -23,14 +28,30 @@ class VectorStoreCreator:
     """
     A class to create and manage persistent FAISS vector stores.
     """
-    def __init__(self):
+    def __init__(self, embedding_model: Optional[str] = None, embeddings=None, shards: Optional[int] = None,
+                 vector_store_dir: str = "temp_vector_store"):
         openai.api_key = OPENAI_API_KEY
         self.documents: Optional[List[Document]] = None
         self.split_docs: Optional[List[Document]] = None
         self.db: Optional[FAISS] = None
-        self.temp_dir = "temp_vector_store"
+        # Version self.db was loaded from (None for a new store) and its summary
+        self.version: Optional[str] = None
+        self.summary: Optional[Dict] = None
+        # Offline evaluations and load tests work on their own directory of stores
+        self.temp_dir = vector_store_dir
         self._ensure_temp_directory()
-        self.embeddings = OpenAIEmbeddings(model=st.session_state.vector_store_params["embedding_model"])
+        self.versions = VersionedStoreManager(self.temp_dir)
+        self.parsed_cache = ParsedDocumentCache()
+        # Timings of the PDFs read with OCR by the last load_documents
+        self.ocr_timings: List[Dict] = []
+        # Outside of a Streamlit session (e.g. the ingestion worker) the model must be given explicitly
+        if embedding_model is None:
+            embedding_model = st.session_state.vector_store_params["embedding_model"]
+        self.embedding_model = embedding_model
+        # Any LangChain embeddings can be given instead (e.g. offline evaluations)
+        self.embeddings = embeddings or get_embeddings(embedding_model)
+        # Shards of the stores created by this creator; existing stores keep theirs
+        self.shards = shards or SHARDING_CONFIG["shards"]
 
     def _ensure_temp_directory(self):
         """Ensure the temporary directory exists."""
@@ -39,86 +60,199 @@ class VectorStoreCreator:
 
     
 
-    def save_vector_store(self, name: str = "default", vectorstore: FAISS = None):
-        """Save the current vector store to disk."""
+    def save_vector_store(self, name: str = "default", vectorstore: FAISS = None) -> str:
+        """
+        Save the current vector store to disk as a new version.
+
+        The version is fully written before it is published, so readers
+        never see a half-written index. It is only published if the store is
+        still at the version it was loaded from.
+
+        Returns:
+            str: The published version
+
+        Raises:
+            VersionConflictError: If another version of the store was published meanwhile
+        """
         if self.db is None:
             raise ValueError("No vector store to save")
         
-        save_path = os.path.join(self.temp_dir, name)
-        vectorstore.save_local(save_path)
-        print(f"Vector store saved to {save_path}")
+        # The manifest pins the embedding configuration every later load, add and query must use
+        manifest = build_manifest(vectorstore, self.embedding_model)
+        summary = build_summary(vectorstore, self.embedding_model, previous=self.summary)
+        version = self.versions.save(name, vectorstore, manifest, summary, base_version=self.version)
+        self.version = version
+        self.summary = summary
+        print(f"Vector store {name} saved as version {version}")
+        return version
+
+    def _store_embeddings(self, manifest: Dict):
+        """Embeddings of the model pinned in a store manifest."""
+        if manifest["embedding_model"] == self.embedding_model:
+            return self.embeddings
+        return get_embeddings(manifest["embedding_model"], manifest.get("embedding_backend"))
 
     def load_vector_store(self, name: str = "default") -> Optional[FAISS]:
-        """Load a vector store from disk."""
+        """
+        Load the current version of a vector store from disk, with the
+        embedding model pinned in its manifest.
+
+        Raises:
+            EmbeddingMismatchError: If the index does not match its manifest
+        """
         try:
-            load_path = os.path.join(self.temp_dir, name)
-            if not os.path.exists(load_path):
+            self.version = None
+            if not self.versions.exists(name):
                 return None
-            
-            embeddings = OpenAIEmbeddings(
-                model="text-embedding-3-small",
-                openai_api_key=os.getenv("OPENAI_API_KEY")
-            )
-            self.db = FAISS.load_local(load_path, embeddings, allow_dangerous_deserialization=True)
+
+            with self.versions.reader(name) as (version, load_path):
+                manifest = load_manifest(name, load_path, self.temp_dir) or legacy_manifest(self.embedding_model)
+                self.db = load_index(load_path, self._store_embeddings(manifest), manifest, name)
+                self.version = version
+                self.summary = read_summary(load_path)
+                if self.summary is None:
+                    # Versions saved before summaries existed get one the first time they are loaded
+                    self.summary = build_summary(self.db, manifest["embedding_model"])
+                    try:
+                        self.summary = write_version_summary(load_path, self.summary)
+                    except OSError as e:
+                        print(f"Could not save the summary of vector store {name}: {e}")
             return self.db
+        except EmbeddingMismatchError:
+            raise
         except Exception as e:
             print(f"Error loading vector store: {e}")
             return None
 
-    def delete_vector_store(self, name: str = "default"):
-        """Delete a vector store from disk."""
+    def delete_vector_store(self, name: str = "default") -> bool:
+        """Delete a vector store with all its versions from disk."""
         try:
-            store_path = os.path.join(self.temp_dir, name)
-            if os.path.exists(store_path):
-                import shutil
-                shutil.rmtree(store_path)
+            if os.path.exists(self.versions.store_path(name)):
+                self.versions.delete(name)
                 print(f"Vector store {name} deleted")
+            return True
         except Exception as e:
             print(f"Error deleting vector store: {e}")
+            return False
+
+    def rollback_vector_store(self, name: str, version: Optional[str] = None) -> Optional[str]:
+        """
+        Publish a previous version of a vector store again.
+
+        The metadata of the store (sources, vector count and embedding model)
+        and its routing centroid are rebuilt from the restored version, so
+        duplicate detection sees the files of the restored index.
+
+        Returns:
+            Optional[str]: The restored version, or None if there is none
+        """
+        try:
+            restored = self.versions.rollback(name, version)
+        except Exception as e:
+            print(f"Error rolling back vector store: {e}")
+            return None
+        if restored:
+            self._sync_metadata(name)
+        return restored
+
+    def _sync_metadata(self, name: str) -> None:
+        """Describe the published version of a store in the metadata file and the store router."""
+        store_cache_for(self.temp_dir).invalidate(name)
+        if self.load_vector_store(name) is None:
+            return
+        manifest = current_manifest(name, self.temp_dir) or legacy_manifest(self.embedding_model)
+        VectorStoreMetadata(self.temp_dir).update_vector_store(
+            name,
+            sources={entry["content_hash"]: entry["source"] for entry in self.summary["sources"]
+                     if entry.get("content_hash")},
+            vector_count=self.db.index.ntotal,
+            embedding_model=manifest["embedding_model"],
+            embedding_backend=manifest.get("embedding_backend") or embedding_backend(manifest["embedding_model"]),
+        )
+        try:
+            router_for(self.temp_dir).record_centroid(name, manifest["embedding_model"], self.db)
+        except Exception as e:
+            print(f"Could not record the centroid of vector store {name}: {e}")
 
     def list_vector_stores(self) -> List[str]:
-        """List all available vector stores."""
+        """List all available vector stores, as namespace-qualified ids for namespaced stores."""
         try:
-            return [d for d in os.listdir(self.temp_dir) 
-                   if os.path.isdir(os.path.join(self.temp_dir, d))]
+            stores = []
+            for d in os.listdir(self.temp_dir):
+                path = os.path.join(self.temp_dir, d)
+                if not os.path.isdir(path) or d.startswith("."):
+                    continue
+                if d == SHARED_NAMESPACE or d.startswith(USER_NAMESPACE_PREFIX):
+                    stores.extend(qualify(d, name) for name in os.listdir(path)
+                                  if os.path.isdir(os.path.join(path, name)) and not name.startswith("."))
+                else:
+                    stores.append(d)
+            return stores
         except Exception as e:
             print(f"Error listing vector stores: {e}")
             return []
 
-    def load_documents(self, file_paths: List[str]) -> List[Document]:
+    def _read_scanned_pages(self, file_path: str, source: str, loaded_docs: List[Document], use_ocr: bool) -> None:
+        """Replace the missing text layer of scanned PDF pages (one document per page) with their OCR text."""
+        scanned = [i for i, doc in enumerate(loaded_docs) if needs_ocr(doc.page_content)]
+        if not scanned:
+            return
+        if not use_ocr:
+            print(f"{len(scanned)} of {len(loaded_docs)} pages of {file_path} have no text; "
+                  "enable OCR (OCR_ENABLED=true) to read scanned pages")
+            return
+        texts, timings = ocr_pages(file_path, scanned)
+        for i in scanned:
+            loaded_docs[i].page_content = texts[i]
+            loaded_docs[i].metadata["ocr"] = True
+        self.ocr_timings.append({"source": source, **timings})
+
+    def load_documents(self, file_paths: List[str], source_names: Optional[Dict[str, str]] = None) -> List[Document]:
         """
         Loads documents from the file paths.
+        Parsed pages are cached by file content and loader version, so a file
+        that was already parsed (for any store or chunking) is not parsed again.
+        With OCR enabled, PDF pages without a text layer are read with OCR.
+
+        Args:
+            file_paths: Files to load
+            source_names: Name each file is cited by, by path; the file name of the path by default
         """
         self.documents = []
+        self.ocr_timings = []
+        use_ocr = ocr_enabled()
         for file_path in file_paths:
             if not os.path.exists(file_path):
                 continue
 
-            _, file_extension = os.path.splitext(file_path.lower())
-            loader = None
+            loader = get_loader(file_path)
+            if loader is None:
+                print(f"Unsupported file format, skipping {file_path}")
+                continue
+            is_pdf = file_path.lower().endswith(".pdf")
+            # Stored uploads are named after the first upload of their content
+            source = (source_names or {}).get(file_path) or os.path.basename(file_path)
 
             try:
-                if file_extension == ".pdf":
-                    loader = PyPDFLoader(file_path)
-                elif file_extension == ".txt":
-                    loader = TextLoader(file_path, encoding="utf-8")
-                elif file_extension == ".docx":
-                    loader = UnstructuredWordDocumentLoader(file_path)
-                elif file_extension == ".pptx":
-                    loader = UnstructuredPowerPointLoader(file_path)
+                content_hash = hash_file(file_path)
+                cache_key = loader_id(loader.name, loader.package, loader.version)
+                if is_pdf and use_ocr:
+                    cache_key += "+" + ocr_id()
+                loaded_docs = self.parsed_cache.get(content_hash, cache_key)
+
+                if loaded_docs is None:
+                    # One document per page (or slide), numbered from 1
+                    loaded_docs = loader.load(file_path)
+                    if is_pdf:
+                        self._read_scanned_pages(file_path, source, loaded_docs, use_ocr)
+                    self.parsed_cache.put(content_hash, cache_key, loaded_docs)
                 else:
-                    continue
+                    print(f"Using cached parse of {file_path}")
 
-                loaded_docs = loader.load()
-                for i, doc in enumerate(loaded_docs):
-                    if isinstance(doc, Document) and hasattr(doc, 'metadata'):
-                        doc.metadata['source'] = os.path.basename(file_path)
-                        # Add page number for PDFs
-                        if file_extension == ".pdf" and hasattr(doc, 'metadata'):
-                            doc.metadata['page'] = i + 1
-                        # For other document types, we'll use the chunk number as a pseudo-page
-                        else:
-                            doc.metadata['page'] = i + 1
+                # The same content can be uploaded under different names
+                for doc in loaded_docs:
+                    doc.metadata['source'] = source
+                    doc.metadata['content_hash'] = content_hash
 
                 self.documents.extend(loaded_docs)
 
@@ -129,57 +263,201 @@ class VectorStoreCreator:
         return self.documents
 
     def split_documents(self,
-                       chunk_size: int = 1000,
-                       chunk_overlap: int = 200) -> List[Document]:
+                       chunk_size: int = 300,
+                       chunk_overlap: int = 30,
+                       semantic_merge: bool = False) -> List[Document]:
         """
         Splits the loaded documents into smaller chunks.
+
+        Args:
+            chunk_size: Maximum tokens per chunk
+            chunk_overlap: Tokens of trailing sentences repeated in the next chunk
+            semantic_merge: Only keep adjacent sentences together while their embeddings are similar
         """
         if not self.documents:
             return []
 
-        text_splitter = RecursiveCharacterTextSplitter(
+        chunker = StructureAwareChunker(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", " ", ""],
-            length_function=len,
+            semantic_merge=semantic_merge,
+            embeddings=self.embeddings if semantic_merge else None,
         )
 
-        self.split_docs = text_splitter.split_documents(self.documents)
+        self.split_docs = chunker.split_documents(self.documents)
         return self.split_docs
 
+    def _embed_documents(self,
+                         documents: List[Document],
+                         progress_callback: Optional[Callable[[str, float, str], None]] = None) -> List[List[float]]:
+        """Embed documents in batches, reporting progress after each batch."""
+        batch_size = INGESTION_CONFIG["embedding_batch_size"]
+        texts = [embedding_text(doc) for doc in documents]
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(self.embeddings.embed_documents(texts[i:i + batch_size]))
+            if progress_callback:
+                done = min(i + batch_size, len(texts))
+                progress_callback("embedding", 0.3 + 0.6 * done / len(texts), f"Embedded {done}/{len(texts)} chunks")
+        return vectors
+
+    def new_index(self,
+                  texts: List[str],
+                  vectors: List[List[float]],
+                  metadatas: List[Dict],
+                  ids: Optional[List[str]] = None,
+                  shards: Optional[int] = None):
+        """
+        Build the index of a new store, split into shards by document hash
+        when more than one shard is configured.
+
+        Returns:
+            FAISS or ShardedVectorStore: The new index
+        """
+        shards = shards or self.shards
+        if shards <= 1:
+            return build_index(texts, vectors, self.embeddings, metadatas, ids)
+        store = ShardedVectorStore([None] * shards, self.embeddings)
+        self._add_vectors(store, texts, vectors, metadatas, ids)
+        return store
+
+    def _add_vectors(self, store, texts: List[str], vectors: List[List[float]], metadatas: List[Dict],
+                     ids: Optional[List[str]] = None) -> None:
+        """Add embedded chunks to an index; in a sharded store only the shards of their documents change."""
+        if not isinstance(store, ShardedVectorStore):
+            add_to_index(store, texts, vectors, metadatas)
+            return
+        if store.index.ntotal:
+            check_vectors(vectors, store)
+        groups: Dict[int, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(shard_of(metadata, len(store.shards)), []).append(i)
+        for shard, positions in groups.items():
+            shard_texts = [texts[i] for i in positions]
+            shard_vectors = [vectors[i] for i in positions]
+            shard_metadatas = [metadatas[i] for i in positions]
+            if store.shards[shard] is None:
+                store.shards[shard] = build_index(shard_texts, shard_vectors, self.embeddings, shard_metadatas,
+                                                  [ids[i] for i in positions] if ids else None)
+            else:
+                add_to_index(store.shards[shard], shard_texts, shard_vectors, shard_metadatas)
+            store.dirty.add(shard)
+
+    def _remove_sources(self, store, sources: Dict[str, str]) -> int:
+        """
+        Remove the chunks of some files from an index. Vectors are removed by
+        id (compacting the index) together with their docstore entries; in a
+        sharded store only the shards of those files are searched and changed.
+
+        Args:
+            store: FAISS or ShardedVectorStore to change in place
+            sources: Content hash to source name of the files; chunks without a
+                content hash (older stores) are matched by source name
+
+        Returns:
+            int: Number of chunks removed
+        """
+        names = set(sources.values())
+        if isinstance(store, ShardedVectorStore):
+            affected = {shard_of({"content_hash": content_hash}, len(store.shards)) for content_hash in sources}
+            shards = [(i, store.shards[i]) for i in sorted(affected)]
+        else:
+            shards = [(0, store)]
+
+        removed = 0
+        for i, shard in shards:
+            if shard is None:
+                continue
+            ids = [doc_id for doc_id, doc in shard.docstore._dict.items()
+                   if doc.metadata.get("content_hash") in sources
+                   or ("content_hash" not in doc.metadata and doc.metadata.get("source") in names)]
+            if not ids:
+                continue
+            shard.delete(ids)
+            removed += len(ids)
+            if isinstance(store, ShardedVectorStore):
+                store.dirty.add(i)
+                if not shard.index.ntotal:
+                    store.shards[i] = None
+        return removed
+
+    def delete_sources(self, name: str, sources: Dict[str, str]) -> int:
+        """
+        Remove the chunks of some files from a store and publish the result as a new version.
+
+        Args:
+            name: Name of the store
+            sources: Content hash to source name of the files to remove
+
+        Returns:
+            int: Number of chunks removed (no version is published if 0)
+        """
+        for attempt in range(STORE_VERSIONS_CONFIG["publish_attempts"]):
+            if self.load_vector_store(name) is None:
+                raise FileNotFoundError(f"Vector store {name} does not exist")
+            removed = self._remove_sources(self.db, sources)
+            try:
+                if removed:
+                    self.save_vector_store(name, self.db)
+                print(f"Removed {removed} chunks of {len(sources)} files from vector store {name}")
+                return removed
+            except VersionConflictError as e:
+                print(f"{e}; removing the files from the new version")
+        raise VersionConflictError(f"Vector store {name} kept changing while removing files")
+
     def create_vector_store(self,
-                          embedding_model_name: str = "text-embedding-3-small",
-                          name: str = "default") -> Optional[FAISS]:
+                          name: str = "default",
+                          progress_callback: Optional[Callable[[str, float, str], None]] = None,
+                          vectors: Optional[List[List[float]]] = None) -> Optional[FAISS]:
         """
         Creates embeddings for the split documents and returns the FAISS index.
+
+        Args:
+            vectors: Embeddings of the split documents, if already computed
+
+        Raises:
+            VersionConflictError: If another writer created the store meanwhile
         """
         if not self.split_docs:
             print("No split documents available for vector store creation")
             return None
 
         try:
-            print(f"Creating embeddings using model: {embedding_model_name}")
-
-            self.db = FAISS.from_documents(self.split_docs, self.embeddings)
+            if vectors is None:
+                print(f"Creating embeddings using model: {self.embedding_model}")
+                vectors = self._embed_documents(self.split_docs, progress_callback)
+            self.db = self.new_index([doc.page_content for doc in self.split_docs], vectors,
+                                     [doc.metadata for doc in self.split_docs])
+            self.summary = None
+            if progress_callback:
+                progress_callback("publishing", 0.95, "Saving vector store")
             self.save_vector_store(name, self.db)
             return self.db
 
+        except VersionConflictError:
+            raise
         except Exception as e:
             print(f"Error creating vector store: {str(e)}")
             return None
 
     def add_documents_to_vector_store(self, 
                                     documents: List[Document],
-                                    embedding_model_name: str = "text-embedding-3-small") -> bool:
+                                    progress_callback: Optional[Callable[[str, float, str], None]] = None,
+                                    vectors: Optional[List[List[float]]] = None) -> bool:
         """
-        Add new documents to an existing vector store.
+        Add new documents to an existing vector store, embedded with the
+        model of the creator (checked against the store manifest by process_files).
         
         Args:
             documents: List of documents to add
-            embedding_model_name: Name of the embedding model to use
+            progress_callback: Called with (stage, progress, message) while embedding
+            vectors: Embeddings of the documents, if already computed
             
         Returns:
             bool: True if documents were added successfully, False otherwise
+
+        Raises:
+            EmbeddingMismatchError: If the new vectors do not fit the index
         """
         if not self.db:
             print("No vector store available to add documents to")
@@ -187,57 +465,109 @@ class VectorStoreCreator:
             
         try:
             print(f"Adding {len(documents)} documents to existing vector store")
-            embeddings = OpenAIEmbeddings(
-                model=embedding_model_name,
-                openai_api_key=OPENAI_API_KEY
-            )
-            
+
             # Add documents to existing vector store
-            self.db.add_documents(documents)
+            if vectors is None:
+                vectors = self._embed_documents(documents, progress_callback)
+            self._add_vectors(self.db, [doc.page_content for doc in documents], vectors,
+                              [doc.metadata for doc in documents])
             return True
-            
+
+        except EmbeddingMismatchError:
+            raise
         except Exception as e:
             print(f"Error adding documents to vector store: {str(e)}")
             return False
 
-    def process_files(self, file_paths: List[str], name: str = "default") -> Optional[FAISS]:
+    def process_files(self,
+                      file_paths: List[str],
+                      name: str = "default",
+                      chunk_size: int = 300,
+                      chunk_overlap: int = 30,
+                      semantic_merge: bool = False,
+                      progress_callback: Optional[Callable[[str, float, str], None]] = None,
+                      before_embedding: Optional[Callable[[List[Document]], None]] = None,
+                      replace_sources: Optional[Dict[str, str]] = None,
+                      source_names: Optional[Dict[str, str]] = None) -> Optional[FAISS]:
         """
         Process files and create or update a vector store.
         If a vector store with the given name exists, new documents will be added to it.
+
+        Args:
+            progress_callback: Called with (stage, progress from 0 to 1, message)
+            before_embedding: Called with the chunks before they are embedded; raising
+                QuotaExceededError aborts the processing
+            replace_sources: Content hash to source name of files of the store that the new
+                files replace; their chunks are removed in the same new version
+            source_names: Name each file is cited by, by path; the file name of the path by default
+
+        Raises:
+            EmbeddingMismatchError: If the store exists with another embedding model
         """
+        def report(stage: str, progress: float, message: str = ""):
+            if progress_callback:
+                progress_callback(stage, progress, message)
+
         try:
             print(f"Starting to process {len(file_paths)} files")
+
+            # Appending with another model would mix vector spaces in the index
+            manifest = current_manifest(name, self.temp_dir)
+            if manifest:
+                check_model(manifest, self.embedding_model, name)
             
             # Load new documents
-            new_documents = self.load_documents(file_paths)
+            report("loading", 0.05, f"Loading {len(file_paths)} files")
+            new_documents = self.load_documents(file_paths, source_names)
             if not new_documents:
                 print("No documents were loaded successfully")
                 return None
             print(f"Successfully loaded {len(new_documents)} documents")
 
             # Split the new documents
-            self.split_documents()
+            report("splitting", 0.2, f"Splitting {len(new_documents)} pages")
+            self.split_documents(chunk_size, chunk_overlap, semantic_merge)
             if not self.split_docs:
                 print("No documents were split successfully")
                 return None
             print(f"Successfully split documents into {len(self.split_docs)} chunks")
+            if before_embedding:
+                before_embedding(self.split_docs)
 
-            # Check if vector store exists
-            existing_store = self.load_vector_store(name)
-            if existing_store:
-                print(f"Adding documents to existing vector store: {name}")
-                # Add new documents to existing store
-                if self.add_documents_to_vector_store(self.split_docs):
-                    self.save_vector_store(name, self.db)
-                    return self.db
-                else:
-                    print("Failed to add documents to existing vector store")
-                    return None
-            else:
-                print(f"Creating new vector store: {name}")
-                # Create new vector store
-                return self.create_vector_store(name=name)
+            # Chunks are embedded once; if another writer publishes the store
+            # meanwhile, they are added again to its new version
+            vectors = None
+            for attempt in range(STORE_VERSIONS_CONFIG["publish_attempts"]):
+                try:
+                    # Check if vector store exists
+                    existing_store = self.load_vector_store(name)
+                    if existing_store:
+                        print(f"Adding documents to existing vector store: {name}")
+                        if replace_sources:
+                            self._remove_sources(self.db, replace_sources)
+                        if vectors is None:
+                            vectors = self._embed_documents(self.split_docs, progress_callback)
+                        # Add new documents to existing store
+                        if self.add_documents_to_vector_store(self.split_docs, vectors=vectors):
+                            report("publishing", 0.95, "Saving vector store")
+                            self.save_vector_store(name, self.db)
+                            return self.db
+                        else:
+                            print("Failed to add documents to existing vector store")
+                            return None
+                    else:
+                        print(f"Creating new vector store: {name}")
+                        if vectors is None:
+                            vectors = self._embed_documents(self.split_docs, progress_callback)
+                        # Create new vector store
+                        return self.create_vector_store(name=name, progress_callback=progress_callback,
+                                                        vectors=vectors)
+                except VersionConflictError as e:
+                    print(f"{e}; adding the documents to the new version")
+            raise VersionConflictError(f"Vector store {name} kept changing while adding documents")
 
+        except (QuotaExceededError, EmbeddingMismatchError, VersionConflictError):
+            raise
         except Exception as e:
             print(f"Error processing files: {str(e)}")
             return None
@@ -247,6 +577,8 @@ class VectorStoreCreator:
         self.documents = None
         self.split_docs = None
         self.db = None
+        self.version = None
+        self.summary = None
         # Optionally clean up temp directory
         # if os.path.exists(self.temp_dir):
         #     shutil.rmtree(self.temp_dir)
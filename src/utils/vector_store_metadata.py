@@ -1,11 +1,17 @@
 import json
 import os
-from typing import Dict
+from typing import Dict, List, Optional
+
+from src.utils.embeddings import embedding_backend
+from src.utils.file_store import file_lock, write_json_atomic
+from src.utils.namespaces import split_store_id
 
 class VectorStoreMetadata:
     def __init__(self, vector_store_dir: str = "temp_vector_store"):
         self.vector_store_dir = vector_store_dir
         self.metadata_file = os.path.join(vector_store_dir, "vector_store_metadata.json")
+        # Held by every read-modify-write of the metadata file: the app and the worker processes update it
+        self.lock_file = f"{self.metadata_file}.lock"
         self._ensure_metadata_file()
 
     def _ensure_metadata_file(self):
@@ -15,36 +21,145 @@ class VectorStoreMetadata:
             os.makedirs(self.vector_store_dir)
         
         # Create metadata file if it doesn't exist
-        if not os.path.exists(self.metadata_file):
-            with open(self.metadata_file, 'w') as f:
-                json.dump({}, f)
+        with file_lock(self.lock_file):
+            if not os.path.exists(self.metadata_file):
+                write_json_atomic(self.metadata_file, {})
 
-    def add_vector_store(self, name: str, description: str, embedding_model: str) -> bool:
+    def add_vector_store(self, name: str, description: str, embedding_model: str, owner: Optional[str] = None) -> bool:
         """
         Add a new vector store to the metadata file.
         
         Args:
             name: Name of the vector store
             description: Description of the vector store
+            embedding_model: Embedding model the store is built with; its backend is recorded too
+            owner: User creating the store; kept from its first creation, it decides who can change a shared store
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Read existing metadata
+            with file_lock(self.lock_file):
+                # Read existing metadata
+                with open(self.metadata_file, 'r') as f:
+                    metadata = json.load(f)
+
+                # Add new vector store, keeping what is already known about it (e.g. its sources)
+                entry = metadata.get(name, {})
+                entry.update({"description" : description,
+                              "embedding_model" : embedding_model,
+                              "embedding_backend" : embedding_backend(embedding_model),
+                              "namespace" : split_store_id(name)[0]})
+                if owner and "owner" not in entry:
+                    entry["owner"] = owner
+                metadata[name] = entry
+
+                # Write updated metadata
+                write_json_atomic(self.metadata_file, metadata)
+
+            return True
+        except Exception as e:
+            print(f"Error adding vector store metadata: {e}")
+            return False
+
+    def update_vector_store(self, name: str, **fields) -> bool:
+        """
+        Update fields of an existing vector store entry (e.g. vector_count).
+        
+        Args:
+            name: Name of the vector store
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            with file_lock(self.lock_file):
+                with open(self.metadata_file, 'r') as f:
+                    metadata = json.load(f)
+                if name not in metadata:
+                    return False
+                metadata[name].update(fields)
+                write_json_atomic(self.metadata_file, metadata)
+            return True
+        except Exception as e:
+            print(f"Error updating vector store metadata: {e}")
+            return False
+
+    def load_all(self) -> Dict[str, Dict]:
+        """Get the raw metadata entries of every vector store."""
+        try:
             with open(self.metadata_file, 'r') as f:
-                metadata = json.load(f)
+                return json.load(f)
+        except Exception as e:
+            print(f"Error reading vector store metadata: {e}")
+            return {}
+
+    def get_sources(self, name: str) -> Dict[str, str]:
+        """
+        Get the files already ingested into a vector store.
+        
+        Args:
+            name: Name of the vector store
             
-            # Add new vector store
-            metadata[name] = {"description" : description, "embedding_model" : embedding_model}
+        Returns:
+            Dict[str, str]: Content hash to source name of each ingested file
+        """
+        try:
+            with open(self.metadata_file, 'r') as f:
+                metadata = json.load(f)
+            return metadata.get(name, {}).get("sources", {})
+        except Exception as e:
+            print(f"Error getting vector store sources: {e}")
+            return {}
+
+    def add_sources(self, name: str, sources: Dict[str, str]) -> bool:
+        """
+        Record files as ingested into a vector store.
+        
+        Args:
+            name: Name of the vector store
+            sources: Content hash to source name of the ingested files
             
-            # Write updated metadata
-            with open(self.metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=4)
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            with file_lock(self.lock_file):
+                with open(self.metadata_file, 'r') as f:
+                    metadata = json.load(f)
+                if name not in metadata:
+                    return False
+                metadata[name].setdefault("sources", {}).update(sources)
+                write_json_atomic(self.metadata_file, metadata)
+            return True
+        except Exception as e:
+            print(f"Error adding vector store sources: {e}")
+            return False
+
+    def remove_sources(self, name: str, content_hashes: List[str]) -> bool:
+        """
+        Forget files removed from a vector store.
+        
+        Args:
+            name: Name of the vector store
+            content_hashes: Content hashes of the removed files
             
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            with file_lock(self.lock_file):
+                with open(self.metadata_file, 'r') as f:
+                    metadata = json.load(f)
+                if name not in metadata:
+                    return False
+                sources = metadata[name].get("sources", {})
+                for content_hash in content_hashes:
+                    sources.pop(content_hash, None)
+                write_json_atomic(self.metadata_file, metadata)
             return True
         except Exception as e:
-            print(f"Error adding vector store metadata: {e}")
+            print(f"Error removing vector store sources: {e}")
             return False
 
     def get_vector_store_description(self, name: str) -> str:
@@ -65,10 +180,13 @@ class VectorStoreMetadata:
             print(f"Error getting vector store description: {e}")
             return ""
 
-    def list_vector_stores(self) -> Dict[str, str]:
+    def list_vector_stores(self, namespaces: Optional[List[str]] = None) -> Dict[str, str]:
         """
         Get all vector stores and their descriptions.
         
+        Args:
+            namespaces: Only stores in these namespaces, if given
+            
         Returns:
             Dict[str, str]: Dictionary of vector store names and descriptions
         """
@@ -79,6 +197,8 @@ class VectorStoreMetadata:
             # Filter out vector stores that don't exist in the directory
             existing_stores = {}
             for name, description in metadata.items():
+                if namespaces is not None and split_store_id(name)[0] not in namespaces:
+                    continue
                 store_path = os.path.join(self.vector_store_dir, name)
                 if os.path.exists(store_path):
                     existing_stores[name] = description
@@ -102,19 +222,19 @@ class VectorStoreMetadata:
             bool: True if successful, False otherwise
         """
         try:
-            # Read existing metadata
-            with open(self.metadata_file, 'r') as f:
-                metadata = json.load(f)
-            
-            # Remove vector store if it exists
-            if name in metadata:
-                del metadata[name]
-                
-                # Write updated metadata
-                with open(self.metadata_file, 'w') as f:
-                    json.dump(metadata, f, indent=4)
-                
-                return True
+            with file_lock(self.lock_file):
+                # Read existing metadata
+                with open(self.metadata_file, 'r') as f:
+                    metadata = json.load(f)
+
+                # Remove vector store if it exists
+                if name in metadata:
+                    del metadata[name]
+
+                    # Write updated metadata
+                    write_json_atomic(self.metadata_file, metadata)
+
+                    return True
             return False
         except Exception as e:
             print(f"Error deleting vector store metadata: {e}")
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_ROOT)
+
+from src.evaluation.backends import HashingEmbeddings  # noqa: E402
+from src.utils import embeddings as embedding_backends  # noqa: E402
+
+SAMPLE_DOCUMENTS = sorted(os.path.join(REPOSITORY_ROOT, "synthetic CVs", name)
+                          for name in os.listdir(os.path.join(REPOSITORY_ROOT, "synthetic CVs")))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory: stores, caches and uploads use paths relative to it."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def hashing_embeddings(monkeypatch):
+    """Serve every OpenAI embedding model with offline hashing embeddings."""
+    embeddings = HashingEmbeddings()
+    monkeypatch.setitem(embedding_backends.EMBEDDING_BACKENDS, embedding_backends.OPENAI_BACKEND,
+                        lambda model: embeddings)
+    return embeddings
+
+
+@pytest.fixture
+def sample_documents():
+    return list(SAMPLE_DOCUMENTS)
+
+
+@pytest.fixture
+def cv_store(workdir, hashing_embeddings, sample_documents):
+    """Shared store of the sample CVs, ingested by a background job of alice."""
+    from src.utils.ingestion_queue import IngestionQueue
+    from src.utils.ingestion_worker import run_ingest_job
+
+    queue = IngestionQueue("jobs")
+    job_id = queue.submit({"file_paths": sample_documents, "store_name": "shared/cvs", "store_description": "CVs",
+                           "embedding_model": "text-embedding-3-small", "chunk_size": 300, "chunk_overlap": 30},
+                          user_id="alice")
+    run_ingest_job(queue, queue.get_job(job_id))
+    return "shared/cvs"
@@ -0,0 +1,77 @@
+from src.evaluation.backends import ScriptedChatClient
+from src.utils.agent import AgentAI
+from src.utils.config import AGENT_CONFIG
+from src.utils.prompts import FAST_MODE_PROMPT, FORCE_ANSWER_PROMPT
+from src.utils.response_cache import ResponseCache
+from src.utils.retrieval import AdaptiveRetriever
+
+QUESTION = [{"role": "assistant", "content": "Hello!"},
+            {"role": "user", "content": "¿Qué experiencia tiene Javier Morales en ciberseguridad?"}]
+
+
+def _agent(store, hashing_embeddings, **kwargs):
+    client = kwargs.pop("client", None) or ScriptedChatClient(store)
+    agent = AgentAI(user_id="alice", response_cache=kwargs.pop("response_cache", ResponseCache(mode="off")),
+                    client=client, embeddings_factory=lambda model: hashing_embeddings, **kwargs)
+    # Hashing embeddings score lower than the production threshold
+    agent.retriever = AdaptiveRetriever({"score_threshold": 0.0})
+    return agent
+
+
+def test_single_model_by_default(cv_store, hashing_embeddings):
+    agent = _agent(cv_store, hashing_embeddings)
+    assert agent.run(QUESTION, "gpt-4.1-2025-04-14")
+
+    assert {stats["model"] for stats in agent.token_count["tiers"].values()} == {"gpt-4.1-2025-04-14"}
+
+
+def test_planning_tier_plans_and_the_selected_model_answers(cv_store, hashing_embeddings):
+    agent = _agent(cv_store, hashing_embeddings, model_tiers={"planning": "gpt-4.1-mini-2025-04-14"})
+    assert "Ciberseguridad" in agent.run(QUESTION, "gpt-4.1-2025-04-14")
+
+    tiers = agent.token_count["tiers"]
+    assert tiers["planning"]["model"] == "gpt-4.1-mini-2025-04-14" and tiers["planning"]["calls"] == 3
+    assert tiers["synthesis"]["model"] == "gpt-4.1-2025-04-14" and tiers["synthesis"]["calls"] == 1
+
+
+def test_speculation_is_off_by_default(cv_store, hashing_embeddings):
+    agent = _agent(cv_store, hashing_embeddings)
+    agent.run(QUESTION, "gpt-4.1-2025-04-14")
+
+    assert "speculation" not in agent.telemetry
+
+
+def test_speculative_retrieval_is_reused_by_a_matching_search(cv_store, hashing_embeddings):
+    baseline = _agent(cv_store, hashing_embeddings).run(QUESTION, "gpt-4.1-2025-04-14")
+    agent = _agent(cv_store, hashing_embeddings, speculative=True)
+
+    assert agent.run(QUESTION, "gpt-4.1-2025-04-14") == baseline
+    assert agent.telemetry["speculation"]["stores"] == [cv_store]
+    assert agent.telemetry["speculation"]["hit"]
+
+
+def test_turn_limit_forces_the_answer(cv_store, hashing_embeddings):
+    agent = _agent(cv_store, hashing_embeddings)
+    assert agent.run(QUESTION, "gpt-4.1-2025-04-14", max_turns=2)
+
+    assert agent.telemetry["termination"] == "turn_limit" and agent.telemetry["turns"] == 2
+    assert agent.agent_messages[-2]["content"] == FORCE_ANSWER_PROMPT
+
+
+def test_token_budget_forces_the_answer_early(cv_store, hashing_embeddings, monkeypatch):
+    monkeypatch.setitem(AGENT_CONFIG, "max_tokens_per_question", 1)
+    agent = _agent(cv_store, hashing_embeddings)
+    agent.run(QUESTION, "gpt-4.1-2025-04-14")
+
+    assert agent.telemetry["termination"] == "token_budget" and agent.telemetry["turns"] == 2
+
+
+def test_fast_mode_skips_the_thought_turn(cv_store, hashing_embeddings):
+    baseline = _agent(cv_store, hashing_embeddings)
+    answer = baseline.run(QUESTION, "gpt-4.1-2025-04-14")
+    agent = _agent(cv_store, hashing_embeddings, fast_mode=True, client=ScriptedChatClient(cv_store, fast_mode=True))
+
+    assert agent.run(QUESTION, "gpt-4.1-2025-04-14") == answer
+    assert (baseline.telemetry["turns"], agent.telemetry["turns"]) == (3, 2)
+    assert agent.telemetry["termination"] == "answer" and agent.telemetry["thought_turns"] == 0
+    assert FAST_MODE_PROMPT in agent.prompt
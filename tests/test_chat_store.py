@@ -0,0 +1,68 @@
+import os
+import threading
+
+from src.utils.chat_store import INDEX_FILE, ChatSessionStore, prompt_hash
+from src.utils.namespaces import user_namespace
+
+
+def test_messages_are_paged_from_the_end(workdir):
+    store = ChatSessionStore("sessions")
+    session_id = store.create_session("alice")
+    for i in range(10):
+        store.append_message("alice", session_id, "user" if i % 2 == 0 else "assistant", f"message {i}")
+
+    assert [m["content"] for m in store.load_messages("alice", session_id, limit=3)] == \
+        ["message 7", "message 8", "message 9"]
+    assert [m["content"] for m in store.load_messages("alice", session_id, end=3, limit=5)] == \
+        ["message 0", "message 1", "message 2"]
+    sessions = store.list_sessions("alice")
+    assert sessions[0]["title"] == "message 0" and sessions[0]["message_count"] == 10
+
+
+def test_index_keeps_only_session_headers(workdir):
+    store = ChatSessionStore("sessions")
+    session_id = store.create_session("alice")
+    store.append_message("alice", session_id, "user", "question")
+    index_path = os.path.join("sessions", user_namespace("alice"), INDEX_FILE)
+    size = os.path.getsize(index_path)
+
+    for i in range(50):
+        store.append_message("alice", session_id, "assistant", f"answer {i}")
+
+    # Appending messages does not grow (or rewrite) the index
+    assert os.path.getsize(index_path) == size
+
+
+def test_concurrent_tabs_keep_every_message(workdir):
+    store = ChatSessionStore("sessions")
+    session_id = store.create_session("alice")
+
+    def write(tab):
+        tab_store = ChatSessionStore("sessions")
+        for i in range(25):
+            tab_store.append_message("alice", session_id, "user", f"tab {tab} message {i}")
+
+    threads = [threading.Thread(target=write, args=(tab,)) for tab in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    messages = store.load_messages("alice", session_id, limit=1000)
+    assert len(messages) == store.session_info("alice", session_id)["message_count"] == 100
+    assert len({m["content"] for m in messages}) == 100
+
+
+def test_traces_and_prompts_are_read_back(workdir):
+    store = ChatSessionStore("sessions")
+    session_id = store.create_session("alice")
+    prompt = "You are a helpful assistant."
+    for question in range(3):
+        store.append_trace("alice", session_id, {"prompt_hash": prompt_hash(prompt), "history": [0, question],
+                                                 "steps": [{"role": "assistant", "content": str(question)}]}, prompt)
+
+    assert store.session_info("alice", session_id)["question_count"] == 3
+    assert store.load_trace("alice", session_id, 2)["steps"][0]["content"] == "1"
+    assert store.load_prompt("alice", session_id, prompt_hash(prompt)) == prompt
+    with open(os.path.join("sessions", user_namespace("alice"), session_id, "prompts.jsonl")) as f:
+        assert len(f.readlines()) == 1
@@ -0,0 +1,97 @@
+import pytest
+from langchain.docstore.document import Document
+
+from src.utils import chunking
+from src.utils.chunking import StructureAwareChunker, embedding_text
+from src.utils.loaders import load_pdf
+
+
+def _page(text, source="doc.md", page=1):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_sample_cv_sections_are_detected(sample_documents):
+    docs = load_pdf(sample_documents[0])
+    for doc in docs:
+        doc.metadata["source"] = "cv.pdf"
+
+    sections = {chunk.metadata["section"] for chunk in StructureAwareChunker(300, 30).split_documents(docs)}
+    assert {"Resumen Profesional", "Experiencia Laboral", "Educación", "Idiomas"} <= sections
+
+
+def test_chunks_never_cross_a_heading():
+    text = "# Experience\nWorked on search systems.\n\n# Education\nStudied computer science."
+    chunks = StructureAwareChunker(300, 30).split_documents([_page(text)])
+
+    assert [chunk.metadata["section"] for chunk in chunks] == ["Experience", "Education"]
+    assert "Education" not in chunks[0].page_content
+
+
+def test_word_per_line_text_is_joined():
+    text = "\n \n".join("Built data pipelines for the finance team during five years".split())
+    chunks = StructureAwareChunker(300, 30).split_documents([_page(text)])
+
+    assert chunks[0].page_content == "Built data pipelines for the finance team during five years"
+
+
+def test_overlap_repeats_trailing_sentences():
+    text = " ".join(f"Sentence number {i} talks about topic {i}." for i in range(40))
+    chunks = StructureAwareChunker(chunk_size=60, chunk_overlap=20).split_documents([_page(text)])
+
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_sentence = previous.page_content.rsplit(". ", 1)[-1]
+        assert last_sentence in chunk.page_content
+        assert chunk.metadata["tokens"] <= 60
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        StructureAwareChunker(chunk_size=100, chunk_overlap=100)
+
+
+def test_chunk_index_is_numbered_per_source():
+    text = " ".join(f"Sentence number {i} talks about topic {i}." for i in range(20))
+    docs = [_page(text, "a.md"), _page(text, "b.md"), _page(text, "b.md", page=2)]
+    chunks = StructureAwareChunker(chunk_size=60, chunk_overlap=0).split_documents(docs)
+
+    for source in ("a.md", "b.md"):
+        indexes = [chunk.metadata["chunk_index"] for chunk in chunks if chunk.metadata["source"] == source]
+        assert indexes == list(range(len(indexes)))
+
+
+def test_chunks_are_embedded_with_their_document_and_section():
+    chunk = Document(page_content="- Universidad Tecnológica Nacional",
+                     metadata={"source": "CV Andrés López.pdf", "section": "Educación"})
+    assert embedding_text(chunk) == "CV Andrés López\nEducación\n- Universidad Tecnológica Nacional"
+
+    # A section heading already at the start of the chunk is not repeated
+    chunk.page_content = "Educación\n- Universidad Tecnológica Nacional"
+    assert embedding_text(chunk) == "CV Andrés López\nEducación\n- Universidad Tecnológica Nacional"
+
+
+class ByteEncoding:
+    """One token per UTF-8 byte: token boundaries fall inside accented characters."""
+    def encode(self, text, disallowed_special=()):
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="replace")
+
+    def decode_tokens_bytes(self, tokens):
+        return [bytes([token]) for token in tokens]
+
+
+def test_long_sentences_are_cut_at_exact_character_offsets(monkeypatch):
+    monkeypatch.setattr(chunking, "get_encoding", lambda name=None: ByteEncoding())
+    text = "Diseñó la migración de los servicios de facturación " * 6
+    chunker = StructureAwareChunker(chunk_size=25, chunk_overlap=5)
+    unit = chunking._Unit(text.strip(), 0, "", False)
+
+    pieces = chunker._split_long(unit)
+    assert len(pieces) > 1
+    assert "".join(piece.text for piece in pieces) == unit.text
+    assert all(unit.text[piece.start:piece.start + len(piece.text)] == piece.text for piece in pieces)
+    for chunk in chunker.split_documents([_page(text)]):
+        start = chunk.metadata["start_index"]
+        assert text[start:start + len(chunk.page_content)] == chunk.page_content
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from src.utils.ingestion_queue import IngestionQueue
+from src.utils.ingestion_worker import run_delete_job, run_ingest_job
+from src.utils.sharding import shard_of
+from src.utils.store_summary import current_summary
+from src.utils.vector_store_creator import VectorStoreCreator
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+
+def _index(embeddings, shards):
+    texts, metadatas = [], []
+    for i in range(6):
+        for part in range(3):
+            texts.append(f"Document {i} part {part}.")
+            metadatas.append({"source": f"doc-{i}.pdf", "content_hash": f"hash-{i}", "page": part})
+    # A chunk of an older store, saved without a content hash
+    texts.append("Legacy chunk.")
+    metadatas.append({"source": "legacy.pdf", "page": 0})
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small", embeddings=embeddings, shards=shards)
+    return creator, creator.new_index(texts, embeddings.embed_documents(texts), metadatas)
+
+
+def _sources(store):
+    return {doc.metadata["source"] for doc in store.docstore._dict.values()}
+
+
+@pytest.mark.parametrize("shards", [1, 4])
+def test_remove_sources_drops_every_chunk_of_the_files(hashing_embeddings, shards):
+    creator, store = _index(hashing_embeddings, shards)
+
+    assert creator._remove_sources(store, {"hash-2": "doc-2.pdf", "legacy": "legacy.pdf"}) == 4
+    assert store.index.ntotal == 15
+    assert _sources(store) == {f"doc-{i}.pdf" for i in range(6) if i != 2}
+    assert creator._remove_sources(store, {"hash-2": "doc-2.pdf"}) == 0
+
+
+def test_remove_sources_only_changes_the_shards_of_the_files(hashing_embeddings):
+    creator, store = _index(hashing_embeddings, 4)
+    store.dirty.clear()
+    shard = shard_of({"content_hash": "hash-0"}, 4)
+    documents = {f"hash-{i}": f"doc-{i}.pdf" for i in range(6) if shard_of({"content_hash": f"hash-{i}"}, 4) == shard}
+
+    creator._remove_sources(store, documents)
+    assert store.dirty == {shard}
+    if not any(shard_of(doc.metadata, 4) == shard for doc in store.docstore._dict.values()):
+        assert store.shards[shard] is None
+
+
+def test_delete_job_publishes_the_store_without_the_file(cv_store, sample_documents):
+    metadata = VectorStoreMetadata()
+    removed = next(iter(metadata.get_sources(cv_store).items()))
+    queue = IngestionQueue("jobs")
+
+    bob_job = queue.submit({"store_name": cv_store, "sources": dict([removed])}, user_id="bob", kind="delete_sources")
+    with pytest.raises(PermissionError):
+        run_delete_job(queue, queue.get_job(bob_job))
+
+    job_id = queue.submit({"store_name": cv_store, "sources": dict([removed])}, user_id="alice", kind="delete_sources")
+    run_delete_job(queue, queue.get_job(job_id))
+    remaining = {os.path.basename(path) for path in sample_documents} - {removed[1]}
+    assert {entry["source"] for entry in current_summary(cv_store)["sources"]} == remaining
+    assert set(VectorStoreMetadata().get_sources(cv_store).values()) == remaining
+
+
+def test_replacing_a_file_swaps_its_chunks_in_one_version(cv_store, sample_documents):
+    replaced = next(iter(VectorStoreMetadata().get_sources(cv_store).items()))
+    queue = IngestionQueue("jobs")
+    job_id = queue.submit({"file_paths": sample_documents[:1], "source_names": {sample_documents[0]: "new_cv.pdf"},
+                           "replace_sources": dict([replaced]), "store_name": cv_store, "store_description": "CVs",
+                           "embedding_model": "text-embedding-3-small", "chunk_size": 300, "chunk_overlap": 30},
+                          user_id="alice")
+    run_ingest_job(queue, queue.get_job(job_id))
+
+    sources = {entry["source"] for entry in current_summary(cv_store)["sources"]}
+    assert "new_cv.pdf" in sources and replaced[1] not in sources
+
+
+def test_replacing_a_file_with_content_already_in_the_store_removes_it(cv_store, sample_documents):
+    sources = VectorStoreMetadata().get_sources(cv_store)
+    kept = os.path.basename(sample_documents[0])
+    replaced = next((content_hash, name) for content_hash, name in sources.items() if name != kept)
+    queue = IngestionQueue("jobs")
+    job_id = queue.submit({"file_paths": sample_documents[:1], "replace_sources": dict([replaced]),
+                           "store_name": cv_store, "store_description": "CVs",
+                           "embedding_model": "text-embedding-3-small", "chunk_size": 300, "chunk_overlap": 30},
+                          user_id="alice")
+    run_ingest_job(queue, queue.get_job(job_id))
+
+    remaining = {os.path.basename(path) for path in sample_documents} - {replaced[1]}
+    assert {entry["source"] for entry in current_summary(cv_store)["sources"]} == remaining
+    assert set(VectorStoreMetadata().get_sources(cv_store).values()) == remaining
@@ -0,0 +1,48 @@
+from langchain.docstore.document import Document
+
+from src.utils import loaders
+from src.utils.config import OCR_CONFIG
+from src.utils.document_cache import loader_id
+from src.utils.loaders import FormatLoader, get_loader
+from src.utils.ocr import ocr_id
+from src.utils.vector_store_creator import VectorStoreCreator
+
+
+def test_native_loaders_are_keyed_on_their_own_version():
+    for extension in (".txt", ".md", ".html"):
+        loader = get_loader(f"file{extension}")
+        key = loader_id(loader.name, loader.package, loader.version)
+        assert "==" not in key
+    assert loader_id("text", None, 1) != loader_id("text", None, 2)
+    assert "pypdf==" in loader_id(get_loader("file.pdf").name, get_loader("file.pdf").package)
+
+
+def test_ocr_settings_are_part_of_the_key(monkeypatch):
+    key = ocr_id()
+    monkeypatch.setitem(OCR_CONFIG, "dpi", OCR_CONFIG["dpi"] + 100)
+    assert ocr_id() != key
+    monkeypatch.setitem(OCR_CONFIG, "language", "eng")
+    monkeypatch.setitem(OCR_CONFIG, "dpi", OCR_CONFIG["dpi"] - 100)
+    assert ocr_id() != key
+
+
+def test_bumping_a_loader_version_parses_files_again(workdir, hashing_embeddings, monkeypatch):
+    calls = []
+
+    def load(file_path):
+        calls.append(file_path)
+        return [Document(page_content="Some text of the document.", metadata={"page": 1})]
+
+    with open("notes.fake", "w") as f:
+        f.write("content")
+    monkeypatch.setitem(loaders.LOADERS, ".fake", FormatLoader("fake", None, load))
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small")
+
+    creator.load_documents(["notes.fake"])
+    creator.load_documents(["notes.fake"])
+    assert len(calls) == 1
+
+    monkeypatch.setitem(loaders.LOADERS, ".fake", FormatLoader("fake", None, load, version=2))
+    docs = creator.load_documents(["notes.fake"])
+    assert len(calls) == 2
+    assert docs[0].metadata["source"] == "notes.fake"
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from src.evaluation.backends import HashingEmbeddings
+from src.utils import embeddings as embedding_backends
+from src.utils.embeddings import LOCAL_BACKEND, OPENAI_BACKEND, LocalEmbeddings, embedding_backend, get_embeddings
+from src.utils.store_manifest import current_manifest
+from src.utils.vector_store_creator import VectorStoreCreator
+
+LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class FakeSentenceTransformer:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append((list(texts), kwargs))
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+def test_backend_is_inferred_from_the_model():
+    assert embedding_backend(LOCAL_MODEL) == LOCAL_BACKEND
+    assert embedding_backend("text-embedding-3-small") == OPENAI_BACKEND
+    assert isinstance(get_embeddings(LOCAL_MODEL), LocalEmbeddings)
+    with pytest.raises(ValueError):
+        get_embeddings(LOCAL_MODEL, backend="gpu")
+
+
+def test_local_model_is_loaded_once_and_encodes_normalized_batches(monkeypatch):
+    model = FakeSentenceTransformer()
+    loads = []
+    monkeypatch.setattr(LocalEmbeddings, "_models", {})
+    monkeypatch.setattr(LocalEmbeddings, "_load_model", lambda self: loads.append(self.model) or model)
+
+    first = LocalEmbeddings(LOCAL_MODEL, {"batch_size": 8})
+    assert first.embed_documents(["a", "b"]) == [[0.5] * 4] * 2
+    assert LocalEmbeddings(LOCAL_MODEL, {"batch_size": 8}).embed_query("c") == [0.5] * 4
+    assert first.embed_documents([]) == []
+
+    assert loads == [LOCAL_MODEL]
+    assert [texts for texts, _ in model.calls] == [["a", "b"], ["c"]]
+    assert all(kwargs["batch_size"] == 8 and kwargs["normalize_embeddings"] for _, kwargs in model.calls)
+
+
+def test_stores_record_the_local_backend(workdir, sample_documents, monkeypatch):
+    monkeypatch.setitem(embedding_backends.EMBEDDING_BACKENDS, LOCAL_BACKEND, lambda model: HashingEmbeddings())
+    creator = VectorStoreCreator(embedding_model=LOCAL_MODEL)
+    assert creator.process_files(sample_documents[:1], name="shared/cvs")
+
+    manifest = current_manifest("shared/cvs")
+    assert (manifest["embedding_model"], manifest["embedding_backend"]) == (LOCAL_MODEL, LOCAL_BACKEND)
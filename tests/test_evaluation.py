@@ -0,0 +1,48 @@
+import os
+import shutil
+
+from src.evaluation.harness import EvaluationHarness, load_suite
+from src.evaluation.load_test import LoadTest
+
+
+def _app_stores():
+    """What the evaluation left among the stores of the app (caches aside)."""
+    if not os.path.isdir("temp_vector_store"):
+        return []
+    return [name for name in os.listdir("temp_vector_store") if name != ".cache"]
+
+
+def test_harness_reports_recall_without_touching_the_app_stores(workdir):
+    harness = EvaluationHarness(load_suite())
+    [report] = harness.run([{"name": "base"}])
+
+    assert 0 < report["summary"]["recall_at_k"] <= 1
+    assert report["summary"]["chunks"] > 0
+    assert _app_stores() == []
+    assert not os.path.exists(harness.vector_store_dir)
+
+
+def test_load_test_levels_and_saturation(workdir):
+    load_test = LoadTest(load_suite(), {"levels": [1, 2], "questions_per_session": 1, "think_time": 0,
+                                        "ramp_seconds": 0, "chat_latency": 0, "embedding_latency": 0,
+                                        "jitter": 0, "upload_ratio": 1.0})
+    report = load_test.run()
+
+    assert [level["questions"] for level in report["levels"]] == [1, 2]
+    assert all(level["errors"] == 0 for level in report["levels"])
+    assert _app_stores() == []
+    assert not os.path.exists(load_test.vector_store_dir)
+
+
+def test_saturation_is_the_first_level_that_stops_scaling(workdir):
+    load_test = LoadTest(load_suite(), {"latency_slo": 2.0})
+    levels = [{"sessions": 1, "throughput": 1.0, "error_rate": 0.0, "latency": {"p95": 0.5}},
+              {"sessions": 2, "throughput": 1.9, "error_rate": 0.0, "latency": {"p95": 0.6}},
+              {"sessions": 4, "throughput": 2.0, "error_rate": 0.0, "latency": {"p95": 0.9}},
+              {"sessions": 8, "throughput": 2.0, "error_rate": 0.0, "latency": {"p95": 3.0}}]
+
+    saturation = load_test.saturation(levels)
+    shutil.rmtree(load_test.vector_store_dir)
+    shutil.rmtree(load_test.chat_dir)
+    assert saturation["saturation_sessions"] == 4
+    assert saturation["max_sustainable_sessions"] == 2
@@ -0,0 +1,48 @@
+import io
+
+from src.utils.file_store import ContentAddressedFileStore, hash_file
+from src.utils.ingestion_queue import IngestionQueue
+from src.utils.ingestion_worker import run_ingest_job
+from src.utils.namespaces import qualify, user_namespace
+from src.utils.store_summary import current_summary
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+
+def test_identical_uploads_are_stored_once_under_their_own_names(workdir):
+    file_store = ContentAddressedFileStore("uploads")
+    first = file_store.save_stream(io.BytesIO(b"same content"), "alice_cv.txt")
+    second = file_store.save_stream(io.BytesIO(b"same content"), "bob_cv.txt")
+    other = file_store.save_stream(io.BytesIO(b"other content"), "alice_cv.txt")
+
+    assert first.new and not second.new
+    assert second.content_hash == first.content_hash == hash_file(first.path)
+    assert second.path == first.path
+    assert (first.source_name, second.source_name) == ("alice_cv.txt", "bob_cv.txt")
+    # Same name, different content: never overwritten
+    assert other.path != first.path
+    assert open(first.path, "rb").read() == b"same content"
+
+
+def test_duplicate_content_keeps_each_users_name(workdir, hashing_embeddings, sample_documents):
+    file_store = ContentAddressedFileStore("uploads")
+    queue = IngestionQueue("jobs")
+    with open(sample_documents[0], "rb") as f:
+        content = f.read()
+
+    for user, name in (("alice", "alice_cv.pdf"), ("bob", "bob_cv.pdf")):
+        stored = file_store.save_stream(io.BytesIO(content), name)
+        job_id = queue.submit({
+            "file_paths": [stored.path],
+            "source_names": {stored.path: stored.source_name},
+            "store_name": qualify(user_namespace(user), "cvs"),
+            "store_description": "CVs",
+            "embedding_model": "text-embedding-3-small",
+            "chunk_size": 300,
+            "chunk_overlap": 30,
+        }, user_id=user)
+        run_ingest_job(queue, queue.get_job(job_id))
+
+    for user, name in (("alice", "alice_cv.pdf"), ("bob", "bob_cv.pdf")):
+        store_name = qualify(user_namespace(user), "cvs")
+        assert [entry["source"] for entry in current_summary(store_name)["sources"]] == [name]
+        assert list(VectorStoreMetadata().get_sources(store_name).values()) == [name]
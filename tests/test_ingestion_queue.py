@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import threading
+
+from src.utils.file_store import write_json_atomic
+from src.utils.ingestion_queue import IngestionQueue, JOB_QUEUED, JOB_RUNNING
+from src.utils.ingestion_worker import run_ingest_job
+from src.utils.namespaces import qualify
+from src.utils.store_summary import current_summary
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+
+def _ingest_params(store_name, file_paths):
+    return {
+        "file_paths": file_paths,
+        "store_name": store_name,
+        "store_description": "CVs",
+        "embedding_model": "text-embedding-3-small",
+        "chunk_size": 300,
+        "chunk_overlap": 30,
+    }
+
+
+def test_claim_runs_one_job_per_store_at_a_time(workdir):
+    queue = IngestionQueue("jobs")
+    first = queue.submit({"store_name": "shared/cvs"})
+    second = queue.submit({"store_name": "shared/cvs"})
+    other = queue.submit({"store_name": "shared/other"})
+
+    assert queue.claim_next_job()["job_id"] == first
+    # The second job on the same store waits, the job on another store can run
+    assert queue.claim_next_job()["job_id"] == other
+    assert queue.claim_next_job() is None
+    assert queue.get_job(second)["status"] == JOB_QUEUED
+
+    queue.finish_job(first, True)
+    claimed = queue.claim_next_job()
+    assert claimed["job_id"] == second and claimed["status"] == JOB_RUNNING
+
+
+def test_only_jobs_whose_processes_are_gone_are_requeued(workdir):
+    queue = IngestionQueue("jobs")
+    job_id = queue.submit({"store_name": "shared/cvs"})
+    queue.claim_next_job()
+
+    # The worker that claimed the job (this process) is alive: another worker must not run it again
+    assert queue.requeue_interrupted_jobs() == 0
+    assert queue.claim_next_job() is None
+
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    write_json_atomic(os.path.join("jobs", f"{job_id}.lock"), {"pids": [finished.pid]})
+    assert queue.requeue_interrupted_jobs() == 1
+    assert queue.claim_next_job()["job_id"] == job_id
+
+
+def test_two_jobs_on_one_store_keep_both_files(workdir, hashing_embeddings, sample_documents):
+    queue = IngestionQueue("jobs")
+    store_name = qualify("shared", "cvs")
+    queue.submit(_ingest_params(store_name, sample_documents[:1]), user_id="alice")
+    queue.submit(_ingest_params(store_name, sample_documents[1:2]), user_id="alice")
+
+    while True:
+        job = queue.claim_next_job()
+        if job is None:
+            break
+        queue.finish_job(job["job_id"], True, run_ingest_job(queue, job))
+
+    expected = {os.path.basename(path) for path in sample_documents[:2]}
+    assert {entry["source"] for entry in current_summary(store_name)["sources"]} == expected
+    assert set(VectorStoreMetadata().get_sources(store_name).values()) == expected
+
+
+def test_metadata_updates_from_concurrent_writers_are_kept(workdir):
+    metadata = VectorStoreMetadata()
+    metadata.add_vector_store("shared/cvs", "CVs", "text-embedding-3-small")
+
+    def add(i):
+        # Each writer reads the file itself, like separate worker processes
+        VectorStoreMetadata().add_sources("shared/cvs", {f"hash-{i}": f"file-{i}.pdf"})
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(metadata.get_sources("shared/cvs")) == 20
@@ -0,0 +1,66 @@
+import docx
+from docx.enum.text import WD_BREAK
+from pptx import Presentation
+from pptx.util import Inches
+
+from src.utils.loaders import get_loader, supported_extensions
+
+
+def _load(path):
+    return [doc.page_content for doc in get_loader(str(path)).load(str(path))]
+
+
+def test_loaders_are_registered_by_extension():
+    assert {".pdf", ".docx", ".pptx", ".html", ".md", ".txt", ".doc"} <= set(supported_extensions())
+    assert get_loader("CV.DOCX").name == "docx"
+    assert get_loader("notes.xyz") is None
+
+
+def test_docx_keeps_headings_lists_tables_and_page_breaks(tmp_path):
+    document = docx.Document()
+    document.add_heading("Experiencia", level=1)
+    document.add_paragraph("Ingeniero de datos en Acme.")
+    document.add_paragraph("Python", style="List Bullet")
+    table = document.add_table(rows=1, cols=2)
+    table.rows[0].cells[0].text, table.rows[0].cells[1].text = "2020", "Acme"
+    document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.add_heading("Educación", level=2)
+    document.save(tmp_path / "cv.docx")
+
+    pages = _load(tmp_path / "cv.docx")
+    assert pages == ["# Experiencia\n\nIngeniero de datos en Acme.\n\n- Python\n\n2020 | Acme", "## Educación"]
+
+
+def test_pptx_reads_titles_bullets_tables_and_notes(tmp_path):
+    presentation = Presentation()
+    slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+    slide.shapes.title.text = "Resultados"
+    body = slide.placeholders[1].text_frame
+    body.text = "Ventas"
+    detail = body.add_paragraph()
+    detail.text, detail.level = "Crecieron 10%", 1
+    slide.notes_slide.notes_text_frame.text = "Mencionar el Q3"
+    table_slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+    table = table_slide.shapes.add_table(1, 2, Inches(1), Inches(1), Inches(4), Inches(1)).table
+    table.cell(0, 0).text, table.cell(0, 1).text = "Q3", "120"
+    presentation.save(tmp_path / "deck.pptx")
+
+    assert _load(tmp_path / "deck.pptx") == ["# Resultados\nVentas\n  - Crecieron 10%\nNotes: Mencionar el Q3",
+                                             "Q3 | 120"]
+
+
+def test_html_keeps_visible_text_as_markdown(tmp_path):
+    (tmp_path / "page.html").write_text(
+        "<html><head><title>Perfil</title><script>var x = 1;</script></head><body>"
+        "<h2>Habilidades</h2><ul><li>Python</li><li>SQL</li></ul>"
+        "<table><tr><td>Acme</td><td>2020</td></tr></table><style>p {}</style></body></html>",
+        encoding="utf-8")
+
+    assert _load(tmp_path / "page.html") == ["# Perfil\n\n## Habilidades\n\n- Python\n- SQL\n\nAcme | 2020"]
+
+
+def test_markdown_underlined_headings_and_front_matter(tmp_path):
+    (tmp_path / "notes.md").write_text("---\ntitle: x\n---\nPerfil\n======\nTexto.\n\nDetalle\n-------\n",
+                                       encoding="utf-8")
+
+    assert _load(tmp_path / "notes.md") == ["# Perfil\nTexto.\n\n## Detalle\n"]
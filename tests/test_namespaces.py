@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from src.utils import namespaces
+from src.utils.ingestion_queue import IngestionQueue
+from src.utils.ingestion_worker import run_delete_job
+from src.utils.namespaces import can_read, can_write, owner_usage, qualify, user_namespace
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+
+@pytest.mark.parametrize("first, second", [("Alice", "alice"), ("a.b", "a_b"), ("José", "Jose")])
+def test_user_ids_with_the_same_slug_get_different_namespaces(first, second):
+    assert user_namespace(first) != user_namespace(second)
+    assert not can_read(second, qualify(user_namespace(first), "cvs"))
+
+
+def test_shared_stores_are_writable_by_their_owner_and_admins(monkeypatch):
+    monkeypatch.setattr(namespaces, "NAMESPACE_ADMINS", ["admin"])
+    entry = {"owner": "alice"}
+
+    assert can_write("alice", qualify(user_namespace("alice"), "cvs"), entry)
+    assert not can_write("bob", qualify(user_namespace("alice"), "cvs"), entry)
+    assert can_write("bob", "shared/new", None)
+    assert can_write("alice", "shared/cvs", entry)
+    assert not can_write("bob", "shared/cvs", entry)
+    assert can_write("admin", "shared/cvs", entry)
+    # Stores shared before owners were recorded
+    assert not can_write("bob", "shared/legacy", {"description": "Old"})
+    assert not can_write(None, "shared/new", None)
+
+
+def test_worker_rejects_changes_to_other_users_shared_stores(workdir):
+    VectorStoreMetadata().add_vector_store("shared/cvs", "CVs", "text-embedding-3-small", owner="alice")
+    queue = IngestionQueue("jobs")
+    job_id = queue.submit({"store_name": "shared/cvs", "sources": {"hash": "cv.pdf"}}, user_id="bob",
+                          kind="delete_sources")
+
+    with pytest.raises(PermissionError):
+        run_delete_job(queue, queue.get_job(job_id))
+
+
+def test_owned_shared_stores_count_against_the_owner_quota(workdir):
+    metadata = {
+        qualify(user_namespace("alice"), "private"): {"vector_count": 10},
+        "shared/alice": {"vector_count": 5, "owner": "alice"},
+        "shared/bob": {"vector_count": 7, "owner": "bob"},
+    }
+    assert owner_usage("alice", metadata)["vectors"] == 15
+    assert json.dumps(owner_usage("bob", metadata)) == json.dumps({"bytes": 0, "vectors": 7})
@@ -0,0 +1,51 @@
+from langchain.docstore.document import Document
+
+from src.utils.observations import ObservationBuilder
+
+PAGE = "Javier Morales lidera el equipo de ciberseguridad. Implementó auditorías ISO 27001. Migró la red a zero trust."
+
+
+def _chunk(start, end, source="cv_javier.pdf", page=1, **metadata):
+    return Document(page_content=PAGE[start:end], metadata={"source": source, "content_hash": f"hash-{source}",
+                                                            "page": page, "start_index": start, **metadata})
+
+
+def test_overlapping_chunks_of_a_page_are_one_passage():
+    builder = ObservationBuilder()
+    observation = builder.build([_chunk(0, 60), _chunk(40, len(PAGE)), _chunk(0, 20, source="cv_ana.pdf")])
+
+    assert observation.splitlines() == [
+        "Sources: S1 = cv_javier.pdf; S2 = cv_ana.pdf",
+        f"[S1 p1] {PAGE}",
+        f"[S2 p1] {PAGE[:20].strip()}",
+    ]
+    assert builder.stats[0]["passages"] == 2 and builder.stats[0]["saved_tokens"] > 0
+
+
+def test_text_shown_earlier_in_the_run_is_not_repeated():
+    builder = ObservationBuilder()
+    builder.build([_chunk(0, 60)])
+    observation = builder.build([_chunk(0, 50), _chunk(30, len(PAGE))])
+
+    # Citations are defined once per run, only the unseen part of a chunk is shown
+    assert observation.splitlines() == [f"[S1 p1] {' '.join(PAGE[60:].split())}", "[Already shown above: S1 p1]"]
+    assert builder.stats[-1]["repeated"] == 1
+
+
+def test_chunks_without_offsets_are_deduplicated_by_text():
+    builder = ObservationBuilder()
+    legacy = Document(page_content="Experiencia en redes.", metadata={"source": "old.pdf", "page": 2})
+    builder.build([legacy])
+
+    assert builder.build([legacy], footer="More results: cursor=3") == \
+        "[Already shown above: S1 p2]\nMore results: cursor=3"
+
+
+def test_chunks_repeated_within_an_observation_are_not_marked_as_shown():
+    builder = ObservationBuilder()
+    legacy = Document(page_content="Experiencia en redes.", metadata={"source": "old.pdf", "page": 2})
+    observation = builder.build([_chunk(0, 60), _chunk(10, 50), legacy, legacy])
+
+    assert "Already shown" not in observation
+    assert observation.count("Experiencia en redes.") == 1
+    assert builder.stats[0]["repeated"] == 0
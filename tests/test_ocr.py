@@ -0,0 +1,54 @@
+from pypdf import PdfReader, PdfWriter
+
+from src.utils import ocr, vector_store_creator
+from src.utils.config import OCR_CONFIG
+from src.utils.ocr import needs_ocr, ocr_enabled
+from src.utils.vector_store_creator import VectorStoreCreator
+
+
+def _scanned_pdf(sample_documents, path):
+    """A PDF with a page of text followed by a page without a text layer, like a scan."""
+    writer = PdfWriter()
+    writer.add_page(PdfReader(sample_documents[0]).pages[0])
+    writer.add_blank_page(width=612, height=792)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_pages_with_a_short_text_layer_need_ocr():
+    assert needs_ocr("")
+    assert needs_ocr(" 12 \n\n ")
+    assert not needs_ocr("x" * OCR_CONFIG["min_chars_per_page"])
+
+
+def test_ocr_is_off_when_it_cannot_run(monkeypatch):
+    monkeypatch.setitem(OCR_CONFIG, "enabled", True)
+    monkeypatch.setattr(ocr, "ocr_available", lambda: False)
+    assert not ocr_enabled()
+
+
+def test_only_scanned_pages_are_read_with_ocr(workdir, hashing_embeddings, sample_documents, monkeypatch):
+    path = _scanned_pdf(sample_documents, workdir / "scan.pdf")
+    requested = []
+
+    def fake_ocr_pages(file_path, page_indexes, workers=None):
+        requested.append(list(page_indexes))
+        return {i: f"Recognized text of page {i + 1}" for i in page_indexes}, {"pages": len(page_indexes)}
+
+    monkeypatch.setattr(vector_store_creator, "ocr_enabled", lambda: True)
+    monkeypatch.setattr(vector_store_creator, "ocr_pages", fake_ocr_pages)
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small")
+    documents = creator.load_documents([path])
+
+    assert requested == [[1]]
+    assert documents[1].page_content == "Recognized text of page 2" and documents[1].metadata["ocr"]
+    assert "ocr" not in documents[0].metadata
+    assert creator.ocr_timings == [{"source": "scan.pdf", "pages": 1}]
+
+    # The OCR text is cached apart from the plain parse of the same file
+    monkeypatch.setattr(vector_store_creator, "ocr_enabled", lambda: False)
+    assert not creator.load_documents([path])[1].page_content.strip()
+    monkeypatch.setattr(vector_store_creator, "ocr_enabled", lambda: True)
+    assert creator.load_documents([path])[1].page_content == "Recognized text of page 2"
+    assert requested == [[1]]
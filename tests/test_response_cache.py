@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.evaluation.backends import ScriptedChatClient
+from src.utils.agent import AgentAI
+from src.utils.models import AgentOutput
+from src.utils.response_cache import ResponseCache, ResponseCacheMiss
+from src.utils.retrieval import AdaptiveRetriever
+
+MESSAGES = [{"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": "¿Dónde trabajó Ana López?"}]
+QUESTION = [{"role": "assistant", "content": "Hello!"},
+            {"role": "user", "content": "¿Qué experiencia tiene Javier Morales en ciberseguridad?"}]
+
+
+class OfflineClient:
+    """Client that fails every request, like a replay run without network."""
+    def __init__(self):
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    def parse(self, **kwargs):
+        raise AssertionError("The API was called during a replay")
+
+
+def _call(client, model="gpt-4.1-2025-04-14", messages=MESSAGES):
+    return lambda: client.parse(model=model, messages=messages, response_format=AgentOutput)
+
+
+def test_request_key_covers_model_messages_and_schema():
+    key = ResponseCache.request_key("gpt-4.1-2025-04-14", MESSAGES, AgentOutput)
+
+    assert key == ResponseCache.request_key("gpt-4.1-2025-04-14", [dict(m) for m in MESSAGES], AgentOutput)
+    assert key != ResponseCache.request_key("gpt-4.1-mini-2025-04-14", MESSAGES, AgentOutput)
+    assert key != ResponseCache.request_key("gpt-4.1-2025-04-14", MESSAGES[:1], AgentOutput)
+
+
+def test_replay_returns_the_recorded_response(tmp_path):
+    client = ScriptedChatClient("shared/cvs")
+    recorded = ResponseCache(mode="record", cache_dir=str(tmp_path)).complete(
+        _call(client), "gpt-4.1-2025-04-14", MESSAGES, AgentOutput)
+
+    replay = ResponseCache(mode="replay", cache_dir=str(tmp_path))
+    replayed = replay.complete(_call(OfflineClient()), "gpt-4.1-2025-04-14", MESSAGES, AgentOutput)
+    assert replayed.id == recorded.id
+    assert replayed.choices[0].message.parsed == recorded.choices[0].message.parsed
+    assert (replay.hits, replay.misses, client.calls) == (1, 0, 1)
+
+
+def test_replay_of_an_unrecorded_request_is_an_error(tmp_path):
+    replay = ResponseCache(mode="replay", cache_dir=str(tmp_path))
+
+    with pytest.raises(ResponseCacheMiss):
+        replay.complete(_call(OfflineClient()), "gpt-4.1-2025-04-14", MESSAGES, AgentOutput)
+    assert replay.misses == 1
+
+
+def test_auto_records_misses_and_reuses_hits(tmp_path):
+    client = ScriptedChatClient("shared/cvs")
+    cache = ResponseCache(mode="auto", cache_dir=str(tmp_path))
+    first = cache.complete(_call(client), "gpt-4.1-2025-04-14", MESSAGES, AgentOutput)
+    second = cache.complete(_call(client), "gpt-4.1-2025-04-14", MESSAGES, AgentOutput)
+
+    assert first.id == second.id
+    assert (cache.hits, cache.misses, client.calls) == (1, 1, 1)
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(mode="sometimes", cache_dir=str(tmp_path))
+
+
+def test_agent_run_replays_offline(cv_store, hashing_embeddings, tmp_path):
+    def run(client, mode):
+        agent = AgentAI(user_id="alice", client=client, embeddings_factory=lambda model: hashing_embeddings,
+                        response_cache=ResponseCache(mode=mode, cache_dir=str(tmp_path / "llm")))
+        # Hashing embeddings score lower than the production threshold
+        agent.retriever = AdaptiveRetriever({"score_threshold": 0.0})
+        return agent.run(QUESTION, "gpt-4.1-2025-04-14"), agent.response_cache
+
+    recorded, _ = run(ScriptedChatClient(cv_store), "record")
+    replayed, cache = run(OfflineClient(), "replay")
+
+    assert replayed == recorded
+    assert cache.hits > 0 and cache.misses == 0
@@ -0,0 +1,67 @@
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from src.evaluation.backends import HashingEmbeddings
+from src.utils.retrieval import AdaptiveRetriever, QueryEmbeddingCache, relevance_score
+from src.utils.store_manifest import build_index
+
+TEXTS = [f"Chunk {i} about {topic} and its details." for i, topic in
+         enumerate(["kubernetes clusters", "terraform modules", "python services", "cloud costs"] * 5)]
+
+
+def _index(embeddings, texts=TEXTS):
+    vectors = embeddings.embed_documents(texts)
+    return build_index(texts, vectors, embeddings, [{"source": "doc.pdf", "page": i} for i in range(len(texts))])
+
+
+def test_pages_cover_the_ranking_once_within_the_token_budget():
+    index = _index(HashingEmbeddings())
+    retriever = AdaptiveRetriever({"score_threshold": 0.0, "max_observation_tokens": 60, "max_results_per_page": 3})
+    ranking = retriever.rank(index, "store", "kubernetes clusters")
+
+    seen, cursor = [], 0
+    while cursor is not None:
+        docs, cursor, total = retriever.page("store", "kubernetes clusters", cursor)
+        assert 1 <= len(docs) <= 3
+        seen.extend(doc.page_content for doc in docs)
+    assert total == len(ranking)
+    assert seen == [doc.page_content for doc, _ in ranking]
+
+
+def test_threshold_drops_unrelated_chunks():
+    index = _index(HashingEmbeddings())
+    ranking = AdaptiveRetriever({"score_threshold": 0.3, "search_type": "similarity"}).rank(
+        index, "store", "terraform modules")
+
+    assert ranking and all(score >= 0.3 for _, score in ranking)
+    assert all("terraform" in doc.page_content for doc, _ in ranking)
+
+
+def test_mmr_puts_diverse_chunks_first():
+    texts = ["kubernetes clusters on aws"] * 5 + ["kubernetes clusters on gcp"]
+    index = _index(HashingEmbeddings(), texts)
+    ranking = AdaptiveRetriever({"score_threshold": 0.0, "lambda_mult": 0.5}).rank(index, "store", "kubernetes clusters")
+
+    assert {doc.page_content for doc, _ in ranking[:2]} == set(texts)
+
+
+def test_inner_product_scores_are_cosines():
+    embeddings = HashingEmbeddings()
+    index = _index(embeddings)
+    [(doc, score)] = index.similarity_search_with_score_by_vector(embeddings.embed_query(TEXTS[0]), k=1)
+
+    assert doc.page_content == TEXTS[0]
+    assert np.isclose(relevance_score(index, score), 1.0, atol=1e-5)
+    l2_index = FAISS.from_texts(TEXTS[:2], embeddings)
+    [(_, distance)] = l2_index.similarity_search_with_score(TEXTS[0], k=1)
+    assert np.isclose(relevance_score(l2_index, distance), 1.0, atol=1e-5)
+
+
+def test_query_embeddings_are_shared_by_stores_of_a_run():
+    embeddings = HashingEmbeddings()
+    cache = QueryEmbeddingCache()
+    retriever = AdaptiveRetriever({"score_threshold": 0.0}, query_embeddings=cache)
+    retriever.rank(_index(embeddings), "first", "python services")
+    retriever.rank(_index(embeddings), "second", "python  services")
+
+    assert (cache.computed, cache.reused) == (1, 1)
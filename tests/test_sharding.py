@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.utils.sharding import ShardedVectorStore, shard_dir, shard_of
+from src.utils.store_manifest import current_manifest, load_index
+from src.utils.store_versions import VersionedStoreManager
+from src.utils.vector_store_creator import VectorStoreCreator
+
+TOPICS = ["kubernetes clusters", "terraform modules", "python services", "cloud costs", "security audits",
+          "data pipelines", "react frontends", "mobile apps"]
+
+
+def _chunks():
+    texts, metadatas = [], []
+    for i, topic in enumerate(TOPICS):
+        for part in range(3):
+            texts.append(f"Document {i} part {part} about {topic}.")
+            metadatas.append({"source": f"doc-{i}.pdf", "content_hash": f"hash-{i}", "page": part})
+    return texts, metadatas
+
+
+def _index(embeddings, shards):
+    texts, metadatas = _chunks()
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small", embeddings=embeddings, shards=shards)
+    return creator, creator.new_index(texts, embeddings.embed_documents(texts), metadatas)
+
+
+def test_documents_stay_in_one_shard_and_search_matches_a_flat_index(hashing_embeddings):
+    _, flat = _index(hashing_embeddings, 1)
+    _, sharded = _index(hashing_embeddings, 4)
+
+    assert isinstance(sharded, ShardedVectorStore) and sharded.index.ntotal == flat.index.ntotal
+    for i, shard in enumerate(sharded.shards):
+        for doc in (shard.docstore._dict.values() if shard else []):
+            assert shard_of(doc.metadata, 4) == i
+    query = hashing_embeddings.embed_query("terraform modules")
+    expected = flat.similarity_search_with_score_by_vector(query, k=5)
+    results = sharded.similarity_search_with_score_by_vector(query, k=5)
+    # Chunks with the same score may come in another order
+    assert results[0][0].page_content == expected[0][0].page_content
+    assert [round(score, 5) for _, score in results] == [round(score, 5) for _, score in expected]
+
+
+def test_only_changed_shards_are_written_to_a_new_version(workdir, hashing_embeddings):
+    creator, creator.db = _index(hashing_embeddings, 4)
+    versions = VersionedStoreManager()
+    first = creator.save_vector_store("shared/docs", creator.db)
+    assert current_manifest("shared/docs")["shards"] == 4
+
+    creator.load_vector_store("shared/docs")
+    metadata = {"source": "new.pdf", "content_hash": "hash-new", "page": 0}
+    creator._add_vectors(creator.db, ["New document"], hashing_embeddings.embed_documents(["New document"]),
+                         [metadata])
+    second = creator.save_vector_store("shared/docs", creator.db)
+
+    changed = shard_of(metadata, 4)
+    first_path, second_path = versions.version_path("shared/docs", first), versions.version_path("shared/docs", second)
+    for shard in range(4):
+        if not os.path.isdir(shard_dir(first_path, shard)):
+            continue
+        same_file = os.path.samefile(os.path.join(shard_dir(first_path, shard), "index.faiss"),
+                                     os.path.join(shard_dir(second_path, shard), "index.faiss"))
+        assert same_file == (shard != changed)
+    reloaded = load_index(second_path, hashing_embeddings, current_manifest("shared/docs"), "shared/docs")
+    assert reloaded.index.ntotal == len(TOPICS) * 3 + 1
+
+
+def test_vector_ranges_read_only_the_shards_they_cover(hashing_embeddings, monkeypatch):
+    _, store = _index(hashing_embeddings, 4)
+    shards = [shard for shard in store.shards if shard is not None]
+    everything = store.index.reconstruct_n(0, store.index.ntotal)
+    first = shards[0].index.ntotal
+
+    assert len(everything) == len(TOPICS) * 3
+    assert (store.index.reconstruct_n(first - 1, 2) == everything[first - 1:first + 1]).all()
+    read = []
+    for shard in shards:
+        monkeypatch.setattr(shard.index, "reconstruct_n",
+                            lambda start, count, index=shard.index: read.append(index) or np.zeros((count, index.d)))
+    store.index.reconstruct_n(0, first)
+    assert read == [shards[0].index]
+
+
+def test_similarity_search_does_not_read_vectors(hashing_embeddings, monkeypatch):
+    _, store = _index(hashing_embeddings, 4)
+    query = hashing_embeddings.embed_query("terraform modules")
+    for shard in store.shards:
+        if shard is not None:
+            monkeypatch.setattr(shard.index, "reconstruct", lambda i: pytest.fail("vector read"))
+
+    assert len(store.similarity_search_with_score_by_vector(query, k=3)) == 3
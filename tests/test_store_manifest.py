@@ -0,0 +1,49 @@
+import json
+import os
+
+import pytest
+
+from src.utils.store_manifest import (EmbeddingMismatchError, add_to_index, current_manifest, load_index,
+                                      migrate_store)
+from src.utils.store_summary import current_summary
+from src.utils.store_versions import MANIFEST_FILE, VersionedStoreManager
+from src.utils.vector_store_creator import VectorStoreCreator
+
+
+def test_adding_documents_with_another_model_is_rejected(workdir, hashing_embeddings, sample_documents):
+    VectorStoreCreator(embedding_model="text-embedding-3-small").process_files(sample_documents[:1], name="shared/cvs")
+    version = VersionedStoreManager().current_version("shared/cvs")
+
+    with pytest.raises(EmbeddingMismatchError):
+        VectorStoreCreator(embedding_model="text-embedding-3-large").process_files(sample_documents[1:2],
+                                                                                   name="shared/cvs")
+    assert VersionedStoreManager().current_version("shared/cvs") == version
+    assert current_manifest("shared/cvs")["embedding_model"] == "text-embedding-3-small"
+
+
+def test_indexes_are_checked_against_their_manifest(workdir, hashing_embeddings, sample_documents):
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small")
+    creator.process_files(sample_documents[:1], name="shared/cvs")
+    versions = VersionedStoreManager()
+    path = versions.version_path("shared/cvs", versions.current_version("shared/cvs"))
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    with pytest.raises(EmbeddingMismatchError):
+        load_index(path, hashing_embeddings, {**manifest, "dimension": 1536}, "shared/cvs")
+    with pytest.raises(EmbeddingMismatchError):
+        add_to_index(creator.db, ["chunk"], [[1.0] * 1536], [{"source": "other.pdf"}])
+
+
+def test_migration_re_embeds_the_store_with_the_new_model(workdir, hashing_embeddings, sample_documents):
+    VectorStoreCreator(embedding_model="text-embedding-3-small").process_files(sample_documents[:1], name="shared/cvs")
+    chunks = current_summary("shared/cvs")["chunks"]
+
+    assert migrate_store("shared/cvs", "text-embedding-3-large")
+    assert current_manifest("shared/cvs")["embedding_model"] == "text-embedding-3-large"
+    assert current_summary("shared/cvs")["chunks"] == chunks
+    assert migrate_store("shared/cvs", "text-embedding-3-large") is None
+
+    # The store now takes documents embedded with its new model
+    assert VectorStoreCreator(embedding_model="text-embedding-3-large").process_files(sample_documents[1:2],
+                                                                                      name="shared/cvs")
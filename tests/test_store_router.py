@@ -0,0 +1,62 @@
+from langchain_community.vectorstores import FAISS
+
+from src.evaluation.backends import HashingEmbeddings
+from src.utils.store_router import StoreRouter
+
+STORES = {
+    "shared/cvs": "Curriculum vitae of software engineers",
+    "shared/contracts": "Employment contracts and legal agreements",
+    "shared/invoices": "Supplier invoices and payment records",
+    "shared/recipes": "Cooking recipes and kitchen notes",
+}
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def _router(tmp_path, embeddings, **config):
+    return StoreRouter({"index_dir": str(tmp_path / "router"), "max_stores_in_prompt": 2, **config},
+                       embeddings=embeddings)
+
+
+def test_stores_that_fit_in_the_prompt_are_listed_by_name_without_embedding(tmp_path):
+    embeddings = CountingEmbeddings()
+    router = _router(tmp_path, embeddings, max_stores_in_prompt=8)
+
+    assert router.rank("payment records of suppliers", STORES) == sorted(STORES)
+    assert embeddings.embedded == []
+
+
+def test_descriptions_are_embedded_once_and_rank_the_stores(tmp_path):
+    embeddings = CountingEmbeddings()
+    router = _router(tmp_path, embeddings)
+
+    assert router.rank("supplier invoices and payment records", STORES)[0] == "shared/invoices"
+    assert len(embeddings.embedded) == len(STORES)
+    assert router.rank("cooking recipes and kitchen notes", STORES)[0] == "shared/recipes"
+    assert len(embeddings.embedded) == len(STORES)
+
+    # Only a changed description is embedded again
+    router.rank("cooking recipes", {**STORES, "shared/recipes": "Desserts"})
+    assert embeddings.embedded[len(STORES):] == ["shared/recipes: Desserts"]
+
+
+def test_centroids_rank_stores_with_the_same_description(tmp_path):
+    embeddings = HashingEmbeddings()
+    router = _router(tmp_path, embeddings, centroid_weight=0.5)
+    stores = {f"shared/docs-{i}": "Documents" for i in range(3)}
+    chunks = {"shared/docs-0": ["kubernetes clusters on aws"], "shared/docs-1": ["terraform modules for gcp"],
+              "shared/docs-2": ["chocolate cake recipe"]}
+    for store_id, texts in chunks.items():
+        assert router.record_centroid(store_id, router.config["embedding_model"], FAISS.from_texts(texts, embeddings))
+
+    assert router.rank("terraform modules for gcp", stores)[0] == "shared/docs-1"
+    # Stores embedded with another model are not comparable with the question
+    assert not router.record_centroid("shared/docs-0", "other-model", FAISS.from_texts(["text"], embeddings))
@@ -0,0 +1,60 @@
+import os
+
+from langchain.docstore.document import Document
+
+from src.utils import store_summary
+from src.utils.store_summary import build_summary, current_summary, describe_summary
+from src.utils.store_versions import SUMMARY_FILE, VersionedStoreManager
+from src.utils.vector_store_creator import VectorStoreCreator
+
+CHUNKS = [("Experience with kubernetes.", {"source": "a.pdf", "content_hash": "hash-a", "page": 0}),
+          ("Terraform modules.", {"source": "a.pdf", "content_hash": "hash-a", "page": 1}),
+          ("Python services.", {"source": "b.pdf", "content_hash": "hash-b", "page": 0})]
+
+
+def _store(embeddings, shards=1):
+    texts = [text for text, _ in CHUNKS]
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small", embeddings=embeddings, shards=shards)
+    return creator.new_index(texts, embeddings.embed_documents(texts), [metadata for _, metadata in CHUNKS])
+
+
+def test_summary_lists_each_document_with_totals(hashing_embeddings):
+    summary = build_summary(_store(hashing_embeddings), "text-embedding-3-small")
+
+    assert (summary["documents"], summary["chunks"]) == (2, 3)
+    assert [(entry["source"], entry["pages"], entry["chunks"]) for entry in summary["sources"]] == \
+        [("a.pdf", [0, 1], 2), ("b.pdf", [0], 1)]
+    assert summary["tokens"] == sum(entry["tokens"] for entry in summary["sources"]) > 0
+    assert build_summary(_store(hashing_embeddings, shards=4), "text-embedding-3-small") == summary
+
+
+def test_unchanged_documents_keep_their_token_count(hashing_embeddings, monkeypatch):
+    previous = build_summary(_store(hashing_embeddings), "text-embedding-3-small")
+    monkeypatch.setattr(store_summary, "count_tokens", lambda text: 1000)
+
+    summary = build_summary(_store(hashing_embeddings), "text-embedding-3-small", previous=previous)
+    assert summary["tokens"] == previous["tokens"]
+
+
+def test_prompt_description_lists_a_few_sources():
+    summary = {"documents": 3, "sources": [{"source": name} for name in ("a.pdf", "b.pdf", "c.pdf")]}
+
+    assert describe_summary(summary, 2) == "3 documents: a.pdf, b.pdf, ..."
+    assert describe_summary(summary, 0) == "3 documents"
+    assert describe_summary(None, 2) == ""
+
+
+def test_versions_without_a_summary_get_one_when_loaded(cv_store):
+    summary = current_summary(cv_store)
+    assert summary["bytes"] > 0 and summary["documents"] == 3
+
+    versions = VersionedStoreManager()
+    path = os.path.join(versions.version_path(cv_store, versions.current_version(cv_store)), SUMMARY_FILE)
+    os.remove(path)
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small")
+    creator.load_vector_store(cv_store)
+
+    assert creator.summary["chunks"] == creator.db.index.ntotal == summary["chunks"]
+    rebuilt = current_summary(cv_store)
+    assert rebuilt["bytes"] > 0
+    assert {**rebuilt, "bytes": 0} == {**summary, "bytes": 0}
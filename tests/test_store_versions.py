@@ -0,0 +1,99 @@
+import os
+
+import pytest
+from langchain_community.vectorstores import FAISS
+
+from src.utils.ingestion_queue import IngestionQueue
+from src.utils.ingestion_worker import run_ingest_job
+from src.utils.store_summary import current_summary
+from src.utils.store_versions import VersionConflictError, VersionedStoreManager
+from src.utils.vector_store_creator import VectorStoreCreator
+from src.utils.vector_store_metadata import VectorStoreMetadata
+
+
+@pytest.fixture
+def index(hashing_embeddings):
+    return FAISS.from_texts(["first chunk", "second chunk"], hashing_embeddings)
+
+
+def test_save_publishes_only_from_the_current_version(workdir, index):
+    versions = VersionedStoreManager("stores")
+    first = versions.save("cvs", index, base_version=None)
+    second = versions.save("cvs", index, base_version=first)
+    assert versions.current_version("cvs") == second
+
+    # A writer that loaded the first version must not overwrite the second
+    with pytest.raises(VersionConflictError):
+        versions.save("cvs", index, base_version=first)
+    assert versions.current_version("cvs") == second
+    assert versions.list_versions("cvs") == [first, second]
+
+    # Creating a store that another writer already created conflicts too
+    with pytest.raises(VersionConflictError):
+        versions.save("cvs", index, base_version=None)
+
+
+def test_rollback_publishes_the_previous_version(workdir, index):
+    versions = VersionedStoreManager("stores")
+    first = versions.save("cvs", index, base_version=None)
+    versions.save("cvs", index, base_version=first)
+
+    assert versions.rollback("cvs") == first
+    assert versions.current_version("cvs") == first
+    assert versions.rollback("cvs") is None
+
+
+def test_garbage_collection_keeps_leased_versions(workdir, index):
+    versions = VersionedStoreManager("stores", keep_versions=1)
+    first = versions.save("cvs", index, base_version=None)
+    with versions.reader("cvs", first):
+        second = versions.save("cvs", index, base_version=first)
+        versions.collect_garbage("cvs")
+        assert first in versions.list_versions("cvs")
+
+    assert versions.collect_garbage("cvs") == [first]
+    assert versions.list_versions("cvs") == [second]
+
+
+def test_process_files_retries_when_another_writer_publishes(workdir, hashing_embeddings, sample_documents):
+    store_name = "shared/cvs"
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small")
+    other_writer = VectorStoreCreator(embedding_model="text-embedding-3-small")
+    published = []
+
+    def publish_meanwhile(stage, progress, message):
+        # Another job publishes the store after this one loaded it, while it embeds
+        if stage == "embedding" and not published:
+            published.append(other_writer.process_files(sample_documents[1:2], name=store_name))
+
+    creator.process_files(sample_documents[:1], name=store_name)
+    assert creator.process_files(sample_documents[2:3], name=store_name, progress_callback=publish_meanwhile)
+
+    assert published[0] is not None
+    sources = {entry["source"] for entry in current_summary(store_name)["sources"]}
+    assert sources == {os.path.basename(path) for path in sample_documents}
+
+
+def test_rollback_restores_the_metadata_of_the_version(workdir, hashing_embeddings, sample_documents):
+    store_name = "shared/cvs"
+    queue = IngestionQueue("jobs")
+
+    def ingest(file_paths):
+        job_id = queue.submit({"file_paths": file_paths, "store_name": store_name, "store_description": "CVs",
+                               "embedding_model": "text-embedding-3-small", "chunk_size": 300, "chunk_overlap": 30},
+                              user_id="alice")
+        return run_ingest_job(queue, queue.get_job(job_id))
+
+    ingest(sample_documents[:1])
+    first_count = VectorStoreMetadata().load_all()[store_name]["vector_count"]
+    ingest(sample_documents[1:2])
+
+    creator = VectorStoreCreator(embedding_model="text-embedding-3-small")
+    assert creator.rollback_vector_store(store_name)
+    entry = VectorStoreMetadata().load_all()[store_name]
+    assert set(entry["sources"].values()) == {os.path.basename(sample_documents[0])}
+    assert entry["vector_count"] == first_count
+
+    # The file dropped by the rollback is ingested again instead of being skipped as a duplicate
+    assert "duplicate" not in ingest(sample_documents[1:2])
+    assert len(current_summary(store_name)["sources"]) == 2
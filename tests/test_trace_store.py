@@ -0,0 +1,48 @@
+from src.utils.chat_store import ChatSessionStore
+from src.utils.trace_store import TraceStore
+
+PROMPT = "You are an assistant with access to the stores: shared/cvs"
+
+
+def _steps(i):
+    return [{"role": "assistant", "content": f"thought {i}"}, {"role": "user", "content": f"Observation: {i}"}]
+
+
+def test_traces_in_memory_are_capped_and_older_ones_dropped():
+    traces = TraceStore(max_in_memory=2)
+    for i in range(5):
+        assert traces.add(PROMPT, (0, 2 * i + 1), _steps(i)) == i + 1
+
+    assert traces.questions() == [4, 5]
+    assert traces.get(1) is None and traces.get_steps(1) == []
+    assert traces.get_steps(5) == _steps(4)
+    assert traces.get(5)["history"] == [0, 9]
+
+
+def test_questions_share_their_system_prompt():
+    traces = TraceStore(max_in_memory=10)
+    traces.add(PROMPT, (0, 1), _steps(0))
+    traces.add(PROMPT, (0, 3), _steps(1))
+    traces.add("Another prompt", (0, 5), _steps(2))
+
+    assert traces.get(1)["prompt_hash"] == traces.get(2)["prompt_hash"] != traces.get(3)["prompt_hash"]
+    assert len(traces._prompts) == 2
+    assert traces.get_prompt(2) == PROMPT
+
+
+def test_evicted_traces_are_read_back_from_the_session(workdir):
+    chat_store = ChatSessionStore("sessions")
+    session_id = chat_store.create_session("alice")
+    traces = TraceStore(chat_store, "alice", session_id, max_in_memory=1, spill_to_disk=True)
+    for i in range(3):
+        traces.add(PROMPT, (0, 2 * i + 1), _steps(i))
+
+    assert list(traces._traces) == [3]
+    assert traces.questions() == [1, 2, 3]
+    assert traces.get_steps(1) == _steps(0)
+    assert traces.get_prompt(1) == PROMPT
+
+    # A new store for the session continues the question numbers
+    reopened = TraceStore(chat_store, "alice", session_id, max_in_memory=1, spill_to_disk=True)
+    assert reopened.add(PROMPT, (0, 7), _steps(3)) == 4
+    assert reopened.get_steps(2) == _steps(1)